@@ -0,0 +1,28 @@
+"""Every assessment page and the heart-failure workflow in one Streamlit app.
+
+    streamlit run app.py
+
+One server process loads the rule engine, the scale tables and the workflow
+content once and serves all six pages from them, instead of one server per
+page each holding its own copy of the Streamlit runtime.  The pages run
+unchanged; ``page_cache`` shares their decision cache across every page and
+session of the app.
+"""
+
+import streamlit as st
+
+import page_cache
+
+st.set_page_config(page_title="Hospice and Level 3 to 4 assessments")
+
+PAGES = [
+    st.Page("Guidelines_for_hospice_referral_practice.py", title="Hospice referral guidelines", default=True),
+    st.Page("level_3_to_4_5.py", title="Level 3 to 4 (v5)"),
+    st.Page("level_3_to_4_7.py", title="Level 3 to 4 (v7)"),
+    st.Page("level_3_to_4_8.py", title="Level 3 to 4 (v8)"),
+    st.Page("level_3_to_4_9.py", title="Level 3 to 4 (v9)"),
+    st.Page("moderate_to_severe_heart_failure.py", title="Heart failure workflow"),
+]
+
+page_cache.engine()
+st.navigation(PAGES).run()
@@ -0,0 +1,285 @@
+"""Score Parquet and Arrow IPC cohort files column by column.
+
+    python arrow_io.py cohort.parquet -o scored.parquet
+    python arrow_io.py cohort.arrow -o scored.arrow --variant all --batch-size 262144
+    python arrow_io.py --synthetic 10M cohort.parquet       # write a test cohort
+
+Input columns are those of ``cohort.score_cohort`` (``has_hf``, ``pps``,
+``albumin``, ...; missing columns take the cohort defaults and nulls are
+read as "not entered").  Each record batch is handed to the vectorized
+scorer as NumPy views of its Arrow buffers -- no row is ever turned into a
+mapping -- and written back with the input columns followed by, per
+variant:
+
+    tier    dictionary<int8, string>  "red", "orange", "blue" or "green"
+    fired   uint8                     bitmask over rules.CONDITION_IDS
+                                      (bit i set = condition i fired)
+    flags   int8                      the fallback criteria count
+
+With one variant the columns are named ``tier``, ``fired`` and ``flags``;
+with several they are prefixed by the variant name (``hospice_tier``).  The
+variant names are recorded in the schema metadata under ``rule_variants``
+(comma-separated; see ``scored_variants``), so a reader knows which rules
+scored an unprefixed file.
+Files are read and written one row group or batch at a time, so memory use
+depends on --batch-size and not on the size of the file.  ``.parquet``
+files are Parquet, anything else is the Arrow IPC file format
+(``.arrow``/``.feather``).  Inputs are memory-mapped, so the resident size
+reported at the end includes input pages the OS can drop at any time.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc
+import pyarrow.parquet as pq
+
+import cohort
+import rules
+import truth_table
+
+BATCH_SIZE = 1 << 16
+OUTPUTS = ("tier", "fired", "flags")
+VARIANTS_KEY = b"rule_variants"
+BACKENDS = {"cohort": cohort, "truth_table": truth_table}
+
+_INPUTS = ("pps", *cohort.COLUMN_DEFAULTS)
+_TIER_NAMES = pa.array(rules.TIERS)
+
+
+def is_parquet(path):
+    return os.path.splitext(path)[1].lower() in (".parquet", ".pq")
+
+
+def _numpy(column, default):
+    """A column as a NumPy array, nulls replaced by ``default``."""
+    if column.null_count:
+        if isinstance(default, float):
+            column = pc.cast(column, pa.float64())
+        column = pc.fill_null(column, default)
+    return column.to_numpy(zero_copy_only=False)
+
+
+def columns(batch):
+    """Column table for the scorer from a record batch or table.
+
+    Numeric columns without nulls are zero-copy views; booleans, which Arrow
+    stores as bits, and columns with nulls are converted.
+    """
+    names = set(batch.schema.names)
+    if "pps" not in names:
+        raise KeyError("cohort table has no 'pps' column")
+    if batch.column("pps").null_count:
+        raise ValueError("cohort table has rows with no PPS score")
+    return {
+        name: _numpy(batch.column(name), cohort.COLUMN_DEFAULTS.get(name))
+        for name in _INPUTS
+        if name in names
+    }
+
+
+def fired_mask(result):
+    """Bitmask over rules.CONDITION_IDS from a score_cohort result."""
+    fired = np.zeros(len(result["tier"]), dtype=np.uint8)
+    for condition_id, bit in rules.FIRED_BITS.items():
+        fired[np.asarray(result[condition_id])] |= bit
+    return fired
+
+
+def output_names(variants):
+    names = [v.name for v in map(rules.get_variant, variants)]
+    if len(names) == 1:
+        return {names[0]: OUTPUTS}
+    return {name: tuple(f"{name}_{output}" for output in OUTPUTS) for name in names}
+
+
+def scored_variants(schema):
+    """Variant names recorded in a scored file's schema, or None if it has none."""
+    recorded = (schema.metadata or {}).get(VARIANTS_KEY)
+    return recorded.decode("utf-8").split(",") if recorded else None
+
+
+def score_batch(batch, variants=("hospice",), backend="cohort"):
+    """``batch`` with the tier, fired and flags columns of every variant appended."""
+    names = output_names(variants)
+    clash = set(batch.schema.names).intersection(*names.values())
+    if clash:
+        raise ValueError(f"input already has output columns: {', '.join(sorted(clash))}")
+    results = BACKENDS[backend].score_variants(columns(batch), list(names))
+    arrays, fields = list(batch.columns), list(batch.schema)
+    for name, (tier, fired, flags) in names.items():
+        result = results[name]
+        tier_codes = pa.array(np.asarray(result["tier"], dtype=np.int8))
+        arrays += [
+            pa.DictionaryArray.from_arrays(tier_codes, _TIER_NAMES),
+            pa.array(fired_mask(result)),
+            pa.array(np.asarray(result["flags"], dtype=np.int8)),
+        ]
+        fields += [
+            pa.field(tier, pa.dictionary(pa.int8(), pa.string())),
+            pa.field(fired, pa.uint8()),
+            pa.field(flags, pa.int8()),
+        ]
+    metadata = {**(batch.schema.metadata or {}), VARIANTS_KEY: ",".join(names).encode("utf-8")}
+    return pa.RecordBatch.from_arrays(arrays, schema=pa.schema(fields, metadata=metadata))
+
+
+def score_table(table, variants=("hospice",), backend="cohort", batch_size=BATCH_SIZE):
+    """``score_batch`` over an in-memory ``pyarrow.Table``, batch by batch."""
+    batches = table.to_batches(batch_size) or [_empty(table.schema)]
+    return pa.Table.from_batches([score_batch(batch, variants, backend) for batch in batches])
+
+
+def _empty(schema):
+    return pa.RecordBatch.from_pylist([], schema=schema)
+
+
+def read_schema(path):
+    if is_parquet(path):
+        return pq.read_schema(path)
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema
+
+
+def read_batches(path, batch_size=BATCH_SIZE):
+    """Yield the record batches of a Parquet or Arrow IPC file, at most ``batch_size`` rows each."""
+    if is_parquet(path):
+        yield from pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=batch_size)
+        return
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            for start in range(0, batch.num_rows, batch_size):
+                yield batch.slice(start, batch_size)
+
+
+def count_parts(path):
+    """Row groups of a Parquet file, or record batches of an Arrow IPC file."""
+    if is_parquet(path):
+        return pq.ParquetFile(path, memory_map=True).num_row_groups
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).num_record_batches
+
+
+def read_part(path, part, batch_size=BATCH_SIZE, columns=None):
+    """Yield one row group or record batch of ``path`` (see ``count_parts``) in batches.
+
+    ``columns`` limits what is read to those names.  Parts let separate
+    processes read disjoint slices of one file.
+    """
+    if is_parquet(path):
+        yield from pq.ParquetFile(path, memory_map=True).iter_batches(batch_size, row_groups=[part], columns=columns)
+        return
+    with pa.memory_map(path) as source:
+        batch = pa.ipc.open_file(source).get_batch(part)
+        if columns is not None:
+            batch = batch.select(columns)
+        for start in range(0, batch.num_rows, batch_size):
+            yield batch.slice(start, batch_size)
+
+
+class BatchWriter:
+    """Write record batches to a Parquet (one row group each) or Arrow IPC file."""
+
+    def __init__(self, path, schema):
+        if is_parquet(path):
+            self._writer = pq.ParquetWriter(path, schema)
+            self._write = lambda batch: self._writer.write_batch(batch, row_group_size=batch.num_rows)
+        else:
+            self._sink = pa.OSFile(path, "wb")
+            self._writer = pa.ipc.new_file(self._sink, schema)
+            self._write = self._writer.write_batch
+
+    def write(self, batch):
+        self._write(batch)
+
+    def close(self):
+        self._writer.close()
+        if hasattr(self, "_sink"):
+            self._sink.close()
+
+
+def score_file(source, destination, variants=("hospice",), backend="cohort", batch_size=BATCH_SIZE):
+    """Stream ``source`` through the scorer into ``destination``; returns the row count."""
+    rows, writer = 0, None
+    try:
+        for batch in read_batches(source, batch_size):
+            scored = score_batch(batch, variants, backend)
+            if writer is None:
+                writer = BatchWriter(destination, scored.schema)
+            writer.write(scored)
+            rows += batch.num_rows
+        if writer is None:  # no rows: still write the output schema
+            writer = BatchWriter(destination, score_batch(_empty(read_schema(source)), variants, backend).schema)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def write_synthetic(path, n, seed=0, batch_size=BATCH_SIZE):
+    """Write the rows of ``synthetic.packed_cohort(n, seed)`` as a cohort file, chunk by chunk."""
+    import records
+    import synthetic
+
+    writer = None
+    try:
+        for packed in synthetic.packed_chunks(n, seed):
+            table = pa.table(records.cohort_table(packed))
+            for batch in table.to_batches(batch_size):
+                if writer is None:
+                    writer = BatchWriter(path, batch.schema)
+                writer.write(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _peak_rss_mb():
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="cohort file (.parquet, or Arrow IPC)")
+    parser.add_argument("-o", "--output", help="scored file (.parquet, or Arrow IPC)")
+    parser.add_argument("--variant", choices=[*rules.VARIANTS, "all"], default="hospice",
+                        help="rule variant, or 'all' (default: hospice)")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="cohort", help="scorer (default: cohort)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help=f"rows per batch and output row group (default: {BATCH_SIZE})")
+    parser.add_argument("--synthetic", metavar="ROWS",
+                        help="write a synthetic cohort of ROWS rows (e.g. 10M) to INPUT instead of scoring")
+    parser.add_argument("--seed", type=int, default=0, help="seed for --synthetic (default: 0)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.synthetic:
+        import bench_rules
+
+        rows = bench_rules.parse_size(args.synthetic)
+        write_synthetic(args.input, rows, args.seed, args.batch_size)
+        verb = "wrote"
+    else:
+        if not args.output:
+            parser.error("the following arguments are required: -o/--output")
+        variants = list(rules.VARIANTS) if args.variant == "all" else [args.variant]
+        if args.backend == "truth_table":
+            truth_table.build(variants)
+        rows = score_file(args.input, args.output, variants, args.backend, args.batch_size)
+        verb = "scored"
+    seconds = time.perf_counter() - started
+    print(f"{verb} {rows:,} rows in {seconds:.2f}s ({rows / max(seconds, 1e-9):,.0f} rows/s), "
+          f"peak RSS {_peak_rss_mb():,.0f}MB", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""Backtest the rule variants against recorded outcomes.
+
+    python backtest.py history.parquet --outcome died_6m --outcome hospice_6m --workers 8
+    python backtest.py history.parquet --outcome died_6m --group-by year -o backtest.csv
+    python backtest.py --synthetic 5M history.arrow       # write a test extract
+
+The input is a cohort file (the ``cohort.score_cohort`` columns, read by
+``arrow_io.py``) with one boolean column per outcome, e.g. death or hospice
+enrollment within 6 months of the assessment; rows where an outcome is null
+are left out of that outcome's counts.  Every row is scored under every
+variant (``--variant``, default all) and compared with each outcome, as a
+confusion matrix per variant and rule:
+
+    <condition id>   the force_transition condition fired
+    red              tier red: some condition fired, the variant's referral
+    orange, blue     tier orange or more urgent, blue or more urgent
+
+The output has one CSV row per outcome, variant, group (with --group-by)
+and rule: patients, events, predicted, tp, fp, fn, tn, sensitivity,
+specificity and ppv (empty when undefined).  Counts are made with one
+``np.bincount`` per batch, variant and outcome over every rule and group at
+once.  With --workers N the file's row groups (record batches for Arrow IPC)
+are shared out to a process pool, and each worker reads only the columns it
+needs.
+"""
+
+import argparse
+import csv
+import sys
+import time
+from collections import deque
+from itertools import islice
+
+import numpy as np
+
+import cohort
+import rules
+
+RULES = (*rules.CONDITION_IDS, *rules.TIERS[:-1])
+OUTPUTS = ("patients", "events", "predicted", "tp", "fp", "fn", "tn", "sensitivity", "specificity", "ppv")
+BATCH_SIZE = 1 << 16
+
+
+def _predictions(result):
+    """``(len(RULES), rows)`` boolean matrix of what each rule predicts."""
+    tier = np.asarray(result["tier"])
+    fired = [np.asarray(result[condition_id]) for condition_id in rules.CONDITION_IDS]
+    # Tier codes count down towards red, so "at least as urgent as" is <=
+    return np.stack(fired + [tier <= code for code in range(len(rules.TIERS) - 1)])
+
+
+def _outcome(column):
+    """An outcome column as ``(event, known)`` boolean arrays."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    known = pc.is_valid(column).to_numpy(zero_copy_only=False)
+    event = pc.fill_null(pc.cast(column, pa.bool_()), False).to_numpy(zero_copy_only=False)
+    return event, known
+
+
+def _groups(column):
+    """Group codes for each row and the group values they stand for (nulls are a group)."""
+    import pyarrow.compute as pc
+
+    encoded = pc.dictionary_encode(column, null_encoding="encode")
+    return encoded.indices.to_numpy(zero_copy_only=False), encoded.dictionary.to_pylist()
+
+
+def count_batch(batch, outcomes, variants, group_by=None, ruleset=None):
+    """Confusion counts of one record batch.
+
+    Returns ``(groups, counts)``: the group values seen (``[None]`` without
+    ``group_by``) and an int64 array of shape ``(outcomes, variants, RULES,
+    groups, 2, 2)``, the last two axes being predicted and event.
+    """
+    import arrow_io
+
+    results = cohort.score_variants(arrow_io.columns(batch), variants, ruleset)
+    n = batch.num_rows
+    if group_by:
+        group, groups = _groups(batch.column(group_by))
+    else:
+        group, groups = np.zeros(n, dtype=np.intp), [None]
+    cells = len(RULES) * len(groups) * 4
+    # Row r under rule i lands in cell ((i * groups + group[r]) * 2 + predicted) * 2 + event
+    base = (np.arange(len(RULES), dtype=np.intp)[:, None] * len(groups) + group) * 4
+    counts = np.zeros((len(outcomes), len(variants), cells), dtype=np.int64)
+    events = [_outcome(batch.column(name)) for name in outcomes]
+    for j, variant in enumerate(variants):
+        codes = base + _predictions(results[variant]) * 2
+        for i, (event, known) in enumerate(events):
+            cell = (codes + event)[:, known] if not known.all() else codes + event
+            counts[i, j] = np.bincount(cell.ravel(), minlength=cells)
+    return groups, counts.reshape(len(outcomes), len(variants), len(RULES), len(groups), 2, 2)
+
+
+class Tally:
+    """Confusion counts summed over batches, with groups matched by value."""
+
+    def __init__(self, outcomes, variants):
+        self.outcomes = list(outcomes)
+        self.variants = list(variants)
+        self.groups = {}  # group value -> index along the groups axis
+        self.counts = np.zeros((len(self.outcomes), len(self.variants), len(RULES), 0, 2, 2), dtype=np.int64)
+        self.rows = 0
+
+    def add(self, groups, counts, rows):
+        for value in groups:
+            if value not in self.groups:
+                self.groups[value] = len(self.groups)
+        if len(self.groups) > self.counts.shape[3]:
+            grown = np.zeros(self.counts.shape[:3] + (len(self.groups), 2, 2), dtype=np.int64)
+            grown[:, :, :, :self.counts.shape[3]] = self.counts
+            self.counts = grown
+        self.counts[:, :, :, [self.groups[value] for value in groups]] += counts
+        self.rows += rows
+
+    def rows_out(self, grouped=False):
+        """One dict per outcome, variant, group (if ``grouped``) and rule, with OUTPUTS."""
+        groups = sorted(self.groups, key=lambda value: (value is None, value))
+        counts = self.counts[:, :, :, [self.groups[value] for value in groups]]
+        if not grouped:
+            counts = counts.sum(axis=3, keepdims=True)
+            groups = [None]
+        for (i, j, k, g) in np.ndindex(*counts.shape[:4]):
+            (tn, fn), (fp, tp) = counts[i, j, k, g].tolist()
+            row = {"outcome": self.outcomes[i], "variant": self.variants[j]}
+            if grouped:
+                row["group"] = groups[g]
+            row.update(rule=RULES[k], patients=tp + fp + fn + tn, events=tp + fn, predicted=tp + fp,
+                       tp=tp, fp=fp, fn=fn, tn=tn)
+            row["sensitivity"] = _ratio(tp, tp + fn)
+            row["specificity"] = _ratio(tn, tn + fp)
+            row["ppv"] = _ratio(tp, tp + fp)
+            yield row
+
+
+def _ratio(part, whole):
+    return round(part / whole, 6) if whole else ""
+
+
+def _count_part(path, part, columns, outcomes, variants, group_by, ruleset, batch_size):
+    import arrow_io
+
+    found = []
+    for batch in arrow_io.read_part(path, part, batch_size, columns):
+        groups, counts = count_batch(batch, outcomes, variants, group_by, ruleset)
+        found.append((groups, counts, batch.num_rows))
+    return found
+
+
+# Per-process ruleset used by pool workers, rebuilt if the parent's config differs
+_worker_ruleset = None
+
+
+def _count_part_in_worker(path, part, columns, outcomes, variants, group_by, config, batch_size):
+    global _worker_ruleset
+    if _worker_ruleset is None or _worker_ruleset.config != config:
+        _worker_ruleset = rules.Ruleset(config)
+    return _count_part(path, part, columns, outcomes, variants, group_by, _worker_ruleset, batch_size)
+
+
+def backtest(path, outcomes, variants=None, group_by=None, workers=1, ruleset=None, batch_size=BATCH_SIZE):
+    """A ``Tally`` of every variant against ``outcomes`` over the cohort file at ``path``.
+
+    The file's parts are scored in a pool of ``workers`` processes (in this
+    process when 1), at most ``2 * workers`` parts in flight.
+    """
+    import arrow_io
+
+    ruleset = ruleset or rules.current()
+    variants = [rules.get_variant(v).name for v in variants or rules.VARIANTS]
+    outcomes = list(outcomes)
+    names = arrow_io.read_schema(path).names
+    missing = [name for name in ("pps", *outcomes, *([group_by] if group_by else [])) if name not in names]
+    if missing:
+        raise KeyError(f"{path} has no column {', '.join(map(repr, missing))}")
+    # Only the scorer's inputs, the outcomes and the group are read
+    columns = [name for name in ("pps", *cohort.COLUMN_DEFAULTS) if name in names]
+    columns += [name for name in (*outcomes, group_by) if name and name not in columns]
+    parts = range(arrow_io.count_parts(path))
+    tally = Tally(outcomes, variants)
+    if workers <= 1:
+        for part in parts:
+            for found in _count_part(path, part, columns, outcomes, variants, group_by, ruleset, batch_size):
+                tally.add(*found)
+        return tally
+
+    # Imported here: process pools are costly to import and serial runs never need one
+    from concurrent.futures import ProcessPoolExecutor
+
+    parts = iter(parts)
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        while True:
+            for part in islice(parts, 2 * workers - len(pending)):
+                pending.append(pool.submit(_count_part_in_worker, path, part, columns, outcomes, variants,
+                                           group_by, ruleset.config, batch_size))
+            if not pending:
+                return tally
+            for found in pending.popleft().result():
+                tally.add(*found)
+
+
+def write_synthetic(path, n, seed=0, batch_size=BATCH_SIZE):
+    """Write a ``synthetic.py`` cohort with a simulated ``died_6m`` outcome column."""
+    import pyarrow as pa
+
+    import arrow_io
+    import records
+    import synthetic
+
+    writer = None
+    try:
+        for i, packed in enumerate(synthetic.packed_chunks(n, seed)):
+            table = records.cohort_table(packed)
+            table["died_6m"] = synthetic.outcomes(table, seed + i)
+            for batch in pa.table(table).to_batches(batch_size):
+                if writer is None:
+                    writer = arrow_io.BatchWriter(path, batch.schema)
+                writer.write(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="cohort file with outcome columns (.parquet, or Arrow IPC)")
+    parser.add_argument("--outcome", action="append", help="boolean outcome column (repeatable; default: died_6m)")
+    parser.add_argument("--variant", choices=[*rules.VARIANTS, "all"], default="all",
+                        help="rule variant, or 'all' (default: all)")
+    parser.add_argument("--group-by", metavar="COLUMN", help="also break the counts down by this column")
+    parser.add_argument("--workers", type=int, default=1, help="scoring processes (default: 1)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help=f"rows per batch (default: {BATCH_SIZE})")
+    parser.add_argument("-o", "--output", help="CSV file (default: stdout)")
+    parser.add_argument("--synthetic", metavar="ROWS",
+                        help="write a synthetic extract of ROWS rows (e.g. 5M) to INPUT instead of backtesting")
+    parser.add_argument("--seed", type=int, default=0, help="seed for --synthetic (default: 0)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.synthetic:
+        import bench_rules
+
+        rows = bench_rules.parse_size(args.synthetic)
+        write_synthetic(args.input, rows, args.seed, args.batch_size)
+        print(f"wrote {rows:,} rows in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+        return
+
+    outcomes = args.outcome or ["died_6m"]
+    variants = list(rules.VARIANTS) if args.variant == "all" else [args.variant]
+    ruleset = rules.current()
+    try:
+        tally = backtest(args.input, outcomes, variants, args.group_by, args.workers, ruleset, args.batch_size)
+    except KeyError as exc:
+        parser.error(exc.args[0])
+    seconds = time.perf_counter() - started
+
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        head = ["outcome", "variant", *(["group"] if args.group_by else []), "rule", *OUTPUTS]
+        writer = csv.DictWriter(out, head)
+        writer.writeheader()
+        writer.writerows(tally.rows_out(grouped=bool(args.group_by)))
+    finally:
+        if args.output:
+            out.close()
+    print(f"backtested {tally.rows:,} rows x {len(variants)} variants x {len(outcomes)} outcomes "
+          f"in {seconds:.2f}s ({tally.rows / max(seconds, 1e-9):,.0f} rows/s, ruleset {ruleset.version})",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
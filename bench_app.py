@@ -0,0 +1,145 @@
+"""Startup time and resident memory: six page servers against one app.
+
+    python bench_app.py
+    python bench_app.py --sessions 3
+
+Runs each deployment as real ``streamlit run`` processes on free local
+ports:
+
+    pages   one server per page script, the way the pages used to be
+            deployed (six Python processes, six copies of Streamlit and
+            of the rules)
+    app     a single ``streamlit run app.py`` serving every page through
+            st.navigation and one cached engine
+
+For each it reports the seconds until every server answers
+``/_stcore/health``, the seconds until one session per page (or
+--sessions per page) has rendered, and the summed resident memory of the
+server processes afterwards.  Needs Linux for /proc.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import streamlit_client
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Page script -> its URL path in app.py (the default page is served at "/")
+PAGES = {
+    "Guidelines_for_hospice_referral_practice.py": "",
+    "level_3_to_4_5.py": "level_3_to_4_5",
+    "level_3_to_4_7.py": "level_3_to_4_7",
+    "level_3_to_4_8.py": "level_3_to_4_8",
+    "level_3_to_4_9.py": "level_3_to_4_9",
+    "moderate_to_severe_heart_failure.py": "moderate_to_severe_heart_failure",
+}
+APP = "app.py"
+STARTUP_TIMEOUT = 60.0
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(script, port):
+    return subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", script,
+         "--server.headless", "true",
+         "--server.port", str(port),
+         "--server.address", "127.0.0.1",
+         "--browser.gatherUsageStats", "false",
+         "--server.fileWatcherType", "none"],
+        cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_healthy(url, process, deadline):
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server for {url} exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(url + "/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"{url} not healthy after {STARTUP_TIMEOUT:.0f}s")
+
+
+def rss_kb(pid):
+    with open(f"/proc/{pid}/status", encoding="ascii") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def render(targets, sessions):
+    """Open ``sessions`` sessions on every ``(url, page)`` and render them once."""
+    async def one(url, page):
+        session = await streamlit_client.Session.open(url, page)
+        try:
+            await session.run()
+        finally:
+            await session.close()
+
+    await asyncio.gather(*(one(url, page) for url, page in targets for _ in range(sessions)))
+
+
+def measure(deployment, sessions):
+    if deployment == "pages":
+        servers = [(script, free_port()) for script in PAGES]
+        targets = [(f"http://127.0.0.1:{port}", "") for _, port in servers]
+    else:
+        port = free_port()
+        servers = [(APP, port)]
+        targets = [(f"http://127.0.0.1:{port}", path) for path in PAGES.values()]
+
+    started = time.perf_counter()
+    processes = [start_server(script, port) for script, port in servers]
+    try:
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        for process, (_, port) in zip(processes, servers):
+            wait_healthy(f"http://127.0.0.1:{port}", process, deadline)
+        healthy = time.perf_counter() - started
+        asyncio.run(render(targets, sessions))
+        rendered = time.perf_counter() - started
+        memory = sum(rss_kb(process.pid) for process in processes)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+    return {"processes": len(processes), "healthy": healthy, "rendered": rendered, "rss_kb": memory}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1, help="sessions rendered per page (default: 1)")
+    parser.add_argument("--deployment", choices=["pages", "app"], action="append",
+                        help="measure only this deployment (repeatable)")
+    args = parser.parse_args(argv)
+
+    print(f"{'deployment':<11} {'processes':>9} {'healthy':>9} {'rendered':>9} {'RSS':>9}")
+    results = {}
+    for deployment in args.deployment or ["pages", "app"]:
+        result = results[deployment] = measure(deployment, args.sessions)
+        print(f"{deployment:<11} {result['processes']:>9} {result['healthy']:>8.2f}s "
+              f"{result['rendered']:>8.2f}s {result['rss_kb'] / 1024:>7.1f}MB", flush=True)
+    if len(results) == 2:
+        pages, app = results["pages"], results["app"]
+        print(f"app.py uses {app['rss_kb'] / pages['rss_kb']:.0%} of the memory and "
+              f"{app['rendered'] / pages['rendered']:.0%} of the startup time of six servers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Cold-start cost of the Streamlit-free modules, checked against budgets.
+
+    python bench_import.py
+    python bench_import.py --repeat 10 --verbose
+
+Each module is imported in a fresh interpreter under ``python -X importtime``
+and the harness reports its cumulative import time (median over --repeat
+runs) and the process's peak resident memory.  A module fails when it takes
+longer than its budget in BUDGETS, or when it pulls in Streamlit, NumPy or
+pandas: the rules, scale tables and workflow content must import with the
+standard library alone, so batch and service workers start quickly.
+``streamlit`` is measured too, for reference.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Module -> cumulative import budget in milliseconds
+BUDGETS = {
+    "scales": 10,
+    "rules": 25,
+    "hf_workflow": 10,
+    "decision_cache": 40,
+    "score_assessments": 50,
+}
+
+FORBIDDEN = ("streamlit", "numpy", "pandas")
+REFERENCE = ("streamlit",)
+
+# Imported with a plain import statement: -X importtime does not report the
+# top-level module of an importlib.import_module() call
+_PROBE = (
+    "import {module}; import json, resource, sys; "
+    "print(json.dumps({{'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, "
+    "'heavy': sorted(m for m in {forbidden!r} if m in sys.modules)}}))"
+)
+
+
+def import_once(module):
+    """``(milliseconds, peak RSS in KiB, forbidden modules loaded)`` for one cold import."""
+    done = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module, forbidden=FORBIDDEN)],
+        cwd=HERE, capture_output=True, text=True, check=True,
+    )
+    cumulative = None
+    for line in done.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        _, total, name = line[len("import time:"):].split("|")
+        if name.strip() == module and name.startswith(" " + module):
+            cumulative = int(total)
+    probe = json.loads(done.stdout.splitlines()[-1])
+    return (cumulative or 0) / 1000, probe["rss_kb"], probe["heavy"]
+
+
+def baseline_rss():
+    done = subprocess.run(
+        [sys.executable, "-c", "import resource; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"],
+        capture_output=True, text=True, check=True,
+    )
+    return int(done.stdout)
+
+
+def measure(module, repeat):
+    runs = [import_once(module) for _ in range(repeat)]
+    return {
+        "ms": statistics.median(ms for ms, _, _ in runs),
+        "rss_kb": max(rss for _, rss, _ in runs),
+        "heavy": runs[0][2],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="cold imports per module (default: 5)")
+    parser.add_argument("--verbose", action="store_true", help="also list the forbidden modules each import loads")
+    args = parser.parse_args(argv)
+
+    # Warm the bytecode cache so the first run does not time compilation
+    for module in (*BUDGETS, *REFERENCE):
+        import_once(module)
+    interpreter_kb = baseline_rss()
+
+    failures = []
+    print(f"{'module':<20} {'import':>9} {'peak RSS':>10} {'over python':>12}  budget")
+    for module in (*BUDGETS, *REFERENCE):
+        result = measure(module, args.repeat)
+        budget = BUDGETS.get(module)
+        if budget is None:
+            verdict = "reference"
+        elif result["heavy"]:
+            verdict = f"IMPORTS {', '.join(result['heavy'])}"
+        elif result["ms"] > budget:
+            verdict = "OVER"
+        else:
+            verdict = "ok"
+        if budget is not None and verdict != "ok":
+            failures.append(module)
+        print(f"{module:<20} {result['ms']:>7.1f}ms {result['rss_kb'] / 1024:>8.1f}MB "
+              f"{(result['rss_kb'] - interpreter_kb) / 1024:>+10.1f}MB  "
+              f"{f'{budget}ms ' if budget else ''}{verdict}", flush=True)
+        if args.verbose and result["heavy"]:
+            print(f"  loads {', '.join(result['heavy'])}")
+    if failures:
+        print(f"over budget or importing heavy modules: {', '.join(failures)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
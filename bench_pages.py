@@ -0,0 +1,286 @@
+"""Rerun latency of every Streamlit page, driven through AppTest.
+
+    python bench_pages.py                  # all pages, fail on a blown budget
+    python bench_pages.py --page level_3_to_4_9.py --repeat 10 --verbose
+    python bench_pages.py --form-mode      # the same patients in form mode
+
+Each page is driven through a scripted clinician session: one step is what a
+user does before the page reruns (pick conditions, answer a scale, type a
+lab value...).  For every rerun the harness records how long the script took
+and how many elements it emitted; per page it reports the number of reruns
+and the median, p90 and worst rerun time over --repeat sessions.  A page
+fails when its median or worst rerun exceeds its entry in BUDGETS, or when
+a session raises.
+
+``--form-mode`` opens the pages with ``?mode=form`` and enters the same
+patients the way form mode is used: pick the conditions, answer the PPS
+fragment, then fill in everything else and submit once.  Only those steps
+rerun the page, so compare the rerun counts as well as the latencies.
+
+Liver cirrhosis and dementia are never selected together: on most pages both
+sections ask for albumin, and Streamlit rejects the second input as a
+duplicate element.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from streamlit.testing.v1 import AppTest
+
+import rules
+import scales
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TIMEOUT = 30
+
+# (widget kind, label, value) changes applied together before one rerun
+CONDITIONS = "Select applicable conditions:"
+
+# Hospice referral page and the Level 3 -> 4 pages that share its layout
+LABEL_SESSION = [
+    [("multiselect", CONDITIONS, [rules.HF])],
+    [("text_input", "Heart Failure: Enter ejection fraction (EF) within last year (%)", "18")],
+    [("selectbox", "NYHA Classification: Select the description that best fits the patient:",
+      scales.NYHA_DESCRIPTIONS[3])],
+    [("multiselect", CONDITIONS, [rules.HF, rules.PULMONARY])],
+    [("radio", "Pulmonary Disease: Is the patient dependent on supplemental oxygen?", "Yes")],
+    [("selectbox", "mMRC Dyspnea Scale: Select the description that best fits the patient:",
+      scales.MMRC_DESCRIPTIONS[4])],
+    [("multiselect", CONDITIONS, [rules.HF, rules.PULMONARY, rules.CANCER])],
+    [("multiselect", "Cancer: Select all that apply", ["Evidence of metastases"])],
+    [("multiselect", CONDITIONS, [rules.HF, rules.PULMONARY, rules.CANCER, rules.DEMENTIA])],
+    [("selectbox", "FAST Scale: Select the stage that best matches the patient:", scales.FAST_DESCRIPTIONS[6])],
+    [("multiselect", "Dementia/Stroke: Select all complications present", ["Pressure ulcers"])],
+    [("selectbox", "PPS: What is the ambulation status?", "Mainly Sit/Lie")],
+    [("number_input", "Current Weight (kg)", 61.0)],
+    [("number_input", "Weight 6–12 Months Ago (kg)", 70.0)],
+    [("multiselect", CONDITIONS, [rules.CKD, rules.LIVER, rules.HIV])],
+    [("radio", "CKD: Is the patient on dialysis?", "No")],
+    [("number_input", "eGFR (ml/min/1.73 m²)", 12.0)],
+    [("number_input", "INR", 1.8)],
+    [("number_input", "Serum Albumin (g/dL)", 2.4)],
+    [("multiselect", "Liver Cirrhosis: Select complications present", ["Ascites"])],
+    [("number_input", "HIV: Enter most recent CD4 count (cells/mm³)", 150)],
+]
+
+LEVEL_5_SESSION = [
+    [("multiselect", CONDITIONS, [rules.HF])],
+    [("text_input", "Heart Failure: Enter ejection fraction (EF) within last year (%)", "18")],
+    [("selectbox", "NYHA Class", "IV")],
+    [("multiselect", CONDITIONS, [rules.HF, rules.PULMONARY])],
+    [("radio", "Pulmonary Disease: Is the patient dependent on supplemental oxygen?", "Yes")],
+    [("selectbox", "mMRC Dyspnea Scale", "4")],
+    [("multiselect", CONDITIONS, [rules.HF, rules.PULMONARY, rules.CANCER, "Dementia/Stroke"])],
+    [("multiselect", "Cancer: Select all that apply", ["Pleural effusion"])],
+    [("selectbox", "FAST Scale (Dementia Severity)", "7")],
+    [("multiselect", "Dementia/Stroke: Select all complications present", ["Pressure ulcers"])],
+    [("slider", "Palliative Performance Scale (PPS) %", 40)],
+    [("number_input", "Current Weight (kg)", 61.0)],
+    [("number_input", "Weight 6–12 Months Ago (kg)", 70.0)],
+    [("text_input", "Blood Pressure (e.g., 110/70)", "95/60")],
+    [("multiselect", CONDITIONS, [rules.CKD, rules.LIVER, rules.HIV])],
+    [("radio", "CKD: Is the patient on dialysis?", "No")],
+    [("number_input", "INR", 1.8)],
+    [("number_input", "Serum Albumin (g/dL)", 2.4)],
+    [("multiselect", "Liver Cirrhosis: Select complications present", ["Ascites"])],
+    [("number_input", "HIV: Enter most recent CD4 count", 150)],
+]
+
+SUBMIT = ("button", "Submit assessment", None)
+
+LABEL_FORM_SESSION = [
+    [("multiselect", CONDITIONS, [rules.HF, rules.PULMONARY, rules.CANCER, rules.DEMENTIA])],
+    [("selectbox", "PPS: What is the ambulation status?", "Mainly Sit/Lie")],
+    [
+        ("text_input", "Heart Failure: Enter ejection fraction (EF) within last year (%)", "18"),
+        ("selectbox", "NYHA Classification: Select the description that best fits the patient:",
+         scales.NYHA_DESCRIPTIONS[3]),
+        ("radio", "Pulmonary Disease: Is the patient dependent on supplemental oxygen?", "Yes"),
+        ("selectbox", "mMRC Dyspnea Scale: Select the description that best fits the patient:",
+         scales.MMRC_DESCRIPTIONS[4]),
+        ("multiselect", "Cancer: Select all that apply", ["Evidence of metastases"]),
+        ("selectbox", "FAST Scale: Select the stage that best matches the patient:", scales.FAST_DESCRIPTIONS[6]),
+        ("multiselect", "Dementia/Stroke: Select all complications present", ["Pressure ulcers"]),
+        ("number_input", "Current Weight (kg)", 61.0),
+        ("number_input", "Weight 6–12 Months Ago (kg)", 70.0),
+        SUBMIT,
+    ],
+    [("multiselect", CONDITIONS, [rules.CKD, rules.LIVER, rules.HIV])],
+    [
+        ("radio", "CKD: Is the patient on dialysis?", "No"),
+        ("number_input", "eGFR (ml/min/1.73 m²)", 12.0),
+        ("number_input", "INR", 1.8),
+        ("number_input", "Serum Albumin (g/dL)", 2.4),
+        ("multiselect", "Liver Cirrhosis: Select complications present", ["Ascites"]),
+        ("number_input", "HIV: Enter most recent CD4 count (cells/mm³)", 150),
+        SUBMIT,
+    ],
+]
+
+LEVEL_5_FORM_SESSION = [
+    [("multiselect", CONDITIONS, [rules.HF, rules.PULMONARY, rules.CANCER, "Dementia/Stroke"])],
+    [
+        ("text_input", "Heart Failure: Enter ejection fraction (EF) within last year (%)", "18"),
+        ("selectbox", "NYHA Class", "IV"),
+        ("radio", "Pulmonary Disease: Is the patient dependent on supplemental oxygen?", "Yes"),
+        ("selectbox", "mMRC Dyspnea Scale", "4"),
+        ("multiselect", "Cancer: Select all that apply", ["Pleural effusion"]),
+        ("selectbox", "FAST Scale (Dementia Severity)", "7"),
+        ("multiselect", "Dementia/Stroke: Select all complications present", ["Pressure ulcers"]),
+        ("slider", "Palliative Performance Scale (PPS) %", 40),
+        ("number_input", "Current Weight (kg)", 61.0),
+        ("number_input", "Weight 6–12 Months Ago (kg)", 70.0),
+        ("text_input", "Blood Pressure (e.g., 110/70)", "95/60"),
+        SUBMIT,
+    ],
+    [("multiselect", CONDITIONS, [rules.CKD, rules.LIVER, rules.HIV])],
+    [
+        ("radio", "CKD: Is the patient on dialysis?", "No"),
+        ("number_input", "INR", 1.8),
+        ("number_input", "Serum Albumin (g/dL)", 2.4),
+        ("multiselect", "Liver Cirrhosis: Select complications present", ["Ascites"]),
+        ("number_input", "HIV: Enter most recent CD4 count", 150),
+        SUBMIT,
+    ],
+]
+
+HEART_FAILURE_SESSION = [
+    [("selectbox", "Select your role:", role)] for role in (
+        "Advanced Care Paramedic", "Scheduling Coordinator", "Community Health Worker", "CRNP",
+        "Physician", "Nurse Clinical Care Coordinator", "Triage Nurse",
+    )
+] + [[("selectbox", "Select the day:", "Day 2")], [("selectbox", "Select your role:", "Physician")]]
+
+SESSIONS = {
+    "Guidelines_for_hospice_referral_practice.py": LABEL_SESSION,
+    "level_3_to_4_5.py": LEVEL_5_SESSION,
+    "level_3_to_4_7.py": LABEL_SESSION,
+    "level_3_to_4_8.py": LABEL_SESSION,
+    "level_3_to_4_9.py": LABEL_SESSION,
+    "moderate_to_severe_heart_failure.py": HEART_FAILURE_SESSION,
+}
+
+# The heart-failure workflow has no form mode
+FORM_SESSIONS = {
+    **SESSIONS,
+    "Guidelines_for_hospice_referral_practice.py": LABEL_FORM_SESSION,
+    "level_3_to_4_5.py": LEVEL_5_FORM_SESSION,
+    "level_3_to_4_7.py": LABEL_FORM_SESSION,
+    "level_3_to_4_8.py": LABEL_FORM_SESSION,
+    "level_3_to_4_9.py": LABEL_FORM_SESSION,
+}
+
+# Per-page rerun budgets in milliseconds (median, worst), with headroom over
+# the AppTest timings on a single-core CI runner
+BUDGETS = {
+    "Guidelines_for_hospice_referral_practice.py": (60, 250),
+    "level_3_to_4_5.py": (60, 250),
+    "level_3_to_4_7.py": (60, 250),
+    "level_3_to_4_8.py": (60, 250),
+    "level_3_to_4_9.py": (60, 250),
+    "moderate_to_severe_heart_failure.py": (40, 250),
+}
+
+
+def count_elements(node):
+    children = getattr(node, "children", None)
+    if children is None:
+        return 1
+    return sum(count_elements(child) for child in children.values())
+
+
+def _widget(at, kind, label):
+    for widget in getattr(at, kind):
+        if widget.label == label:
+            return widget
+    raise LookupError(f"no {kind} labelled {label!r} on the page")
+
+
+def _run(at):
+    started = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return elapsed, count_elements(at.main)
+
+
+def run_session(page, steps, form_mode=False):
+    """``[(seconds, elements)]`` for the first run and one rerun per step."""
+    at = AppTest.from_file(os.path.join(HERE, page), default_timeout=TIMEOUT)
+    if form_mode:
+        at.query_params["mode"] = "form"
+    reruns = [_run(at)]
+    for changes in steps:
+        for kind, label, value in changes:
+            widget = _widget(at, kind, label)
+            if kind == "button":
+                widget.click()
+            else:
+                widget.set_value(value)
+        reruns.append(_run(at))
+    return reruns
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def bench_page(page, repeat, form_mode=False):
+    """Timing summary for ``repeat`` sessions on ``page``; first runs are excluded."""
+    sessions = FORM_SESSIONS if form_mode else SESSIONS
+    times, elements, reruns = [], [], 0
+    for _ in range(repeat):
+        session = run_session(page, sessions[page], form_mode)
+        reruns = len(session) - 1
+        times += [seconds for seconds, _ in session[1:]]
+        elements += [count for _, count in session]
+    return {
+        "reruns": reruns,
+        "median_ms": statistics.median(times) * 1000,
+        "p90_ms": percentile(times, 90) * 1000,
+        "max_ms": max(times) * 1000,
+        "elements": (min(elements), max(elements)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page", action="append", choices=list(SESSIONS), help="page to run (repeatable, default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="sessions per page (default: 5)")
+    parser.add_argument("--verbose", action="store_true", help="print every rerun of the first session")
+    parser.add_argument("--form-mode", action="store_true", help="run the pages in form mode")
+    args = parser.parse_args(argv)
+
+    failures = []
+    print(f"{'page':<45} {'reruns':>6} {'median':>8} {'p90':>8} {'max':>8} {'elements':>9}  budget")
+    for page in args.page or SESSIONS:
+        if args.verbose:
+            steps = (FORM_SESSIONS if args.form_mode else SESSIONS)[page]
+            for i, (seconds, count) in enumerate(run_session(page, steps, args.form_mode)):
+                print(f"  {page} run {i}: {seconds * 1000:.1f} ms, {count} elements")
+        try:
+            result = bench_page(page, args.repeat, args.form_mode)
+        except (RuntimeError, LookupError) as exc:
+            failures.append(page)
+            print(f"{page:<45} FAILED: {exc}")
+            continue
+        median_budget, max_budget = BUDGETS[page]
+        ok = result["median_ms"] <= median_budget and result["max_ms"] <= max_budget
+        if not ok:
+            failures.append(page)
+        low, high = result["elements"]
+        print(f"{page:<45} {result['reruns']:>6} {result['median_ms']:>6.1f}ms {result['p90_ms']:>6.1f}ms "
+              f"{result['max_ms']:>6.1f}ms {f'{low}-{high}':>9}  {median_budget}/{max_budget}ms "
+              f"{'ok' if ok else 'OVER'}", flush=True)
+    if failures:
+        print(f"over budget or failing: {', '.join(failures)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
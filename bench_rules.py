@@ -0,0 +1,160 @@
+"""Rule-engine benchmarks on synthetic cohorts, checked against a baseline.
+
+    python bench_rules.py                          # 1k, 100k and 10M rows
+    python bench_rules.py --sizes 1k,100k --check  # exit 1 on a regression
+    python bench_rules.py --save-baseline          # record this machine's numbers
+
+For each cohort size (from synthetic.packed_cohort, fixed seed):
+
+    per_record           rules.evaluate on every assessment mapping
+    per_record_variants  rules.evaluate_all (all five variants) per mapping
+    batch                records.cohort_table + cohort.score_cohort
+    variants             cohort.score_variants and each variant's tier
+                         cross-tab against hospice
+    truth_table          truth_table.score_packed, the lookup backend,
+                         straight from the packed rows
+
+The per-record benchmarks run on at most --per-record-limit rows, since
+building ten million mappings measures the generator rather than the rules.
+Each result is the best of --repeat runs, in records per second, and is
+compared with the same benchmark and size in the baseline file.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+import cohort
+import records
+import rules
+import synthetic
+import truth_table
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+SIZES = "1k,100k,10M"
+PER_RECORD_LIMIT = 100_000
+SEED = 20240601
+
+_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    if text[-1:] in _SUFFIXES:
+        return int(float(text[:-1]) * _SUFFIXES[text[-1]])
+    return int(text)
+
+
+def size_label(n):
+    for suffix, scale in (("M", 1_000_000), ("k", 1_000)):
+        if n >= scale and n % scale == 0:
+            return f"{n // scale}{suffix}"
+    return str(n)
+
+
+def best_of(repeat, func):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def tier_crosstab(reference, other):
+    """4x4 counts of (reference tier, other tier) codes."""
+    return np.bincount(reference.astype(np.intp) * 4 + other, minlength=16).reshape(4, 4)
+
+
+def compare_variants(table):
+    results = cohort.score_variants(table)
+    hospice = results["hospice"]["tier"]
+    return {name: tier_crosstab(hospice, out["tier"]) for name, out in results.items()}
+
+
+def run(sizes, repeat, per_record_limit, seed=SEED):
+    """Yield ``(benchmark, size label, rows, seconds)`` for every benchmark."""
+    truth_table.build()
+    for n in sizes:
+        label = size_label(n)
+        packed = synthetic.packed_cohort(n, seed)
+        rows = list(map(records.unpack, packed[:per_record_limit]))
+        # Larger cohorts are slow enough that one run is a stable measurement
+        runs = repeat if n <= 1_000_000 else 1
+
+        yield "per_record", label, len(rows), best_of(runs, lambda: [rules.evaluate(a) for a in rows])
+        yield "per_record_variants", label, len(rows), best_of(runs, lambda: [rules.evaluate_all(a) for a in rows])
+        del rows
+        yield "batch", label, n, best_of(runs, lambda: cohort.score_cohort(records.cohort_table(packed)))
+        table = records.cohort_table(packed)
+        yield "variants", label, n, best_of(runs, lambda: compare_variants(table))
+        del table
+        yield "truth_table", label, n, best_of(runs, lambda: truth_table.score_packed(packed))
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def machine():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=SIZES, help=f"comma-separated cohort sizes (default: {SIZES})")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark, best is kept (default: 3)")
+    parser.add_argument("--per-record-limit", type=int, default=PER_RECORD_LIMIT)
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON file (default: bench_baseline.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any benchmark regressed past --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against the baseline, as a fraction (default: 0.25)")
+    args = parser.parse_args(argv)
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+
+    baseline = load_baseline(args.baseline)
+    expected = baseline["results"] if baseline else {}
+    results, regressions = {}, []
+    print(f"{'benchmark':<20} {'size':>5} {'rows':>10} {'seconds':>8} {'records/s':>12} {'baseline':>12} {'ratio':>6}")
+    for name, label, rows, seconds in run(sizes, args.repeat, args.per_record_limit):
+        rate = rows / seconds
+        results.setdefault(name, {})[label] = round(rate)
+        reference = expected.get(name, {}).get(label)
+        if reference:
+            ratio = rate / reference
+            if ratio < 1 - args.tolerance:
+                regressions.append(f"{name}@{label}")
+            compared = f"{reference:>12,} {ratio:>5.2f}x"
+        else:
+            compared = f"{'-':>12} {'':>6}"
+        print(f"{name:<20} {label:>5} {rows:>10,} {seconds:>8.3f} {rate:>12,.0f} {compared}", flush=True)
+
+    if args.save_baseline:
+        merged = {name: {**expected.get(name, {}), **rates} for name, rates in results.items()}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"machine": machine(), "results": merged}, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+    if regressions:
+        print(f"regressed more than {args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
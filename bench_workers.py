@@ -0,0 +1,98 @@
+"""Throughput of score_assessments.py from 1 to N worker processes.
+
+    python bench_workers.py --records 500000 --max-workers 32
+
+Writes a synthetic JSONL extract to a temporary file, scores it with 1, 2, 4,
+... workers (up to --max-workers) for every requested variant and prints
+records per second and the speedup over one worker.
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import rules
+import score_assessments
+
+
+def synthetic_assessment(rng):
+    conditions = rng.sample(rules.CONDITIONS, rng.randint(0, 3))
+    return {
+        "selected_conditions": conditions,
+        "ef": str(rng.randint(10, 60)),
+        "oxygen_dependent": rng.choice(["Yes", "No"]),
+        "on_dialysis": rng.choice(["Yes", "No"]),
+        "cancer_flags": rng.sample(["Pleural effusion", "Transfusion requirement"], rng.randint(0, 1)),
+        "liver_flags": rng.sample(["Ascites", "Variceal bleeding"], rng.randint(0, 1)),
+        "dementia_flags": rng.sample(["Pressure ulcers", "Recurrent falls"], rng.randint(0, 1)),
+        "cd4_count": rng.randint(0, 800),
+        "pps": rng.randrange(10, 101, 10),
+        "nyha": f"NYHA Class {rng.choice(['I', 'II', 'III', 'IV'])}",
+        "mmrc": f"mMRC Grade {rng.randint(0, 4)}",
+        "fast_scale": f"FAST Stage {rng.randint(1, 7)}",
+        "current_weight": round(rng.uniform(40, 100), 1),
+        "weight_earlier": round(rng.uniform(40, 100), 1),
+        "inr": round(rng.uniform(0.8, 3.0), 1),
+        "albumin": round(rng.uniform(1.5, 4.5), 1),
+        "egfr": round(rng.uniform(5, 90), 1),
+    }
+
+
+def write_extract(path, records, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(records):
+            a = synthetic_assessment(rng)
+            a[score_assessments.ID_FIELD] = i
+            f.write(json.dumps(a) + "\n")
+
+
+def run_once(path, variant, workers, chunk_size):
+    with open(path, encoding="utf-8") as source, open(os.devnull, "w", encoding="utf-8") as sink:
+        raw_records = score_assessments.read_raw(source, "jsonl")
+        started = time.perf_counter()
+        if workers > 1:
+            for block in score_assessments.score_parallel(raw_records, "jsonl", variant, False, workers, chunk_size):
+                sink.write(block)
+        else:
+            score_assessments.write_jsonl(score_assessments.score_records(raw_records, "jsonl", variant, False), sink)
+        return time.perf_counter() - started
+
+
+def worker_counts(max_workers):
+    counts = []
+    n = 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    counts.append(max_workers)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=score_assessments.CHUNK_SIZE)
+    parser.add_argument("--variant", action="append", choices=list(rules.VARIANTS),
+                        help="variant to benchmark (repeatable, default: hospice and level_3_to_4_9)")
+    args = parser.parse_args(argv)
+    variants = args.variant or ["hospice", "level_3_to_4_9"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "extract.jsonl")
+        write_extract(path, args.records)
+        print(f"{'variant':<16} {'workers':>7} {'seconds':>8} {'records/s':>11} {'speedup':>7}")
+        for variant in variants:
+            baseline = None
+            for workers in worker_counts(args.max_workers):
+                elapsed = run_once(path, variant, workers, args.chunk_size)
+                baseline = baseline or elapsed
+                print(f"{variant:<16} {workers:>7} {elapsed:>8.2f} {args.records / elapsed:>11,.0f} {baseline / elapsed:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""Vectorized scoring for whole cohorts.
+
+``score_cohort`` takes a columnar patient table -- a pandas DataFrame or any
+mapping of column name to array -- and evaluates every force_transition
+condition, the fallback ``flags`` count and the tier with NumPy array
+operations.  Results agree with ``rules.evaluate`` (and so with the Streamlit
+pages) row for row.  ``score_variants`` derives the variant-independent masks
+once and scores every rule variant from them in the same pass, and
+``score_grid`` tries many candidate cutoffs in one broadcast pass.  The
+cutoffs are those of the live ``rules.Ruleset``, read once per call, so a
+reload never splits a batch.
+
+Columns (missing columns take the default in brackets):
+
+    has_hf, has_pulmonary, has_ckd, has_cancer,
+    has_liver, has_dementia, has_hiv      bool   [False]
+    ef, cd4_count, inr, albumin, egfr     float  [NaN = not entered]
+    oxygen_dependent, on_dialysis         bool   [False]
+    n_cancer_flags, n_liver_flags,
+    n_dementia_flags                      int    [0]
+    pps                                   int    (required)
+    nyha, mmrc, fast_scale                int    [-1 = not assessed]
+    current_weight, weight_earlier        float  [0.0]
+"""
+
+import dataclasses
+import functools
+import time
+
+import numpy as np
+
+import rules
+import scales
+
+# Condition name -> boolean column
+CONDITION_COLUMNS = {
+    rules.HF: "has_hf",
+    rules.PULMONARY: "has_pulmonary",
+    rules.CKD: "has_ckd",
+    rules.CANCER: "has_cancer",
+    rules.LIVER: "has_liver",
+    rules.DEMENTIA: "has_dementia",
+    rules.HIV: "has_hiv",
+}
+
+COLUMN_DEFAULTS = {
+    **{column: False for column in CONDITION_COLUMNS.values()},
+    "ef": np.nan,
+    "oxygen_dependent": False,
+    "on_dialysis": False,
+    "n_cancer_flags": 0,
+    "n_liver_flags": 0,
+    "n_dementia_flags": 0,
+    "cd4_count": np.nan,
+    "nyha": -1,
+    "mmrc": -1,
+    "fast_scale": -1,
+    "current_weight": 0.0,
+    "weight_earlier": 0.0,
+    "inr": np.nan,
+    "albumin": np.nan,
+    "egfr": np.nan,
+}
+
+# Tier codes used in the ``tier`` output column, indexes into rules.TIERS
+RED, ORANGE, BLUE, GREEN = range(4)
+
+
+def _float_or_nan(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def columns_from_assessments(assessments):
+    """Convert ``rules.evaluate``-style assessment mappings into a column table."""
+    return columns_from_features([rules.features(a) for a in assessments])
+
+
+def columns_from_features(rows):
+    """Column table from ``rules.features`` results."""
+    table = {}
+    for condition, column in CONDITION_COLUMNS.items():
+        table[column] = np.array([condition in a["conditions"] for a in rows], dtype=bool)
+    table["ef"] = np.array([_float_or_nan(a["ef"]) for a in rows])
+    table["oxygen_dependent"] = np.array([a["oxygen_dependent"] == "Yes" for a in rows], dtype=bool)
+    table["on_dialysis"] = np.array([a["on_dialysis"] != "No" for a in rows], dtype=bool)
+    for key in ("cancer_flags", "liver_flags", "dementia_flags"):
+        table["n_" + key] = np.array([len(a[key]) for a in rows], dtype=np.int16)
+    for key in ("cd4_count", "inr", "albumin", "egfr"):
+        table[key] = np.array([np.nan if a[key] is None else float(a[key]) for a in rows])
+    table["pps"] = np.array([a["pps"] for a in rows], dtype=np.int16)
+    for key, grade in (("nyha", "nyha_grade"), ("mmrc", "mmrc_grade"), ("fast_scale", "fast_grade")):
+        table[key] = np.array([a[grade] for a in rows], dtype=np.int8)
+    for key in ("current_weight", "weight_earlier"):
+        table[key] = np.array([float(a[key]) for a in rows])
+    return table
+
+
+def scale_column(answers, grades):
+    """Vectorized ``scales.grade`` for a column of raw answers.
+
+    ``grades`` is scales.NYHA_GRADES, MMRC_GRADES or FAST_GRADES.  Each
+    distinct answer is looked up once; empty or unrecognized answers give -1.
+    """
+    uniques, inverse = np.unique(np.asarray(answers, dtype=str), return_inverse=True)
+    lookup = np.array([grades.get(answer, -1) for answer in uniques], dtype=np.int8)
+    return lookup[inverse.reshape(-1)]
+
+
+def pps_column(ambulation, first, second=None):
+    """PPS for columns of raw questionnaire answers, -1 where there is no score.
+
+    ``first`` and ``second`` hold the follow-up answers in the order of
+    scales.PPS_QUESTIONS (``second`` only matters for Reduced and Mainly
+    Sit/Lie).  Each distinct combination is looked up once.
+    """
+    ambulation = np.asarray(ambulation, dtype=str)
+    first = np.asarray(first, dtype=str)
+    second = np.full(len(ambulation), "") if second is None else np.asarray(second, dtype=str)
+    keys = np.char.add(np.char.add(np.char.add(ambulation, "\x1f"), np.char.add(first, "\x1f")), second)
+    uniques, inverse = np.unique(keys, return_inverse=True)
+    lookup = np.full(len(uniques), -1, dtype=np.int16)
+    for i, key in enumerate(uniques):
+        amb, answer1, answer2 = key.split("\x1f")
+        answers = (answer1, answer2)[: len(scales.PPS_QUESTIONS.get(amb, ()))]
+        score = scales.PPS_BY_ANSWERS.get((amb, *answers))
+        if score is not None:
+            lookup[i] = score
+    return lookup[inverse.reshape(-1)]
+
+
+def _column(table, name, n):
+    if name in table:
+        return np.asarray(table[name])
+    if name not in COLUMN_DEFAULTS:
+        raise KeyError(f"cohort table has no {name!r} column")
+    return np.full(n, COLUMN_DEFAULTS[name])
+
+
+def weight_loss_pct(current_weight, weight_earlier):
+    losing = (weight_earlier > 0) & (current_weight < weight_earlier)
+    out = np.zeros(len(current_weight))
+    np.divide((weight_earlier - current_weight), weight_earlier, out=out, where=losing)
+    return out * 100
+
+
+def _shared(table):
+    """Columns and masks every variant uses, read once per table.
+
+    Masks that depend on a cutoff are made on first use by ``_decide`` and
+    kept in ``cache`` keyed by the cutoff, so variants with the same
+    thresholds still share them.
+    """
+    n = len(table["pps"])
+    col = lambda name: _column(table, name, n)
+
+    # Unset numbers are NaN, so every comparison against them is False
+    return {
+        "n": n,
+        "index": getattr(table, "index", None),
+        "pps": col("pps"),
+        "mmrc": col("mmrc"),
+        "fast_scale": col("fast_scale"),
+        "ef": col("ef"),
+        "egfr": col("egfr"),
+        "inr": col("inr"),
+        "albumin": col("albumin"),
+        "cd4_count": col("cd4_count"),
+        "weight_loss": weight_loss_pct(col("current_weight"), col("weight_earlier")),
+        "nyha_iv": col("nyha") == 4,
+        "has_hf": col("has_hf"),
+        "has_pulmonary": col("has_pulmonary") & col("oxygen_dependent"),
+        "ckd_no_dialysis": col("has_ckd") & ~col("on_dialysis"),
+        "has_cancer": col("has_cancer"),
+        "cancer_flags": col("n_cancer_flags") > 0,
+        "has_liver": col("has_liver") & (col("n_liver_flags") > 0),
+        "has_dementia": col("has_dementia") & (col("n_dementia_flags") > 0),
+        "has_hiv": col("has_hiv"),
+        "any_condition": np.logical_or.reduce([col(c) for c in CONDITION_COLUMNS.values()]),
+        "cache": {},
+    }
+
+
+def _cached(s, key, make):
+    if s["cache"] is None:  # score_grid: array cutoffs cannot be keys
+        return make()
+    if key not in s["cache"]:
+        s["cache"][key] = make()
+    return s["cache"][key]
+
+
+def _compare(s, name, compare, cut):
+    """``compare(s[name], cut)``, computed once per table and cutoff.
+
+    Float columns are compared in their own precision: a float32 lab (see
+    records.py) stands for the decimal that was entered, so a stored 1.7 must
+    equal a cutoff of 1.7, which only holds once the cutoff is rounded the
+    same way.
+    """
+    column = s[name]
+    if column.dtype.kind == "f":
+        cut = column.dtype.type(cut)
+    return _cached(s, (name, compare.__name__, cut), lambda: compare(column, cut))
+
+
+def _isin(s, name, grades):
+    return _cached(s, (name, grades), lambda: np.isin(s[name], list(grades)))
+
+
+def _albumin_below(s, variant, cutoff):
+    def make():
+        # An albumin of exactly 0 is falsy on most pages and does not count
+        low = _compare(s, "albumin", np.less, cutoff)
+        return low if variant.zero_albumin_counts else low & (s["albumin"] != 0)
+
+    return _cached(s, ("albumin", cutoff, variant.zero_albumin_counts), make)
+
+
+def _score(s, variant, t):
+    """Condition masks, ``force_transition`` and ``flags`` of ``s`` under one variant.
+
+    Cutoffs in ``t`` may be arrays that broadcast against the row axis (see
+    ``score_grid``); the outputs then take their shape.
+    """
+    le = lambda name, cut: _compare(s, name, np.less_equal, cut)
+    weight_flag = _compare(s, "weight_loss", np.greater_equal, t.weight_loss)
+
+    out = {}
+    out["pps_decline"] = le("pps", t.pps_decline) & (weight_flag | _albumin_below(s, variant, t.albumin_decline))
+    out["heart_failure"] = _cached(s, ("heart_failure", t.ef), lambda: s["has_hf"] & (s["nyha_iv"] | le("ef", t.ef)))
+    out["pulmonary"] = s["has_pulmonary"] & _isin(s, "mmrc", variant.mmrc_force)
+    if variant.reads_egfr:
+        # A missing eGFR is read as 0 and so counts as ≤ the cutoff
+        out["ckd"] = _cached(s, ("ckd", t.egfr), lambda: s["ckd_no_dialysis"] & ~_compare(s, "egfr", np.greater, t.egfr))
+    else:
+        out["ckd"] = s["ckd_no_dialysis"]
+    out["cancer"] = _cached(
+        s, ("cancer", t.pps_cancer), lambda: s["has_cancer"] & (le("pps", t.pps_cancer) | s["cancer_flags"]),
+    )
+    out["liver"] = _cached(
+        s, ("liver", t.inr_liver, t.albumin_liver),
+        lambda: s["has_liver"] & _compare(s, "inr", np.greater_equal, t.inr_liver) & le("albumin", t.albumin_liver),
+    )
+    out["dementia"] = s["has_dementia"] & _isin(s, "fast_scale", variant.fast_force)
+    out["hiv"] = _cached(
+        s, ("hiv", t.cd4, t.pps_hiv), lambda: s["has_hiv"] & le("cd4_count", t.cd4) & le("pps", t.pps_hiv),
+    )
+
+    force_transition = functools.reduce(np.logical_or, [out[c] for c in rules.CONDITION_IDS])
+    common_flags = _cached(s, ("common_flags", t.pps_poor, t.weight_loss, t.inr_elevated), lambda: (
+        le("pps", t.pps_poor).astype(np.int8)
+        + s["nyha_iv"]
+        + weight_flag
+        + _compare(s, "inr", np.greater, t.inr_elevated)
+        + s["any_condition"]
+    ))
+    flags = (
+        common_flags
+        + _isin(s, "mmrc", variant.mmrc_flag)
+        + _isin(s, "fast_scale", variant.fast_flag)
+        + _albumin_below(s, variant, t.albumin_flag)
+    )
+
+    out["force_transition"] = force_transition
+    out["flags"] = flags
+    return out
+
+
+def _decide(s, variant, t):
+    """Score ``s`` under one variant and its ``rules.Thresholds``, read once for the batch."""
+    stats = rules._stats
+    started = time.perf_counter_ns() if stats is not None else 0
+    out = _score(s, variant, t)
+    tier = np.full(s["n"], GREEN, dtype=np.int8)
+    tier[out["flags"] >= t.blue_flags] = BLUE
+    tier[out["flags"] >= t.orange_flags] = ORANGE
+    tier[out["force_transition"]] = RED
+    out["tier"] = tier
+    out["weight_loss_pct"] = s["weight_loss"]
+
+    if stats is not None:
+        stats.record_batch(variant.name, out, time.perf_counter_ns() - started)
+    if s["index"] is not None:
+        import pandas as pd
+
+        return pd.DataFrame(out, index=s["index"])
+    return out
+
+
+def score_cohort(table, variant="hospice"):
+    """Score every row of ``table`` under one rule variant.
+
+    Returns a mapping (a DataFrame when ``table`` is one) with one boolean
+    column per id in ``rules.CONDITION_IDS``, plus ``force_transition``,
+    ``flags``, ``tier`` (codes into ``rules.TIERS``) and ``weight_loss_pct``.
+    """
+    variant = rules.get_variant(variant)
+    return _decide(_shared(table), variant, rules.current().thresholds_for(variant))
+
+
+def score_variants(table, variants=None, ruleset=None):
+    """Score every row of ``table`` under several variants (default: all).
+
+    Returns ``{variant name: score_cohort-style result}``; for a DataFrame
+    input the results are joined side by side under a variant column level.
+    ``ruleset`` defaults to the live one.
+    """
+    s = _shared(table)
+    ruleset = ruleset or rules.current()
+    results = {
+        v.name: _decide(s, v, ruleset.thresholds_for(v))
+        for v in map(rules.get_variant, variants or rules.VARIANTS)
+    }
+    if s["index"] is not None:
+        import pandas as pd
+
+        return pd.concat(results, axis=1)
+    return results
+
+
+def score_grid(table, variant, thresholds):
+    """Tier codes of every row of ``table`` under many cutoffs at once.
+
+    ``thresholds`` is a ``rules.Thresholds`` whose fields may be arrays, each
+    with a trailing axis of length 1 for the rows: ``albumin_flag`` of shape
+    ``(3, 1, 1)`` and ``orange_flags`` of shape ``(1, 2, 1)`` give a
+    ``(3, 2, rows)`` result, one tier column per combination, in one
+    broadcast pass.  Not recorded in rule_stats.
+    """
+    s = _shared(table)
+    s["cache"] = None
+    out = _score(s, rules.get_variant(variant), thresholds)
+    # A cutoff the variant does not read (eGFR on level_3_to_4_5) still gets its axis
+    cuts = (np.shape(getattr(thresholds, field.name)) for field in dataclasses.fields(thresholds))
+    shape = np.broadcast_shapes((s["n"],), *cuts)
+    tier = np.full(shape, GREEN, dtype=np.int8)
+    tier[np.broadcast_to(out["flags"] >= thresholds.blue_flags, shape)] = BLUE
+    tier[np.broadcast_to(out["flags"] >= thresholds.orange_flags, shape)] = ORANGE
+    tier[np.broadcast_to(out["force_transition"], shape)] = RED
+    return tier
+
+
+def tier_names(tier):
+    """Map an array of tier codes to their names."""
+    return np.asarray(rules.TIERS)[tier]
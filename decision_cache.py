@@ -0,0 +1,289 @@
+"""Memoized rule evaluation.
+
+``DecisionCache`` is a bounded LRU in front of ``rules.evaluate``.  Entries
+are keyed by the ruleset version, the variant and the canonical form of the
+assessment, so two mappings that differ only in key order, missing defaults
+or list-vs-tuple share an entry, while anything that changes the decision or
+its wording (including 2 vs 2.0, which the summary prints differently) does
+not.  The ruleset version covers the thresholds file, so once
+``rules.reload`` puts new cutoffs live, lookups key on the new version and
+entries made under the old one are simply never hit again (the LRU ages
+them out).  Hit, miss and eviction counters are kept for sizing.
+
+    cache = DecisionCache(maxsize=200_000)
+    decision = cache.evaluate(assessment, "level_3_to_4_9")
+    cache.stats()   # {"hits": ..., "misses": ..., "evictions": ..., ...}
+
+``DecisionStore`` keeps decisions in a local SQLite file so warm state
+survives restarts.  Pass one as ``store`` and the in-memory cache falls back
+to it on a miss and writes new decisions through to it:
+
+    cache = DecisionCache(store=DecisionStore("decisions.sqlite", ttl=7 * 86400))
+
+The file is opened in WAL mode, so any number of processes (Streamlit
+servers, batch workers) can read it while one writes.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import rules
+
+MAXSIZE = 100_000
+STORE_MAX_ENTRIES = 1_000_000
+
+_KEYS = tuple(rules.DEFAULTS)
+
+
+def canonical(assessment):
+    """Hashable canonical form of an assessment's rule inputs."""
+    a = rules.normalize(assessment)
+    return repr(tuple(
+        tuple(a[key]) if isinstance(a[key], (list, tuple)) else a[key]
+        for key in _KEYS
+    ))
+
+
+def _digest(version, variant_name, text):
+    key = f"{version}\x1f{variant_name}\x1f{text}"
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def assessment_hash(assessment, variant="hospice", version=None):
+    """Stable hex digest of (ruleset version, default the live one; variant; canonical assessment)."""
+    return _digest(version or rules.current().version, rules.get_variant(variant).name, canonical(assessment))
+
+
+class DecisionStore:
+    """SQLite-backed decision cache shared across processes and restarts.
+
+    Entries are keyed by ``assessment_hash``.  Entries older than ``ttl``
+    seconds are treated as missing.  The table is pruned when the store is
+    opened and after every ``max_entries * PRUNE_FRACTION`` writes: expired
+    entries and the oldest beyond ``max_entries`` are deleted, so it never
+    grows much past ``max_entries`` rows.  Each thread and process
+    gets its own connection.  With ``batch`` > 1, writes are buffered and
+    committed that many at a time (call ``flush`` when done).
+    """
+
+    PRUNE_FRACTION = 0.1
+
+    def __init__(self, path, ttl=None, max_entries=STORE_MAX_ENTRIES, batch=1, timeout=30.0):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.batch = batch
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = []
+        self._puts = 0
+        self._prune_every = max(1, int(max_entries * self.PRUNE_FRACTION))
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS decisions (
+                key TEXT PRIMARY KEY,
+                variant TEXT NOT NULL,
+                decision TEXT NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS decisions_created ON decisions (created);
+        """)
+        self.prune()
+
+    def _connect(self):
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():  # new thread, or forked
+            import sqlite3
+
+            local.conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            local.conn.execute("PRAGMA journal_mode=WAL")
+            local.conn.execute("PRAGMA synchronous=NORMAL")
+            local.pid = os.getpid()
+        return local.conn
+
+    def get(self, key, ruleset=None):
+        """The stored ``Decision`` for ``key``, or None if absent or expired.
+
+        Keys include the ruleset version, so the decision is given the
+        thresholds of ``ruleset`` (default: the live one) for its text.
+        """
+        row = self._connect().execute("SELECT decision, created FROM decisions WHERE key = ?", (key,)).fetchone()
+        if row is None or (self.ttl is not None and time.time() - row[1] > self.ttl):
+            return None
+        fields = json.loads(row[0])
+        if "values" not in fields:  # stored with its text, before decisions kept codes
+            return None
+        fields["fired"] = tuple(fields["fired"])
+        fields["values"] = tuple(tuple(v) if isinstance(v, list) else v for v in fields["values"])
+        fields["thresholds"] = (ruleset or rules.current()).thresholds_for(fields["variant"])
+        return rules.Decision(**fields)
+
+    def put(self, key, decision):
+        fields = {
+            "variant": decision.variant,
+            "tier": decision.tier,
+            "fired": decision.fired,
+            "flags": decision.flags,
+            "fired_mask": decision.fired_mask,
+            "interpretation_mask": decision.interpretation_mask,
+            "values": decision.values,
+        }
+        row = (key, decision.variant, json.dumps(fields, ensure_ascii=False), time.time())
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) < self.batch:
+                return
+            rows, self._pending = self._pending, []
+        self._write(rows)
+
+    def flush(self):
+        with self._lock:
+            rows, self._pending = self._pending, []
+        if rows:
+            self._write(rows)
+
+    def _write(self, rows):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO decisions (key, variant, decision, created) VALUES (?, ?, ?, ?)", rows,
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        before, self._puts = self._puts, self._puts + len(rows)
+        if before // self._prune_every != self._puts // self._prune_every:
+            self.prune()
+
+    def prune(self):
+        """Delete expired entries, then the oldest beyond ``max_entries``."""
+        conn = self._connect()
+        if self.ttl is not None:
+            conn.execute("DELETE FROM decisions WHERE created < ?", (time.time() - self.ttl,))
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM decisions WHERE key IN (SELECT key FROM decisions ORDER BY created LIMIT ?)",
+                (excess,),
+            )
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM decisions").fetchone()[0]
+
+    def clear(self, variant=None):
+        """Delete every entry, or those of ``variant`` (a name or ``rules.Variant``), buffered ones included."""
+        name = None if variant is None else rules.get_variant(variant).name
+        with self._lock:
+            self._pending = [row for row in self._pending if name is not None and row[1] != name]
+        if name is None:
+            self._connect().execute("DELETE FROM decisions")
+        else:
+            self._connect().execute("DELETE FROM decisions WHERE variant = ?", (name,))
+
+
+class DecisionCache:
+    """Thread-safe LRU cache of ``Decision`` objects, optionally backed by a ``DecisionStore``.
+
+    Keys use the live ruleset's version unless ``version`` pins one.
+    """
+
+    def __init__(self, maxsize=MAXSIZE, version=None, store=None):
+        self.maxsize = maxsize
+        self.version = version
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.store_hits = 0
+
+    def _get(self, key):
+        with self._lock:
+            decision = self._entries.get(key)
+            if decision is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return decision
+
+    def _lookup(self, key, ruleset):
+        decision = self._get(key)
+        if decision is None and self.store is not None:
+            decision = self.store.get(_digest(*key), ruleset)
+            if decision is not None:
+                with self._lock:
+                    self.store_hits += 1
+                self._put(key, decision, persist=False)
+        return decision
+
+    def _put(self, key, decision, persist=True):
+        if persist and self.store is not None:
+            self.store.put(_digest(*key), decision)
+        with self._lock:
+            self._entries[key] = decision
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def evaluate(self, assessment, variant="hospice"):
+        variant = rules.get_variant(variant)
+        ruleset = rules.current()
+        key = (self.version or ruleset.version, variant.name, canonical(assessment))
+        decision = self._lookup(key, ruleset)
+        if decision is None:
+            decision = rules.evaluate(assessment, variant, ruleset)
+            self._put(key, decision)
+        return decision
+
+    def evaluate_all(self, assessment, variants=None):
+        """Like ``rules.evaluate_all``; features are only derived on a miss."""
+        text = canonical(assessment)
+        ruleset = rules.current()
+        decisions, f = {}, None
+        for variant in map(rules.get_variant, variants or rules.VARIANTS):
+            key = (self.version or ruleset.version, variant.name, text)
+            decision = self._lookup(key, ruleset)
+            if decision is None:
+                f = f or rules.features(assessment)
+                decision = rules.decide(f, variant, ruleset)
+                self._put(key, decision)
+            decisions[variant.name] = decision
+        return decisions
+
+    def flush(self):
+        """Commit any buffered writes to the backing store."""
+        if self.store is not None:
+            self.store.flush()
+
+    def stats(self):
+        """Counters since the last ``clear``.
+
+        ``hits`` and ``misses`` are lookups of the in-memory LRU; a miss served
+        by the store also counts in ``store_hits``.  ``hit_rate`` is the share
+        of lookups answered without evaluating, the sum of ``memory_hit_rate``
+        and ``store_hit_rate``.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "store_hits": self.store_hits,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hit_rate": (self.hits + self.store_hits) / lookups if lookups else 0.0,
+                "memory_hit_rate": self.hits / lookups if lookups else 0.0,
+                "store_hit_rate": self.store_hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.store_hits = 0
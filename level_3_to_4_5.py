@@ -1,12 +1,17 @@
 
 import streamlit as st
 
+from page_cache import evaluate, form_mode, page_timer, submitted_decision
+
+timer = page_timer("level_3_to_4_5")
+
 # Title
 st.title("Transitioning Patients from Level 3 to Level 4")
 
 st.markdown("This assessment evaluates patient eligibility for transitioning from Level 3 to Level 4 care based on clinical scales, objective parameters, and underlying conditions.")
 
 # === CLINICAL CONDITIONS ===
+timer.section("Clinical conditions")
 st.header("Underlying Clinical Conditions (select all that apply)")
 
 conditions = [
@@ -21,226 +26,141 @@ conditions = [
 
 selected_conditions = st.multiselect("Select applicable conditions:", conditions)
 
-# === CONDITION-SPECIFIC FOLLOW-UP QUESTIONS ===
-st.subheader("Condition-Specific Details")
+# Form mode: inputs are submitted together and the recommendation is
+# computed once per submission.  The condition-specific details and the
+# PPS score stay above the form in the same order as without it, as
+# fragments that rerun on their own
+use_form = form_mode()
 
-ef = oxygen_dependent = on_dialysis = ""
-cancer_flags = liver_flags = dementia_flags = []
-cd4_count = None
-
-if "Heart Failure (HF)" in selected_conditions:
-    ef = st.text_input("Heart Failure: Enter ejection fraction (EF) within last year (%)")
-
-if "Pulmonary Disease" in selected_conditions:
-    oxygen_dependent = st.radio("Pulmonary Disease: Is the patient dependent on supplemental oxygen?", ["Yes", "No"])
-
-if "Chronic Kidney Disease (CKD)" in selected_conditions:
-    on_dialysis = st.radio("CKD: Is the patient on dialysis?", ["Yes", "No"])
-
-if "Cancer Diagnosis" in selected_conditions:
-    cancer_flags = st.multiselect(
-        "Cancer: Select all that apply",
-        ["Pleural effusion", "Transfusion requirement"]
-    )
-
-if "Liver Cirrhosis" in selected_conditions:
-    liver_flags = st.multiselect(
-        "Liver Cirrhosis: Select complications present",
-        [
-            "Ascites", 
-            "Hepatic encephalopathy", 
-            "Variceal bleeding",
-            "Hepatorenal syndrome",
-            "Spontaneous bacterial peritonitis"
-        ]
-    )
-
-if "Dementia/Stroke" in selected_conditions:
-    dementia_flags = st.multiselect(
-        "Dementia/Stroke: Select all complications present",
-        [
-            "Aspiration pneumonia",
-            "Pyelonephritis/septicemia",
-            "Pressure ulcers",
-            "Recurrent falls"
-        ]
-    )
-
-if "HIV" in selected_conditions:
-    cd4_count = st.number_input("HIV: Enter most recent CD4 count", min_value=0, step=1)
 
-# === GROUP 1: CLINICAL SCALES ===
-st.header("Group 1: Clinical Scales")
+def details_section(selected_conditions):
+    ef = oxygen_dependent = on_dialysis = ""
+    cancer_flags = liver_flags = dementia_flags = []
+    cd4_count = None
 
-pps = st.slider("Palliative Performance Scale (PPS) %", 0, 100, step=10)
-nyha = st.selectbox("NYHA Class", ["I", "II", "III", "IV"])
-mmrc = st.selectbox("mMRC Dyspnea Scale", ["0", "1", "2", "3", "4"])
-fast_scale = st.selectbox("FAST Scale (Dementia Severity)", ["1", "2", "3", "4", "5", "6", "7"])
+    if "Heart Failure (HF)" in selected_conditions:
+        ef = st.text_input("Heart Failure: Enter ejection fraction (EF) within last year (%)")
 
-# === GROUP 2: VITALS & LABS ===
-st.header("Group 2: Vitals and Laboratory Values")
+    if "Pulmonary Disease" in selected_conditions:
+        oxygen_dependent = st.radio("Pulmonary Disease: Is the patient dependent on supplemental oxygen?", ["Yes", "No"])
 
-bp = st.text_input("Blood Pressure (e.g., 110/70)")
-current_weight = st.number_input("Current Weight (kg)", min_value=0.0, step=0.1)
-weight_earlier = st.number_input("Weight 6–12 Months Ago (kg)", min_value=0.0, step=0.1)
-inr = st.number_input("INR", min_value=0.0, step=0.1)
-albumin = st.number_input("Serum Albumin (g/dL)", min_value=0.0, step=0.1)
+    if "Chronic Kidney Disease (CKD)" in selected_conditions:
+        on_dialysis = st.radio("CKD: Is the patient on dialysis?", ["Yes", "No"])
 
-# === CALCULATION AND ASSESSMENT ===
-st.header("Assessment Summary")
-summary = []
+    if "Cancer Diagnosis" in selected_conditions:
+        cancer_flags = st.multiselect(
+            "Cancer: Select all that apply",
+            ["Pleural effusion", "Transfusion requirement"]
+        )
 
-# Clinical condition summary
-if selected_conditions:
-    summary.append(f"• Clinical conditions present: {', '.join(selected_conditions)}.")
-else:
-    summary.append("• No underlying clinical conditions were selected.")
+    if "Liver Cirrhosis" in selected_conditions:
+        liver_flags = st.multiselect(
+            "Liver Cirrhosis: Select complications present",
+            [
+                "Ascites", 
+                "Hepatic encephalopathy", 
+                "Variceal bleeding",
+                "Hepatorenal syndrome",
+                "Spontaneous bacterial peritonitis"
+            ]
+        )
 
-# Append condition-specific details to summary
-if "Heart Failure (HF)" in selected_conditions and ef:
-    summary.append(f"• HF with EF: {ef}%")
+    if "Dementia/Stroke" in selected_conditions:
+        dementia_flags = st.multiselect(
+            "Dementia/Stroke: Select all complications present",
+            [
+                "Aspiration pneumonia",
+                "Pyelonephritis/septicemia",
+                "Pressure ulcers",
+                "Recurrent falls"
+            ]
+        )
 
-if "Pulmonary Disease" in selected_conditions:
-    summary.append(f"• Pulmonary Disease: Oxygen dependent - {oxygen_dependent}")
+    if "HIV" in selected_conditions:
+        cd4_count = st.number_input("HIV: Enter most recent CD4 count", min_value=0, step=1)
 
-if "Chronic Kidney Disease (CKD)" in selected_conditions:
-    summary.append(f"• CKD: On dialysis - {on_dialysis}")
+    return ef, oxygen_dependent, on_dialysis, cancer_flags, liver_flags, dementia_flags, cd4_count
 
-if "Cancer Diagnosis" in selected_conditions and cancer_flags:
-    summary.append(f"• Cancer complications: {', '.join(cancer_flags)}")
 
-if "Liver Cirrhosis" in selected_conditions and liver_flags:
-    summary.append(f"• Liver Cirrhosis complications: {', '.join(liver_flags)}")
+def pps_section():
+    return st.slider("Palliative Performance Scale (PPS) %", 0, 100, step=10)
 
-if "Dementia/Stroke" in selected_conditions and dementia_flags:
-    summary.append(f"• Dementia/Stroke complications: {', '.join(dementia_flags)}")
 
-if "HIV" in selected_conditions and cd4_count is not None:
-    summary.append(f"• HIV: CD4 count = {cd4_count}")
+# === CONDITION-SPECIFIC FOLLOW-UP QUESTIONS ===
+timer.section("Condition-specific details")
+st.subheader("Condition-Specific Details")
+details = st.fragment(details_section) if use_form else details_section
+ef, oxygen_dependent, on_dialysis, cancer_flags, liver_flags, dementia_flags, cd4_count = details(selected_conditions)
 
-# Group 1 interpretations
-if pps <= 40:
-    summary.append(f"• PPS score of {pps}% indicates poor functional status.")
-if nyha == "IV":
-    summary.append("• NYHA Class IV indicates severe cardiac limitation.")
-if mmrc in ["3", "4"]:
-    summary.append(f"• mMRC score of {mmrc} suggests significant dyspnea.")
-if fast_scale in ["6", "7"]:
-    summary.append(f"• FAST scale of {fast_scale} indicates moderate to severe dementia.")
+# === GROUP 1: CLINICAL SCALES ===
+timer.section("Group 1 scales")
+st.header("Group 1: Clinical Scales")
 
-# Group 2 interpretations
-if weight_earlier > 0 and current_weight < weight_earlier:
-    weight_loss_pct = ((weight_earlier - current_weight) / weight_earlier) * 100
-    summary.append(f"• Weight loss of {weight_loss_pct:.1f}% over 6–12 months.")
-else:
-    weight_loss_pct = 0
+pps = st.fragment(pps_section)() if use_form else pps_section()
 
-if inr > 1.5:
-    summary.append(f"• Elevated INR of {inr}, which may reflect hepatic dysfunction or anticoagulation risk.")
+with st.form("assessment") if use_form else st.container():
+    nyha = st.selectbox("NYHA Class", ["I", "II", "III", "IV"])
+    mmrc = st.selectbox("mMRC Dyspnea Scale", ["0", "1", "2", "3", "4"])
+    fast_scale = st.selectbox("FAST Scale (Dementia Severity)", ["1", "2", "3", "4", "5", "6", "7"])
 
-if albumin < 3.0:
-    summary.append(f"• Low albumin level of {albumin} g/dL suggests poor nutritional or hepatic status.")
+    # === GROUP 2: VITALS & LABS ===
+    timer.section("Group 2 labs")
+    st.header("Group 2: Vitals and Laboratory Values")
 
-# === RECOMMENDATION LOGIC ===
-st.subheader("Recommendation")
+    bp = st.text_input("Blood Pressure (e.g., 110/70)")
+    current_weight = st.number_input("Current Weight (kg)", min_value=0.0, step=0.1)
+    weight_earlier = st.number_input("Weight 6–12 Months Ago (kg)", min_value=0.0, step=0.1)
+    inr = st.number_input("INR", min_value=0.0, step=0.1)
+    albumin = st.number_input("Serum Albumin (g/dL)", min_value=0.0, step=0.1)
 
-force_transition = False
-reason_lines = []
-
-# Condition 1: PPS ≤ 50% and (≥10% weight loss or albumin < 2.5)
-if pps <= 50:
-    weight_flag = weight_loss_pct >= 10
-    albumin_flag = albumin < 2.5
-    if weight_flag or albumin_flag:
-        force_transition = True
-        reason_lines.append(
-            f"• PPS is {pps}% and {'≥10% weight loss' if weight_flag else ''}"
-            f"{' and ' if weight_flag and albumin_flag else ''}"
-            f"{'albumin < 2.5 g/dL' if albumin_flag else ''}."
-        )
+    submitted = use_form and st.form_submit_button("Submit assessment")
 
-# Condition 2: HF and (NYHA IV or EF ≤ 20)
-if "Heart Failure (HF)" in selected_conditions:
-    ef_val = None
-    try:
-        ef_val = float(ef)
-    except:
-        ef_val = None
-    if nyha == "IV":
-        force_transition = True
-        reason_lines.append("• HF with NYHA Class IV.")
-    if ef_val is not None and ef_val <= 20:
-        force_transition = True
-        reason_lines.append(f"• HF with EF ≤ 20% (EF = {ef_val}%).")
-
-# Condition 3: Pulmonary Disease, mMRC = 4, and oxygen dependent
-if "Pulmonary Disease" in selected_conditions and mmrc == "4" and oxygen_dependent == "Yes":
-    force_transition = True
-    reason_lines.append("• Severe pulmonary disease: mMRC = 4 and oxygen dependent.")
-
-# Condition 4: CKD with eGFR ≤ 15 and not on dialysis
-if "Chronic Kidney Disease (CKD)" in selected_conditions:
-    if on_dialysis == "No":
-        try:
-            gfr_val = float(egfr_input)
-        except:
-            gfr_val = 0
-        if gfr_val <= 15:
-            force_transition = True
-            reason_lines.append("• CKD with eGFR ≤ 15 and not on dialysis.")
-
-# Condition 5: Cancer with PPS ≤ 70 or complications
-if "Cancer Diagnosis" in selected_conditions:
-    if pps <= 70 or cancer_flags:
-        force_transition = True
-        detail = f"PPS = {pps}%" if pps <= 70 else ""
-        detail += " and " if pps <= 70 and cancer_flags else ""
-        detail += f"complications: {', '.join(cancer_flags)}" if cancer_flags else ""
-        reason_lines.append(f"• Cancer diagnosis with {detail}.")
-
-# Condition 6: Liver Cirrhosis with INR > 1.5, albumin < 2.5, and any complication
-if "Liver Cirrhosis" in selected_conditions:
-    if inr >= 1.5 and albumin <= 2.5 and liver_flags:
-        force_transition = True
-        reason_lines.append(
-            f"• Decompensated liver cirrhosis: INR = {inr}, albumin = {albumin}, complications: {', '.join(liver_flags)}."
-        )
+# === CALCULATION AND ASSESSMENT ===
+timer.section("Assessment Summary")
+assessment = {
+    "selected_conditions": selected_conditions,
+    "ef": ef,
+    "oxygen_dependent": oxygen_dependent,
+    "on_dialysis": on_dialysis,
+    "cancer_flags": cancer_flags,
+    "liver_flags": liver_flags,
+    "dementia_flags": dementia_flags,
+    "cd4_count": cd4_count,
+    "pps": pps,
+    "nyha": nyha,
+    "mmrc": mmrc,
+    "fast_scale": fast_scale,
+    "current_weight": current_weight,
+    "weight_earlier": weight_earlier,
+    "inr": inr,
+    "albumin": albumin,
+}
+if use_form:
+    decision = submitted_decision(assessment, "level_3_to_4_5", submitted)
+else:
+    decision = evaluate(assessment, "level_3_to_4_5")
+if decision is None:
+    st.info("Submit the assessment to see the recommendation.")
+    timer.show()
+    st.stop()
 
-# Condition 7: Dementia/Stroke with FAST stage 7 and complications
-if "Dementia/Stroke" in selected_conditions:
-    if fast_scale == "7" and dementia_flags:
-        force_transition = True
-        reason_lines.append(
-            f"• End-stage dementia or stroke: FAST stage 7 with complications: {', '.join(dementia_flags)}."
-        )
+st.header("Assessment Summary")
 
-# ✅ Condition 8: HIV with CD4 ≤ 200 and PPS ≤ 50%
-if "HIV" in selected_conditions:
-    if cd4_count is not None and cd4_count <= 200 and pps <= 50:
-        force_transition = True
-        reason_lines.append(f"• Advanced HIV: CD4 = {cd4_count}, PPS = {pps}%.")
+# === RECOMMENDATION LOGIC ===
+timer.section("Recommendation")
+st.subheader("Recommendation")
 
 # Output final decision
-if force_transition:
+if decision.tier == "red":
     st.markdown("🔴 **High-risk criteria met — recommend transitioning to Level 4 care.**")
     st.markdown("#### Justification:")
-    for r in reason_lines:
+    for r in decision.reason_lines:
         st.markdown(r)
+elif decision.tier == "orange":
+    st.markdown("🟠 **Patient meets multiple criteria — consider transitioning to Level 4 care.**")
+elif decision.tier == "blue":
+    st.markdown("🔵 **Partial criteria met — monitor closely and reassess periodically.**")
 else:
-    flags = 0
-    if pps <= 40: flags += 1
-    if nyha == "IV": flags += 1
-    if mmrc in ["3", "4"]: flags += 1
-    if fast_scale in ["6", "7"]: flags += 1
-    if weight_loss_pct >= 10: flags += 1
-    if albumin < 3.0: flags += 1
-    if inr > 1.5: flags += 1
-    if selected_conditions: flags += 1
-
-    if flags >= 4:
-        st.markdown("🟠 **Patient meets multiple criteria — consider transitioning to Level 4 care.**")
-    elif 2 <= flags < 4:
-        st.markdown("🔵 **Partial criteria met — monitor closely and reassess periodically.**")
-    else:
-        st.markdown("🟢 **Patient is stable — continue Level 3 care.**")
+    st.markdown("🟢 **Patient is stable — continue Level 3 care.**")
 
+timer.show()
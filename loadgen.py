@@ -0,0 +1,151 @@
+"""Load generator for service.py.
+
+    python loadgen.py --spawn --concurrency 64 --requests 20000
+    python loadgen.py --port 8765 --batch 100 --duration 30
+
+Opens --concurrency keep-alive connections to the service on localhost and
+sends synthetic assessments as fast as responses come back, then reports
+requests per second and p50/p90/p99 latency.  ``--spawn`` starts service.py
+in a subprocess on a free port for the duration of the run.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from bench_workers import synthetic_assessment
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _request(host, port, path, payload):
+    body = json.dumps(payload).encode("utf-8")
+    head = (
+        f"POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed by the service")
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def _client(host, port, requests, latencies, errors, stop_at, remaining):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while remaining[0] > 0 and time.perf_counter() < stop_at:
+            remaining[0] -= 1
+            started = time.perf_counter()
+            writer.write(requests[remaining[0] % len(requests)])
+            await writer.drain()
+            status = await _read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors[0] += 1
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, concurrency, total, duration, batch, variant, seed=0):
+    rng = random.Random(seed)
+    path = f"/score?variant={variant}"
+    if batch > 1:
+        requests = [_request(host, port, path, [synthetic_assessment(rng) for _ in range(batch)]) for _ in range(64)]
+    else:
+        requests = [_request(host, port, path, synthetic_assessment(rng)) for _ in range(1024)]
+    latencies, errors, remaining = [], [0], [total]
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _client(host, port, requests, latencies, errors, started + duration, remaining)
+        for _ in range(concurrency)
+    ))
+    return latencies, errors[0], time.perf_counter() - started
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(host, port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"service did not start on {host}:{port}")
+
+
+def report(latencies, errors, elapsed, batch):
+    latencies = sorted(latencies)
+    ms = lambda seconds: f"{seconds * 1000:.2f} ms"
+    print(f"requests   {len(latencies):,} ({errors} errors) in {elapsed:.2f} s")
+    print(f"throughput {len(latencies) / elapsed:,.0f} req/s, {len(latencies) * batch / elapsed:,.0f} records/s")
+    if latencies:
+        print(f"latency    p50 {ms(percentile(latencies, 50))}  p90 {ms(percentile(latencies, 90))}  "
+              f"p99 {ms(percentile(latencies, 99))}  mean {ms(statistics.fmean(latencies))}  max {ms(latencies[-1])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure service.py latency and throughput.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--spawn", action="store_true", help="start service.py on a free port for the run")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=10_000, help="stop after this many requests")
+    parser.add_argument("--duration", type=float, default=float("inf"), help="or after this many seconds")
+    parser.add_argument("--batch", type=int, default=1, help="assessments per request (1 = single requests)")
+    parser.add_argument("--variant", default="hospice")
+    parser.add_argument("--max-delay-ms", type=float, help="passed to a spawned service")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.spawn:
+        args.port = _free_port()
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "service.py")
+        command = [sys.executable, script, "--host", args.host, "--port", str(args.port)]
+        if args.max_delay_ms is not None:
+            command += ["--max-delay-ms", str(args.max_delay_ms)]
+        server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+        _wait_for_port(args.host, args.port)
+    try:
+        latencies, errors, elapsed = asyncio.run(run_load(
+            args.host, args.port, args.concurrency, args.requests, args.duration, args.batch, args.variant,
+        ))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    report(latencies, errors, elapsed, args.batch)
+
+
+if __name__ == "__main__":
+    main()
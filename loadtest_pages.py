@@ -0,0 +1,217 @@
+"""Concurrent-session load test of the Streamlit app, with server memory.
+
+    python loadtest_pages.py --sessions 100
+    python loadtest_pages.py --page level_3_to_4_9.py --sessions 200 --think-ms 500
+    python loadtest_pages.py --url http://127.0.0.1:8501 --sessions 20
+
+Starts ``streamlit run app.py`` on a free port (or uses --url) and, page by
+page, opens --sessions concurrent websocket sessions that each play the
+page's scripted clinician session from bench_pages.py.  For every page it
+reports rerun latency percentiles as seen by the clients, and memory read
+from the server's ``/_stcore/metrics``:
+
+    per session   tracemalloc growth while the sessions are open, divided by
+                  the number of sessions
+    state         st.session_state per open session
+    decisions     the shared decision cache (page_cache.shared_cache)
+    sessions      page_cache.sessions(), the per-session page data
+
+After the last page every session is closed and, with --idle-ttl, the
+harness waits for the idle sessions to be evicted before the final reading;
+traced memory there should be back near the baseline.
+
+A spawned server runs with tracemalloc on (``PYTHONTRACEMALLOC=1``) and
+Streamlit's exact memory stats, both of which slow it down: use
+--no-tracemalloc for latency numbers comparable with bench_pages.py.
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.request
+
+import streamlit_client
+from bench_app import PAGES, free_port, wait_healthy
+from bench_pages import FORM_SESSIONS, SESSIONS, percentile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STARTUP_TIMEOUT = 60.0
+
+_METRIC = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def scrape(url):
+    """``{(family, frozenset(labels)): value}`` from ``/_stcore/metrics``."""
+    with urllib.request.urlopen(url + "/_stcore/metrics", timeout=30) as response:
+        text = response.read().decode("utf-8")
+    metrics = {}
+    for line in text.splitlines():
+        match = _METRIC.match(line)
+        if match:
+            name, labels, value = match.groups()
+            metrics[name, frozenset(_LABEL.findall(labels or ""))] = float(value)
+    return metrics
+
+
+def memory(url):
+    """The memory readings the report uses, in bytes."""
+    metrics = scrape(url)
+
+    def cache(cache_type, name=""):
+        return metrics.get(("cache_memory_bytes", frozenset({("cache_type", cache_type), ("cache", name)})), 0)
+
+    return {
+        "traced": metrics.get(("tracemalloc_bytes", frozenset({("kind", "current")}))),
+        "session_state": cache("st_session_state"),
+        "decisions": cache("st_cache_resource", "page_cache.shared_cache"),
+        "sessions": cache("st_cache_resource", "page_cache.sessions"),
+        "active": metrics.get(("active_sessions", frozenset()), 0),
+    }
+
+
+def _changes(step):
+    return {label: True if kind == "button" else value for kind, label, value in step}
+
+
+async def play(url, path, steps, query_string, think, latencies, opened, release):
+    """One clinician: render the page, play ``steps``, then wait for ``release``."""
+    session = await streamlit_client.Session.open(url, path, query_string)
+    try:
+        await session.run()
+        for step in steps:
+            if think:
+                await asyncio.sleep(think)
+            seconds, _ = await session.run(_changes(step))
+            latencies.append(seconds)
+        opened.append(session)
+        await release.wait()
+    finally:
+        await session.close()
+
+
+async def load_page(url, page, sessions, form_mode, think):
+    """Latencies and open-session memory for ``sessions`` concurrent sessions on ``page``."""
+    steps = (FORM_SESSIONS if form_mode else SESSIONS)[page]
+    latencies, opened, release = [], [], asyncio.Event()
+    tasks = [
+        asyncio.create_task(play(url, PAGES[page], steps, "mode=form" if form_mode else "", think,
+                                 latencies, opened, release))
+        for _ in range(sessions)
+    ]
+    started = time.perf_counter()
+    while len(opened) < sessions:
+        failed = [task for task in tasks if task.done() and task.exception()]
+        if failed:
+            release.set()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise failed[0].exception()
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    readings = await asyncio.to_thread(memory, url)
+    release.set()
+    await asyncio.gather(*tasks)
+    return latencies, elapsed, readings
+
+
+def start_app(port, idle_ttl, trace):
+    env = dict(os.environ)
+    if trace:
+        env["PYTHONTRACEMALLOC"] = "1"
+    if idle_ttl is not None:
+        env["SESSION_IDLE_TTL"] = str(idle_ttl)
+    return subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", "app.py",
+         "--server.headless", "true",
+         "--server.port", str(port),
+         "--server.address", "127.0.0.1",
+         "--browser.gatherUsageStats", "false",
+         "--server.fileWatcherType", "none",
+         "--server.enableExpensiveMemoryStats", "true",
+         # Drop closed sessions promptly so the final reading sees them gone
+         "--server.disconnectedSessionTTL", "1"],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def _kb(value):
+    return "-" if value is None else f"{value / 1024:,.0f}KB"
+
+
+def _mb(value):
+    return "-" if value is None else f"{value / 1024 / 1024:,.1f}MB"
+
+
+async def run(url, pages, sessions, form_mode, think, idle_ttl):
+    # One session per page first, so imports and the engine are not
+    # counted as per-session memory
+    for page in pages:
+        warm = await streamlit_client.Session.open(url, PAGES[page])
+        await warm.run()
+        await warm.close()
+    baseline = await asyncio.to_thread(memory, url)
+    print(f"baseline: traced {_mb(baseline['traced'])}, decisions {_kb(baseline['decisions'])}")
+
+    print(f"{'page':<45} {'reruns':>7} {'p50':>7} {'p90':>7} {'p99':>7} {'max':>7} {'rerun/s':>8} "
+          f"{'per session':>12} {'state':>8} {'decisions':>10} {'sessions':>9}")
+    for page in pages:
+        latencies, elapsed, open_memory = await load_page(url, page, sessions, form_mode, think)
+        ms = sorted(seconds * 1000 for seconds in latencies)
+        growth = None
+        if open_memory["traced"] is not None and baseline["traced"] is not None:
+            growth = (open_memory["traced"] - baseline["traced"]) / sessions
+        state = open_memory["session_state"] / max(open_memory["active"], 1)
+        print(f"{page:<45} {len(ms):>7} {percentile(ms, 50):>5.0f}ms {percentile(ms, 90):>5.0f}ms "
+              f"{percentile(ms, 99):>5.0f}ms {ms[-1]:>5.0f}ms {len(ms) / elapsed:>8.1f} "
+              f"{_kb(growth):>12} {_kb(state):>8} {_kb(open_memory['decisions']):>10} "
+              f"{_kb(open_memory['sessions']):>9}", flush=True)
+
+    if idle_ttl is not None:
+        await asyncio.sleep(idle_ttl + 1)
+    # Eviction happens on access: one more session touches the page data
+    last = await streamlit_client.Session.open(url, PAGES[pages[0]], "mode=form")
+    await last.run()
+    await last.close()
+    await asyncio.sleep(2)
+    final = await asyncio.to_thread(memory, url)
+    print(f"all closed: traced {_mb(final['traced'])} "
+          f"({_mb((final['traced'] or 0) - (baseline['traced'] or 0))} over baseline), "
+          f"active sessions {final['active']:.0f}, page session data {_kb(final['sessions'])}, "
+          f"decisions {_kb(final['decisions'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="use a running server instead of starting app.py")
+    parser.add_argument("--page", action="append", choices=list(PAGES), help="page to load (repeatable, default: all)")
+    parser.add_argument("--sessions", type=int, default=100, help="concurrent sessions per page (default: 100)")
+    parser.add_argument("--think-ms", type=float, default=0, help="pause before each rerun, per session (default: 0)")
+    parser.add_argument("--form-mode", action="store_true", help="play the form-mode sessions")
+    parser.add_argument("--idle-ttl", type=float,
+                        help="SESSION_IDLE_TTL for the spawned server; wait it out before the final reading")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="start the server without tracemalloc")
+    args = parser.parse_args(argv)
+    pages = args.page or list(PAGES)
+
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        server = start_app(port, args.idle_ttl, not args.no_tracemalloc)
+        wait_healthy(url, server, time.monotonic() + STARTUP_TIMEOUT)
+    try:
+        asyncio.run(run(url, pages, args.sessions, args.form_mode, args.think_ms / 1000,
+                        args.idle_ttl if server else None))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""Cached rule evaluation for the Streamlit pages.
+
+Streamlit reruns a page top to bottom on every widget change, so the same
+assessment is evaluated again and again.  The pages call ``evaluate`` from
+here instead of ``rules.evaluate``: one ``DecisionCache`` is shared by every
+session of the app (decisions are immutable, so nothing is copied per hit).
+
+Set ``DECISION_CACHE_DB`` to a file path to back it with a ``DecisionStore``
+that survives server restarts and is shared between servers on the host;
+``DECISION_CACHE_TTL`` (seconds) expires its entries.
+
+Data a page keeps for one session (the decision submitted in form mode) lives
+in ``session_data()`` rather than in ``st.session_state``: at most
+``MAX_SESSIONS`` sessions are held, and a session idle for
+``SESSION_IDLE_TTL`` seconds (env var of the same name) is dropped, so memory
+stays flat however many clinicians come and go over a shift.
+
+``page_timer`` times the sections of a page for an opt-in performance panel
+in the sidebar: open the page with ``?perf=1``, or set ``PAGE_PERF=1`` for
+every page.
+
+With ``RULE_STATS=1`` the per-rule counters of rule_stats.py are recorded
+and served with Streamlit's own under ``/_stcore/metrics``.
+
+The server reloads the rule thresholds file when it changes, checking every
+``RULE_THRESHOLDS_POLL`` seconds (default 2, 0 to never reload); cached
+decisions are keyed by ruleset version, so no page shows a decision made
+under the old cutoffs once the new ones are live.
+"""
+
+import os
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict, deque
+
+import streamlit as st
+
+import rule_stats
+from decision_cache import DecisionCache, DecisionStore
+
+MAXSIZE = 50_000
+MAX_SESSIONS = 1_000
+PERF_HISTORY = 50  # reruns kept per session and page by the performance panel
+SESSION_IDLE_TTL = float(os.environ.get("SESSION_IDLE_TTL", 30 * 60))
+THRESHOLDS_POLL = float(os.environ.get("RULE_THRESHOLDS_POLL", 2.0))
+
+
+@st.cache_resource(show_spinner=False)
+def shared_cache():
+    store = None
+    if os.environ.get("DECISION_CACHE_DB"):
+        ttl = os.environ.get("DECISION_CACHE_TTL")
+        store = DecisionStore(os.environ["DECISION_CACHE_DB"], ttl=float(ttl) if ttl else None)
+    return DecisionCache(MAXSIZE, store=store)
+
+
+@st.cache_resource(show_spinner=False)
+def engine():
+    """The rule engine, scale tables and workflow content, loaded once per server.
+
+    Modules are process-wide already; calling this from the app entry point
+    simply loads them, and the shared decision cache, before the first page
+    is requested rather than during it.
+    """
+    import hf_workflow
+    import rules
+    import scales
+
+    server_setup()
+    return {"rules": rules, "scales": scales, "workflow": hf_workflow, "decisions": shared_cache()}
+
+
+@st.cache_resource(show_spinner=False)
+def server_setup():
+    """Start the server's background services once: the stats providers and the thresholds watcher.
+
+    Called by ``page_timer``, which every assessment page calls first, so a
+    page run on its own with ``streamlit run`` gets them as well as app.py.
+    """
+    import rules
+
+    if tracemalloc.is_tracing():
+        _register_stats(TracemallocStats())
+    stats = rule_stats.enable_from_env()
+    if stats is not None:
+        _register_stats(RuleStatsProvider(stats))
+    if THRESHOLDS_POLL > 0:
+        rules.watch(THRESHOLDS_POLL)
+
+
+class SessionData:
+    """Per-session dicts, dropped when idle or when too many sessions are held.
+
+    A session's dict is refreshed on every ``get``; sessions not seen for
+    ``idle_ttl`` seconds, and the least recently seen beyond
+    ``max_sessions``, are evicted on the next access by any session.
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_ttl=SESSION_IDLE_TTL, clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        self._sessions = OrderedDict()  # session id -> (last seen, data)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, session_id):
+        now = self.clock()
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            data = {} if entry is None else entry[1]
+            self._sessions[session_id] = (now, data)
+            self._evict(now)
+            return data
+
+    def _evict(self, now):
+        while self._sessions:
+            session_id, (seen, _) = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - seen <= self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+@st.cache_resource(show_spinner=False)
+def sessions():
+    return SessionData()
+
+
+def session_data():
+    """This session's dict in ``sessions()``."""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+    return sessions().get(ctx.session_id if ctx else "")
+
+
+class TracemallocStats:
+    """Streamlit stats provider: traced memory under ``/_stcore/metrics``.
+
+    Registered when the server runs with tracemalloc on
+    (``PYTHONTRACEMALLOC=1``); loadtest_pages.py reads it.
+    """
+
+    FAMILY = "tracemalloc_bytes"
+    stats_families = (FAMILY,)
+
+    def get_stats(self, family_names=None):
+        from streamlit.runtime.stats import GaugeStat
+
+        current, peak = tracemalloc.get_traced_memory()
+        return {self.FAMILY: [
+            GaugeStat(self.FAMILY, value, {"kind": kind}, "bytes", "Memory traced by tracemalloc.")
+            for kind, value in (("current", current), ("peak", peak))
+        ]}
+
+
+class RuleStatsProvider:
+    """Streamlit stats provider: rule_stats counters under ``/_stcore/metrics``.
+
+    Registered when the server runs with RULE_STATS=1.  Times are exported
+    as integer ``*_nanoseconds_total`` counters, the unit Streamlit's
+    counters can carry.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.stats_families = tuple(self._name(family, unit) for family, unit in rule_stats.FAMILIES.items())
+
+    @staticmethod
+    def _name(family, unit):
+        return f"{rule_stats.PREFIX}_{family}{'_nanoseconds' if unit == 'ns' else ''}"
+
+    def get_stats(self, family_names=None):
+        from streamlit.runtime.stats import CounterStat
+
+        out = {}
+        for family, unit, help_text, labels, value in self.stats.samples():
+            name = self._name(family, unit)
+            out.setdefault(name, []).append(CounterStat(name, value, labels, "", help_text))
+        return out
+
+
+def _register_stats(provider):
+    from streamlit import runtime
+
+    if not runtime.exists():
+        return
+    stats_mgr = runtime.get_instance().stats_mgr
+    # server_setup() runs again after a cache clear; register each family once
+    if not set(provider.stats_families) & set(stats_mgr.registered_families()):
+        stats_mgr.register_provider(provider)
+
+
+def evaluate(assessment, variant="hospice"):
+    return shared_cache().evaluate(assessment, variant)
+
+
+def thresholds(variant):
+    """The live ``rules.Thresholds`` of ``variant``, for cutoffs a page shows outside the decision."""
+    import rules
+
+    return rules.current().thresholds_for(variant)
+
+
+class PageTimer:
+    """Wall time per page section, shown in the sidebar with a rolling history.
+
+    ``section(name)`` starts a section and ends the previous one; a name used
+    twice (form mode splits Group 1 around the form) adds up.  ``show()`` ends
+    the last section, appends the rerun to the session's history and draws
+    the panel.  Reruns of a fragment alone are not timed.
+    """
+
+    def __init__(self, history):
+        self.history = history
+        self.sections = {}
+        self._current = "Page setup"
+        self._started = self._page_started = time.perf_counter()
+
+    def section(self, name):
+        now = time.perf_counter()
+        self._end(now)
+        self._current, self._started = name, now
+
+    def _end(self, now):
+        self.sections[self._current] = self.sections.get(self._current, 0.0) + now - self._started
+
+    def show(self):
+        import pandas as pd
+
+        now = time.perf_counter()
+        self._end(now)
+        total = now - self._page_started
+        ms = {name: seconds * 1000 for name, seconds in self.sections.items()}
+        self.history.append({**ms, "Total": total * 1000})
+
+        with st.sidebar.expander("Performance", expanded=True):
+            st.caption(f"This rerun: {total * 1000:.1f} ms")
+            st.dataframe(pd.DataFrame({"ms": ms}).round(1), width="stretch")
+            if len(self.history) > 1:
+                history = pd.DataFrame(list(self.history)).fillna(0.0)
+                st.caption(f"Last {len(history)} reruns (ms)")
+                st.line_chart(history.drop(columns="Total"))
+                summary = history.describe(percentiles=[0.5, 0.9]).T[["50%", "90%", "max"]]
+                st.dataframe(summary.rename(columns={"50%": "p50", "90%": "p90"}).round(1), width="stretch")
+
+
+class _NoTimer:
+    """Stand-in for PageTimer while the panel is off."""
+
+    def section(self, name):
+        pass
+
+    def show(self):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+def page_timer(page):
+    """A ``PageTimer`` for ``page`` if the performance panel is on, else a no-op timer."""
+    server_setup()
+    if os.environ.get("PAGE_PERF") != "1" and st.query_params.get("perf") != "1":
+        return _NO_TIMER
+    data = session_data()
+    key = f"perf_history:{page}"
+    if key not in data:
+        data[key] = deque(maxlen=PERF_HISTORY)
+    return PageTimer(data[key])
+
+
+def form_mode():
+    """Sidebar switch for form mode; ``?mode=form`` turns it on by default.
+
+    In form mode a page groups its inputs into an ``st.form`` and reruns the
+    questions that depend on earlier answers as ``st.fragment`` sections, so
+    editing an input no longer rebuilds the summary and recommendation.
+    """
+    return st.sidebar.toggle(
+        "Form mode",
+        value=st.query_params.get("mode") == "form",
+        help="Update the summary and recommendation only when the assessment is submitted.",
+    )
+
+
+def submitted_decision(assessment, variant, submitted):
+    """Decision for a page in form mode, or None if there is none to show.
+
+    The assessment is evaluated when the form is submitted; the decision is
+    kept in ``session_data()`` and shown on later reruns for as long as the
+    inputs still match what was submitted.
+    """
+    data = session_data()
+    key = f"submitted_decision:{variant}"
+    if submitted:
+        data[key] = (assessment, evaluate(assessment, variant))
+    entry = data.get(key)
+    if entry is not None and entry[0] == assessment:
+        return entry[1]
+    return None
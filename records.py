@@ -0,0 +1,183 @@
+"""Compact, array-backed assessment records.
+
+An assessment mapping costs kilobytes of Python dicts and strings.  Packed
+into ``ASSESSMENT_DTYPE`` it is a fixed 46-byte row: the selected conditions
+and each complication list are bitmasks, the yes/no answers and the scales
+are small ints, and the numbers are floats with NaN for "not entered".  Ten
+million assessments take 460 MB.
+
+    packed = records.pack(assessments)           # any iterable, streamed
+    cohort.score_variants(records.cohort_table(packed))
+    rules.evaluate(records.unpack(packed[0]))
+
+Labs are stored as float32, which holds a value entered with up to seven
+significant digits as the nearest float32 rather than the decimal itself.
+The vectorized scorers therefore compare a float32 column with each cutoff
+rounded to float32 too, and ``unpack`` returns the shortest decimal that
+rounds to the stored value, so the value keeps its side of any cutoff that
+thresholds.json sets, not just the shipped ones.  Weights stay float64
+because the weight-loss percentage is a difference that can land exactly on
+10%.  Packing keeps the decision but not the page's exact wording:
+``unpack`` returns canonical scale labels, EF as the shortest decimal
+string of the stored float (``repr``, so ``"20.0"`` for 20), CD4 as an int
+when it is whole and complications in option order.
+"""
+
+import numpy as np
+
+import cohort
+import rules
+import scales
+
+# Values of the oxygen_dependent and on_dialysis fields
+ANSWER_CODES = {"": 0, "Yes": 1, "No": 2}
+ANSWERS = {code: answer for answer, code in ANSWER_CODES.items()}
+
+COMPLICATION_BITS = {
+    key: {option: 1 << i for i, option in enumerate(options)}
+    for key, options in rules.COMPLICATIONS.items()
+}
+
+ASSESSMENT_DTYPE = np.dtype([
+    ("conditions", np.uint8),
+    ("cancer_flags", np.uint8),
+    ("liver_flags", np.uint8),
+    ("dementia_flags", np.uint8),
+    ("oxygen_dependent", np.int8),
+    ("on_dialysis", np.int8),
+    ("pps", np.int8),
+    ("nyha", np.int8),
+    ("mmrc", np.int8),
+    ("fast_scale", np.int8),
+    ("ef", np.float32),
+    ("cd4_count", np.float32),
+    ("inr", np.float32),
+    ("albumin", np.float32),
+    ("egfr", np.float32),
+    ("current_weight", np.float64),
+    ("weight_earlier", np.float64),
+])
+
+_FLOAT_KEYS = ("cd4_count", "inr", "albumin", "egfr")
+
+
+def _mask(bits, values):
+    mask = 0
+    for value in values:
+        try:
+            mask |= bits[value]
+        except KeyError:
+            raise ValueError(f"unrecognized option {value!r}") from None
+    return mask
+
+
+def _answer(key, value):
+    try:
+        return ANSWER_CODES[value]
+    except KeyError:
+        raise ValueError(f"{key}: unrecognized answer {value!r}") from None
+
+
+def _float(value):
+    return np.nan if value is None else float(value)
+
+
+def encode(assessment):
+    """One assessment as a tuple in ``ASSESSMENT_DTYPE`` field order."""
+    f = rules.features(assessment)
+    return (
+        _mask(rules.CONDITION_BITS, f["conditions"]),
+        _mask(COMPLICATION_BITS["cancer_flags"], f["cancer_flags"]),
+        _mask(COMPLICATION_BITS["liver_flags"], f["liver_flags"]),
+        _mask(COMPLICATION_BITS["dementia_flags"], f["dementia_flags"]),
+        _answer("oxygen_dependent", f["oxygen_dependent"]),
+        _answer("on_dialysis", f["on_dialysis"]),
+        f["pps"],
+        f["nyha_grade"],
+        f["mmrc_grade"],
+        f["fast_grade"],
+        np.nan if f["ef_val"] is None else f["ef_val"],
+        *(_float(f[key]) for key in _FLOAT_KEYS),
+        float(f["current_weight"]),
+        float(f["weight_earlier"]),
+    )
+
+
+def pack(assessments, count=-1):
+    """Pack an iterable of assessment mappings into a structured array.
+
+    The input is consumed lazily; pass ``count`` when it is known to avoid
+    regrowing the array.
+    """
+    return np.fromiter(map(encode, assessments), dtype=ASSESSMENT_DTYPE, count=count)
+
+
+def _options(bits, mask):
+    return [option for option, bit in bits.items() if mask & bit]
+
+
+# Scale field -> (labels in grade order, first grade)
+_SCALE_LABELS = {
+    "nyha": (list(scales.NYHA_LABELS.values()), 1),
+    "mmrc": (list(scales.MMRC_LABELS.values()), 0),
+    "fast_scale": (list(scales.FAST_LABELS.values()), 1),
+}
+
+
+def _label(key, grade_value):
+    if grade_value < 0:
+        return None
+    labels, first_grade = _SCALE_LABELS[key]
+    return labels[grade_value - first_grade]
+
+
+def _number(value):
+    # str() of a NumPy float is the shortest decimal that rounds back to it
+    value = float(str(value))
+    return None if np.isnan(value) else value
+
+
+def unpack(row):
+    """Rebuild an assessment mapping from one packed row."""
+    ef = float(str(row["ef"]))
+    cd4_count = _number(row["cd4_count"])
+    return {
+        "selected_conditions": _options(rules.CONDITION_BITS, int(row["conditions"])),
+        "ef": "" if np.isnan(ef) else repr(ef),
+        "oxygen_dependent": ANSWERS[int(row["oxygen_dependent"])],
+        "on_dialysis": ANSWERS[int(row["on_dialysis"])],
+        **{key: _options(COMPLICATION_BITS[key], int(row[key])) for key in rules.COMPLICATIONS},
+        "cd4_count": int(cd4_count) if cd4_count is not None and cd4_count.is_integer() else cd4_count,
+        "pps": int(row["pps"]),
+        **{key: _label(key, int(row[key])) for key in _SCALE_LABELS},
+        "inr": _number(row["inr"]),
+        "albumin": _number(row["albumin"]),
+        "egfr": _number(row["egfr"]),
+        "current_weight": float(row["current_weight"]),
+        "weight_earlier": float(row["weight_earlier"]),
+    }
+
+
+def _popcount(mask):
+    return np.unpackbits(mask[:, None], axis=1).sum(axis=1)
+
+
+def cohort_table(packed):
+    """Column table for ``cohort.score_cohort`` over a packed array.
+
+    Numeric columns are views into ``packed``; only the boolean condition
+    columns and complication counts are derived.
+    """
+    conditions = packed["conditions"]
+    table = {
+        column: (conditions & rules.CONDITION_BITS[condition]) != 0
+        for condition, column in cohort.CONDITION_COLUMNS.items()
+    }
+    table["oxygen_dependent"] = packed["oxygen_dependent"] == ANSWER_CODES["Yes"]
+    table["on_dialysis"] = packed["on_dialysis"] != ANSWER_CODES["No"]
+    for key in rules.COMPLICATIONS:
+        table["n_" + key] = _popcount(packed[key])
+    for key in ("pps", "nyha", "mmrc", "fast_scale", "ef", *_FLOAT_KEYS, "current_weight", "weight_earlier"):
+        table[key] = packed[key]
+    return table
+
@@ -0,0 +1,308 @@
+"""Fixed-width, memory-mappable store of scored decisions.
+
+Each decision is a 28-byte ``RESULT_DTYPE`` row -- patient id, variant,
+tier, fired-condition bitmask, flag count and the time it was scored --
+after a 512-byte header, so a nightly run's output can be re-read by any
+number of dashboards and jobs without parsing:
+
+    results = result_store.open_results("nightly.results")   # np.memmap, no copy
+    results[1_000_000:2_000_000]["tier"]                       # still no copy
+    store = result_store.ResultStore("nightly.results")
+    store.get("P0012345")                                      # every row for one patient
+
+``variant`` and ``tier`` are codes into ``VARIANTS`` and ``rules.TIERS``,
+``fired`` is a bitmask over ``rules.CONDITION_IDS`` as in ``arrow_io.py``.
+The header holds a JSON description of the layout and the code tables, and
+the row count is the file size, so ``ResultWriter`` can append to an
+existing file.  Closing a writer rebuilds the patient-id index next to the
+file (``<path>.idx.npy``: ids sorted, with their row numbers), which
+``ResultStore.get`` binary-searches; rows appended after the index was
+built are scanned.
+
+To build a store from an ``arrow_io.py`` output and look a patient up:
+
+    python result_store.py nightly.results --from scored.parquet --id-column patient_id
+    python result_store.py nightly.results --get P0012345
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import rules
+
+MAGIC = b"HSPRES\x00\x01"
+HEADER_SIZE = 512
+ID_WIDTH = 16
+
+RESULT_DTYPE = np.dtype([
+    ("patient_id", f"S{ID_WIDTH}"),
+    ("variant", np.uint8),
+    ("tier", np.int8),
+    ("fired", np.uint8),
+    ("flags", np.int8),
+    ("scored_at", "datetime64[s]"),
+])
+
+INDEX_DTYPE = np.dtype([("patient_id", f"S{ID_WIDTH}"), ("row", np.int64)])
+
+# Variant codes: new variants must be appended so stored codes keep their meaning
+VARIANTS = tuple(rules.VARIANTS)
+
+
+def _header():
+    meta = {
+        "dtype": RESULT_DTYPE.descr,
+        "variants": VARIANTS,
+        "tiers": rules.TIERS,
+        "conditions": rules.CONDITION_IDS,
+    }
+    header = MAGIC + json.dumps(meta, separators=(",", ":")).encode("ascii")
+    if len(header) > HEADER_SIZE:
+        raise ValueError("result store header does not fit")
+    return header.ljust(HEADER_SIZE, b" ")
+
+
+def read_header(path):
+    """The layout description stored at the start of ``path``."""
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if not header.startswith(MAGIC):
+        raise ValueError(f"{path} is not a result store")
+    meta = json.loads(header[len(MAGIC):])
+    if [tuple(field) for field in meta["dtype"]] != RESULT_DTYPE.descr:
+        raise ValueError(f"{path} has an unsupported row layout")
+    return meta
+
+
+def open_results(path, mode="r"):
+    """The rows of ``path`` as an ``np.memmap`` of RESULT_DTYPE (empty array if none)."""
+    read_header(path)
+    rows = (os.path.getsize(path) - HEADER_SIZE) // RESULT_DTYPE.itemsize
+    if rows == 0:
+        return np.empty(0, dtype=RESULT_DTYPE)
+    return np.memmap(path, dtype=RESULT_DTYPE, mode=mode, offset=HEADER_SIZE, shape=(rows,))
+
+
+def index_path(path):
+    return path + ".idx.npy"
+
+
+def encode_ids(patient_ids):
+    """Patient ids (str, bytes or int) as fixed-width bytes; longer ids are an error."""
+    ids = np.asarray(patient_ids)
+    if ids.dtype == f"S{ID_WIDTH}":
+        return ids
+    if ids.dtype.kind not in "SU":
+        ids = ids.astype(str)
+    if ids.size and np.char.str_len(ids).max() > ID_WIDTH:
+        raise ValueError(f"patient ids are limited to {ID_WIDTH} characters")
+    return ids.astype(f"S{ID_WIDTH}")
+
+
+def variant_code(variant):
+    return VARIANTS.index(rules.get_variant(variant).name)
+
+
+class ResultWriter:
+    """Append scored rows to a result store; ``close`` rebuilds the id index."""
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path):
+            read_header(path)
+            self._file = open(path, "ab")
+        else:
+            self._file = open(path, "wb")
+            self._file.write(_header())
+
+    def append(self, patient_ids, variant, tier, fired, flags, scored_at=None):
+        """Append one variant's results for ``patient_ids`` (arrays of equal length)."""
+        ids = encode_ids(patient_ids)
+        rows = np.empty(len(ids), dtype=RESULT_DTYPE)
+        rows["patient_id"] = ids
+        rows["variant"] = variant_code(variant)
+        rows["tier"] = tier
+        rows["fired"] = fired
+        rows["flags"] = flags
+        rows["scored_at"] = np.datetime64(int(time.time()), "s") if scored_at is None else scored_at
+        self._file.write(rows.tobytes())
+
+    def close(self):
+        self._file.close()
+        build_index(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def build_index(path):
+    """Write ``<path>.idx.npy``: the store's patient ids in sorted order, with row numbers."""
+    ids = open_results(path)["patient_id"]
+    order = np.argsort(ids, kind="stable")
+    index = np.empty(len(ids), dtype=INDEX_DTYPE)
+    index["patient_id"] = ids[order]
+    index["row"] = order
+    np.save(index_path(path), index)
+
+
+class ResultStore:
+    """Read-only view of a result store with point lookups by patient id."""
+
+    def __init__(self, path):
+        self.path = path
+        self.meta = read_header(path)
+        self.results = open_results(path)
+        index = index_path(path)
+        if os.path.exists(index):
+            index = np.load(index, mmap_mode="r")
+            self._ids = index["patient_id"]
+            self._rows = index["row"]
+        else:
+            self._ids = np.empty(0, dtype=INDEX_DTYPE["patient_id"])
+            self._rows = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.results)
+
+    def rows(self, patient_id):
+        """Row numbers of ``patient_id``, in the order they were written."""
+        key = encode_ids([patient_id])[0]
+        lo = np.searchsorted(self._ids, key, side="left")
+        hi = np.searchsorted(self._ids, key, side="right")
+        found = np.sort(self._rows[lo:hi])
+        indexed = len(self._ids)
+        if indexed < len(self.results):  # appended since the index was built
+            tail = np.flatnonzero(self.results["patient_id"][indexed:] == key) + indexed
+            found = np.concatenate([found, tail])
+        return found
+
+    def get(self, patient_id, variant=None):
+        """Every stored row for ``patient_id`` (optionally one variant), oldest first."""
+        rows = self.results[self.rows(patient_id)]
+        if variant is not None:
+            rows = rows[rows["variant"] == variant_code(variant)]
+        return rows
+
+    def decode(self, rows):
+        """Rows as plain dicts with names instead of codes."""
+        return [
+            {
+                "patient_id": row["patient_id"].decode("ascii"),
+                "variant": self.meta["variants"][row["variant"]],
+                "tier": self.meta["tiers"][row["tier"]],
+                "fired": [c for i, c in enumerate(self.meta["conditions"]) if row["fired"] >> i & 1],
+                "flags": int(row["flags"]),
+                "scored_at": str(row["scored_at"]),
+            }
+            for row in rows
+        ]
+
+
+def _tier_codes(column):
+    """Codes into rules.TIERS for a tier column (names, or dictionary-encoded names).
+
+    Raises ValueError naming any value that is not a tier (a null included).
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if pa.types.is_dictionary(column.type):
+        column = column.dictionary_decode()
+    codes = pc.index_in(column, value_set=pa.array(rules.TIERS))
+    if codes.null_count:
+        unknown = pc.unique(pc.filter(column, pc.is_null(codes))).to_pylist()
+        raise ValueError(f"unknown tier {', '.join(map(repr, unknown))}; expected one of {', '.join(rules.TIERS)}")
+    return codes.to_numpy(zero_copy_only=False)
+
+
+def scored_outputs(schema, variant=None):
+    """``{variant name: (tier, fired, flags) column names}`` of an ``arrow_io.py`` output.
+
+    The variants are those recorded in the file's schema metadata.  Files
+    written before they were recorded are read by their prefixed columns,
+    and a file with unprefixed columns needs ``variant`` to say which rules
+    scored it.  Raises ValueError when the variants cannot be told, or
+    ``variant`` disagrees with the recorded ones.
+    """
+    import arrow_io
+
+    recorded = arrow_io.scored_variants(schema)
+    if recorded is not None:
+        outputs = arrow_io.output_names(recorded)
+        if variant is not None and rules.get_variant(variant).name not in outputs:
+            raise ValueError(f"the file was scored with {', '.join(outputs)}, not {variant}")
+    else:
+        outputs = {v: tuple(f"{v}_{output}" for output in arrow_io.OUTPUTS)
+                   for v in VARIANTS if f"{v}_tier" in schema.names}
+        if not outputs:
+            if variant is None:
+                raise ValueError("the file does not record which variant scored its tier column; give the variant")
+            outputs = {rules.get_variant(variant).name: arrow_io.OUTPUTS}
+    missing = [name for names in outputs.values() for name in names if name not in schema.names]
+    if missing:
+        raise ValueError(f"the file has no column {', '.join(map(repr, missing))}")
+    return outputs
+
+
+def write_scored_file(path, source, id_column, batch_size=None, variant=None):
+    """Append the results in an ``arrow_io.py`` output file to the store at ``path``.
+
+    ``variant`` names the rules of a file with unprefixed columns that does
+    not record them (see ``scored_outputs``).
+    """
+    import arrow_io
+
+    outputs = scored_outputs(arrow_io.read_schema(source), variant)
+    scored_at = np.datetime64(int(os.path.getmtime(source)), "s")
+    rows = 0
+    with ResultWriter(path) as writer:
+        for batch in arrow_io.read_batches(source, batch_size or arrow_io.BATCH_SIZE):
+            ids = encode_ids(batch.column(id_column).to_numpy(zero_copy_only=False))
+            for variant, (tier, fired, flags) in outputs.items():
+                writer.append(
+                    ids, variant,
+                    _tier_codes(batch.column(tier)),
+                    batch.column(fired).to_numpy(),
+                    batch.column(flags).to_numpy(),
+                    scored_at,
+                )
+            rows += batch.num_rows
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("store", help="result store file")
+    parser.add_argument("--from", dest="source", metavar="FILE", help="append the results in an arrow_io.py output")
+    parser.add_argument("--id-column", default="patient_id", help="patient id column of --from (default: patient_id)")
+    parser.add_argument("--get", metavar="PATIENT_ID", action="append", help="print a patient's rows (repeatable)")
+    parser.add_argument("--variant", choices=VARIANTS,
+                        help="with --get, only this variant; with --from, the variant of a file "
+                             "that does not record it")
+    args = parser.parse_args(argv)
+
+    if args.source:
+        started = time.perf_counter()
+        try:
+            rows = write_scored_file(args.store, args.source, args.id_column, variant=args.variant)
+        except ValueError as exc:
+            parser.error(f"{args.source}: {exc}")
+        print(f"stored {rows:,} patients in {time.perf_counter() - started:.2f}s "
+              f"({os.path.getsize(args.store) / 1024 / 1024:,.1f}MB)", file=sys.stderr)
+    if args.get:
+        store = ResultStore(args.store)
+        for patient_id in args.get:
+            for row in store.decode(store.get(patient_id, args.variant)):
+                print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Per-rule timings, fire counts and tier distribution.
+
+    stats = rule_stats.enable()          # or RULE_STATS=1 with enable_from_env()
+    ...                                  # score as usual
+    stats.dump("rule_stats.json")        # batch runs
+    stats.prometheus()                   # text exposition, service.py GET /metrics
+
+While stats are enabled, ``rules.decide`` runs the force_transition
+conditions and fallback flag checks one by one from the variant evaluator's
+``condition_tests`` and ``flag_tests``.  Each check is timed with ``perf_counter_ns`` and
+counted when it fires, and so is each decision and its tier.  Check times
+include reading the clock, about a tenth of a microsecond, so compare them
+with each other rather than with an uninstrumented run.  Switched off,
+``decide`` pays for one global lookup.
+
+Batches scored by ``cohort.py`` (the service's micro-batches, arrow_io.py)
+are recorded under ``path="batch"``: conditions fired and tiers per row, and
+time per batch, since the vectorized conditions share their work and cannot
+be timed apart.  Decisions served from a ``DecisionCache`` are not
+evaluated, so they are not counted.
+"""
+
+import copy
+import json
+import os
+import threading
+import time
+
+import rules
+
+PREFIX = "hospice_rules"
+
+# Counter families of samples() and their units, for stats providers that
+# declare them up front
+FAMILIES = {
+    "decisions": "",
+    "decision": "ns",
+    "tier": "",
+    "condition_evaluations": "",
+    "condition_fired": "",
+    "condition": "ns",
+    "flag_evaluations": "",
+    "flag_hits": "",
+    "flag": "ns",
+}
+
+
+def _entry():
+    return {
+        "decisions": 0,
+        "ns": 0,
+        "tiers": dict.fromkeys(rules.TIERS, 0),
+        # id -> [evaluations, fired, ns]
+        "conditions": {condition_id: [0, 0, 0] for condition_id in rules.CONDITION_IDS},
+        "flags": {check: [0, 0, 0] for check in rules.FLAG_IDS},
+    }
+
+
+class RuleStats:
+    """Counters keyed by variant and path ("record" for rules.decide, "batch" for cohort.py)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.entries = {}  # (variant name, path) -> _entry()
+
+    def _get(self, variant_name, path):
+        key = (variant_name, path)
+        if key not in self.entries:
+            self.entries[key] = _entry()
+        return self.entries[key]
+
+    def decide(self, f, variant, ruleset=None):
+        """``rules.decide``, timed check by check."""
+        evaluator = (ruleset or rules.current()).evaluator(variant)
+        clock = time.perf_counter_ns
+        started = clock()
+        fired, condition_times, hit = [], [], []
+        for condition_id, test in evaluator.condition_tests.items():
+            before = clock()
+            if test(f):
+                fired.append(condition_id)
+            condition_times.append(clock() - before)
+        flags, flag_times = 0, []
+        for test in evaluator.flag_tests.values():
+            before = clock()
+            passed = test(f)
+            flag_times.append(clock() - before)
+            hit.append(passed)
+            flags += passed
+        decision = evaluator.decision(f, fired, flags)
+        elapsed = clock() - started
+
+        with self._lock:
+            entry = self._get(variant.name, "record")
+            entry["decisions"] += 1
+            entry["ns"] += elapsed
+            entry["tiers"][decision.tier] += 1
+            for (condition_id, counts), ns in zip(entry["conditions"].items(), condition_times):
+                counts[0] += 1
+                counts[1] += condition_id in fired
+                counts[2] += ns
+            for counts, passed, ns in zip(entry["flags"].values(), hit, flag_times):
+                counts[0] += 1
+                counts[1] += passed
+                counts[2] += ns
+        return decision
+
+    def record_batch(self, variant_name, out, ns):
+        """Count a ``cohort`` result: fired conditions and tiers per row, time per batch."""
+        rows = len(out["tier"])
+        fired = {condition_id: int(out[condition_id].sum()) for condition_id in rules.CONDITION_IDS}
+        tiers = [int((out["tier"] == code).sum()) for code in range(len(rules.TIERS))]
+        with self._lock:
+            entry = self._get(variant_name, "batch")
+            entry["decisions"] += rows
+            entry["ns"] += ns
+            for tier, count in zip(rules.TIERS, tiers):
+                entry["tiers"][tier] += count
+            for condition_id, counts in entry["conditions"].items():
+                counts[0] += rows
+                counts[1] += fired[condition_id]
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "variants": [
+                    {"variant": variant_name, "path": path, **copy.deepcopy(entry)}
+                    for (variant_name, path), entry in sorted(self.entries.items())
+                ]
+            }
+
+    def merge(self, data):
+        """Add a ``to_dict()`` snapshot (from another process) to these counters."""
+        with self._lock:
+            for item in data["variants"]:
+                entry = self._get(item["variant"], item["path"])
+                entry["decisions"] += item["decisions"]
+                entry["ns"] += item["ns"]
+                for tier, count in item["tiers"].items():
+                    entry["tiers"][tier] += count
+                for group in ("conditions", "flags"):
+                    for name, counts in item[group].items():
+                        entry[group][name] = [a + b for a, b in zip(entry[group][name], counts)]
+
+    def reset(self):
+        with self._lock:
+            self.entries = {}
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.write("\n")
+
+    def samples(self):
+        """``(family, unit, help, labels, value)`` for every counter.
+
+        Families are counters named without the ``_total`` suffix; times are
+        integer nanoseconds with unit "ns", counts have unit "".
+        """
+        out = []
+        with self._lock:
+            entries = copy.deepcopy(sorted(self.entries.items()))
+        for (variant_name, path), entry in entries:
+            labels = {"variant": variant_name, "path": path}
+            out.append(("decisions", "", "Decisions evaluated.", labels, entry["decisions"]))
+            out.append(("decision", "ns", "Time spent evaluating decisions.", labels, entry["ns"]))
+            for tier, count in entry["tiers"].items():
+                out.append(("tier", "", "Decisions by tier.", {**labels, "tier": tier}, count))
+            for condition_id, (evaluations, fired, ns) in entry["conditions"].items():
+                condition = {**labels, "condition": condition_id}
+                out.append(("condition_evaluations", "", "force_transition condition checks.", condition, evaluations))
+                out.append(("condition_fired", "", "force_transition conditions that fired.", condition, fired))
+                if path == "record":
+                    out.append(("condition", "ns", "Time spent checking the condition.", condition, ns))
+            if path == "record":
+                for check, (evaluations, hits, ns) in entry["flags"].items():
+                    flag = {**labels, "check": check}
+                    out.append(("flag_evaluations", "", "Fallback flag checks.", flag, evaluations))
+                    out.append(("flag_hits", "", "Fallback flag checks that counted.", flag, hits))
+                    out.append(("flag", "ns", "Time spent on the flag check.", flag, ns))
+        return out
+
+    def prometheus(self, prefix=PREFIX):
+        """The counters in the Prometheus text exposition format, times in seconds."""
+        families = {}  # name -> lines, each family's samples kept together
+        for family, unit, help_text, labels, value in self.samples():
+            if unit == "ns":
+                name, value = f"{prefix}_{family}_seconds_total", value / 1e9
+            else:
+                name = f"{prefix}_{family}_total"
+            if name not in families:
+                families[name] = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            rendered = ",".join(f'{key}="{label}"' for key, label in labels.items())
+            families[name].append(f"{name}{{{rendered}}} {value}")
+        return "".join(line + "\n" for lines in families.values() for line in lines)
+
+
+def enable():
+    """Start recording (keeping the counters if already on); returns the RuleStats."""
+    if rules._stats is None:
+        rules._stats = RuleStats()
+    return rules._stats
+
+
+def disable():
+    rules._stats = None
+
+
+def current():
+    """The active RuleStats, or None when stats are off."""
+    return rules._stats
+
+
+def enable_from_env():
+    """``enable()`` when RULE_STATS is set to 1/true/yes; returns the RuleStats or None."""
+    if os.environ.get("RULE_STATS", "").lower() in ("1", "true", "yes"):
+        return enable()
+    return current()
@@ -0,0 +1,840 @@
+"""Hospice and Level 3 -> 4 eligibility rules, without Streamlit.
+
+``evaluate`` takes one assessment -- a mapping whose keys are the variable
+names used by Guidelines_for_hospice_referral_practice.py -- and returns a
+``Decision`` holding the tier, the ids of the force-transition conditions that
+fired, the justification lines and the assessment summary.  The Streamlit page
+collects its widgets into such a mapping and renders the result; batch jobs
+and services call ``evaluate`` directly.
+
+A decision records what fired and which interpretations apply as bitmasks
+(``fired_mask`` over CONDITION_IDS, ``interpretation_mask`` over
+INTERPRETATION_IDS) plus the values its text quotes.  The justification and
+summary lines are only formatted when ``reason_lines`` or ``summary`` is
+first read, so batch jobs that only need the tier never build strings.
+
+The level_3_to_4_* pages run the same eight conditions with small differences,
+captured by the ``Variant`` entries in ``VARIANTS``.  ``evaluate_all`` derives
+the shared features once and applies every variant to them.
+
+The numeric cutoffs (PPS, EF, eGFR, INR, albumin, CD4, weight loss and the
+flag counts of each tier) are read from thresholds.json, or the file named
+by RULE_THRESHOLDS, and compiled into one ``Evaluator`` per variant whose
+checks hold them as closure variables.  ``reload`` swaps in a newly compiled
+``Ruleset`` without stopping evaluations in flight, and ``watch`` does so
+whenever the file changes.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from dataclasses import asdict, dataclass, fields
+from functools import cached_property
+from operator import itemgetter
+
+import scales
+
+# Bump whenever a rule change can alter a decision; cached decisions are keyed on it
+RULES_VERSION = "2"
+
+# === CLINICAL CONDITIONS ===
+HF = "Heart Failure (HF)"
+PULMONARY = "Pulmonary Disease"
+CKD = "Chronic Kidney Disease (CKD)"
+CANCER = "Cancer Diagnosis"
+LIVER = "Liver Cirrhosis"
+DEMENTIA = "Dementia/Stroke/Neurological Disease"
+HIV = "HIV"
+
+CONDITIONS = [HF, PULMONARY, CKD, CANCER, LIVER, DEMENTIA, HIV]
+
+# level_3_to_4_5.py names the dementia condition differently
+CONDITION_ALIASES = {"Dementia/Stroke": DEMENTIA}
+
+# Bit for each condition in a selected-conditions bitmask
+CONDITION_BITS = {condition: 1 << i for i, condition in enumerate(CONDITIONS)}
+
+# Complication options offered across the pages, per assessment key
+COMPLICATIONS = {
+    "cancer_flags": [
+        "Evidence of metastases",
+        "Continued decline in spite of therapy",
+        "Declining therapy",
+        "Pleural effusion",
+        "Transfusion requirement",
+    ],
+    "liver_flags": [
+        "Ascites",
+        "Hepatic encephalopathy",
+        "Variceal bleeding",
+        "Hepatorenal syndrome",
+        "Spontaneous bacterial peritonitis",
+    ],
+    "dementia_flags": [
+        "Aspiration pneumonia",
+        "Pyelonephritis",
+        "septicemia",
+        "Pressure ulcers",
+        "Recurrent falls",
+        "Pyelonephritis/septicemia",
+    ],
+}
+
+# Ids of the eight force_transition conditions, in evaluation order
+CONDITION_IDS = (
+    "pps_decline",
+    "heart_failure",
+    "pulmonary",
+    "ckd",
+    "cancer",
+    "liver",
+    "dementia",
+    "hiv",
+)
+
+FIRED_BITS = {condition_id: 1 << i for i, condition_id in enumerate(CONDITION_IDS)}
+
+# Ids of the fallback flag checks, in count order
+FLAG_IDS = ("pps", "nyha_iv", "mmrc", "fast", "weight_loss", "albumin", "inr", "any_condition")
+
+# What the summary and justification lines can say, in summary order, then
+# the details that pick a justification's wording
+INTERPRETATION_IDS = (
+    "conditions_present",
+    "hf_ef",
+    "pulmonary_oxygen",
+    "ckd_dialysis",
+    "cancer_complications",
+    "liver_complications",
+    "dementia_complications",
+    "hiv_cd4",
+    "poor_pps",
+    "nyha_iv",
+    "mmrc_dyspnea",
+    "fast_dementia",
+    "weight_loss",
+    "elevated_inr",
+    "low_albumin",
+    "weight_loss_decline",
+    "albumin_decline",
+    "ef_severe",
+    "cancer_pps",
+)
+
+INTERPRETATION_BITS = {interpretation: 1 << i for i, interpretation in enumerate(INTERPRETATION_IDS)}
+
+# Assessment values quoted by the text, stored with each decision
+TEXT_KEYS = (
+    "selected_conditions",
+    "ef",
+    "ef_val",
+    "oxygen_dependent",
+    "on_dialysis",
+    "cancer_flags",
+    "liver_flags",
+    "dementia_flags",
+    "cd4_count",
+    "pps",
+    "mmrc",
+    "fast_scale",
+    "weight_loss",
+    "inr",
+    "albumin",
+)
+
+TIERS = ("red", "orange", "blue", "green")
+
+# Assessment keys and the value a page holds when the widget is not shown
+DEFAULTS = {
+    "selected_conditions": (),
+    "ef": "",
+    "oxygen_dependent": "",
+    "on_dialysis": "",
+    "cancer_flags": (),
+    "liver_flags": (),
+    "dementia_flags": (),
+    "cd4_count": None,
+    "pps": None,
+    "nyha": None,
+    "mmrc": None,
+    "fast_scale": None,
+    "current_weight": 0.0,
+    "weight_earlier": 0.0,
+    "inr": None,
+    "albumin": None,
+    "egfr": None,
+}
+
+
+@dataclass(frozen=True)
+class Variant:
+    """How one page applies the shared rules.
+
+    The NYHA/mMRC/FAST sets hold the grades that trigger each check.  Pages
+    that store labels such as "mMRC Grade 4" but compare them with bare "3"/"4"
+    never match, which is recorded here as an empty set.
+    """
+
+    name: str
+    mmrc_summary: frozenset
+    mmrc_force: frozenset
+    mmrc_flag: frozenset
+    fast_summary: frozenset
+    fast_force: frozenset
+    fast_flag: frozenset
+    # level_3_to_4_5.py tests ``albumin < x`` directly, so an albumin of 0 counts
+    zero_albumin_counts: bool = False
+    # level_3_to_4_5.py has no eGFR input and always reads it as 0
+    reads_egfr: bool = True
+
+
+_NONE = frozenset()
+
+HOSPICE = Variant(
+    "hospice",
+    mmrc_summary=frozenset({4}), mmrc_force=frozenset({4}), mmrc_flag=_NONE,
+    fast_summary=frozenset({7}), fast_force=frozenset({7}), fast_flag=_NONE,
+)
+
+VARIANTS = {
+    variant.name: variant
+    for variant in (
+        HOSPICE,
+        Variant(
+            "level_3_to_4_5",
+            mmrc_summary=frozenset({3, 4}), mmrc_force=frozenset({4}), mmrc_flag=frozenset({3, 4}),
+            fast_summary=frozenset({6, 7}), fast_force=frozenset({7}), fast_flag=frozenset({6, 7}),
+            zero_albumin_counts=True,
+            reads_egfr=False,
+        ),
+        Variant(
+            "level_3_to_4_7",
+            mmrc_summary=_NONE, mmrc_force=_NONE, mmrc_flag=_NONE,
+            fast_summary=_NONE, fast_force=_NONE, fast_flag=_NONE,
+        ),
+        Variant(
+            "level_3_to_4_8",
+            mmrc_summary=_NONE, mmrc_force=_NONE, mmrc_flag=_NONE,
+            fast_summary=_NONE, fast_force=_NONE, fast_flag=_NONE,
+        ),
+        Variant(
+            "level_3_to_4_9",
+            mmrc_summary=frozenset({4}), mmrc_force=frozenset({4}), mmrc_flag=_NONE,
+            fast_summary=frozenset({7}), fast_force=frozenset({7}), fast_flag=_NONE,
+        ),
+    )
+}
+
+
+# thresholds.json, or the file named by RULE_THRESHOLDS
+THRESHOLDS_FILE = os.environ.get("RULE_THRESHOLDS") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "thresholds.json"
+)
+
+
+@dataclass(frozen=True)
+class Thresholds:
+    """The numeric cutoffs of one variant, as named in thresholds.json.
+
+    The file's "thresholds" object sets them all; "variants" overrides some
+    of them for one variant (the hospice page reports low albumin below 2.5
+    rather than 3.0).
+    """
+
+    pps_poor: int             # PPS ≤: fallback flag, "poor functional status"
+    pps_decline: int          # PPS ≤: condition 1
+    pps_cancer: int           # PPS ≤: condition 5
+    pps_hiv: int              # PPS ≤: condition 8
+    weight_loss: float        # % lost ≥: condition 1, fallback flag
+    albumin_decline: float    # albumin <: condition 1
+    albumin_liver: float      # albumin ≤: condition 6
+    albumin_flag: float       # albumin <: fallback flag
+    albumin_summary: float    # albumin <: "low albumin" summary line
+    inr_liver: float          # INR ≥: condition 6
+    inr_elevated: float       # INR >: fallback flag, "elevated INR" summary line
+    ef: float                 # EF ≤: condition 2
+    egfr: float               # eGFR ≤: condition 4
+    cd4: float                # CD4 ≤: condition 8
+    orange_flags: int         # fallback flags ≥: orange
+    blue_flags: int           # fallback flags ≥: blue
+
+
+@dataclass(frozen=True)
+class Decision:
+    variant: str
+    tier: str
+    fired: tuple
+    flags: int
+    fired_mask: int
+    interpretation_mask: int
+    values: tuple
+    thresholds: Thresholds
+
+    @property
+    def force_transition(self):
+        return self.tier == "red"
+
+    def text_values(self):
+        return dict(zip(TEXT_KEYS, self.values))
+
+    @cached_property
+    def reason_lines(self):
+        return tuple(render_reasons(self.fired_mask, self.interpretation_mask, self.text_values(), self.thresholds))
+
+    @cached_property
+    def summary(self):
+        return tuple(render_summary(self.interpretation_mask, self.text_values()))
+
+
+def weight_loss_pct(current_weight, weight_earlier):
+    if weight_earlier > 0 and current_weight < weight_earlier:
+        return ((weight_earlier - current_weight) / weight_earlier) * 100
+    return 0
+
+
+def _float_or(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def normalize(assessment):
+    """Fill missing keys with the values the page uses for hidden widgets."""
+    a = dict(DEFAULTS)
+    a.update(assessment)
+    if a["pps"] is None:
+        raise ValueError("assessment has no PPS score")
+    a["pps"] = int(a["pps"])
+    return a
+
+
+# Multiselect answers, kept as tuples so a decision's values are hashable
+_OPTION_KEYS = ("selected_conditions", "cancer_flags", "liver_flags", "dementia_flags")
+
+
+def features(assessment):
+    """Normalize an assessment and derive the values every variant shares."""
+    f = normalize(assessment)
+    for key in _OPTION_KEYS:
+        # A bare string would otherwise be read one character per option
+        if not isinstance(f[key], (list, tuple)):
+            raise ValueError(f"{key} must be a list of options, not {type(f[key]).__name__}")
+        f[key] = tuple(f[key])
+    f["conditions"] = frozenset(CONDITION_ALIASES.get(c, c) for c in f["selected_conditions"])
+    f["weight_loss"] = weight_loss_pct(f["current_weight"], f["weight_earlier"])
+    f["ef_val"] = _float_or(f["ef"], None)
+    f["egfr_val"] = _float_or(f["egfr"], 0)
+    f["nyha_grade"] = scales.grade(scales.NYHA_GRADES, f["nyha"])
+    f["mmrc_grade"] = scales.grade(scales.MMRC_GRADES, f["mmrc"])
+    f["fast_grade"] = scales.grade(scales.FAST_GRADES, f["fast_scale"])
+    return f
+
+
+# The values of ``features`` that the text quotes, as a tuple in TEXT_KEYS order
+text_values = itemgetter(*TEXT_KEYS)
+
+
+def render_summary(mask, v):
+    """Assessment summary lines from an interpretation mask and ``text_values``."""
+    bits = INTERPRETATION_BITS
+    pps, inr, albumin = v["pps"], v["inr"], v["albumin"]
+    summary = []
+
+    # Clinical condition summary
+    if mask & bits["conditions_present"]:
+        summary.append(f"• Clinical conditions present: {', '.join(v['selected_conditions'])}.")
+    else:
+        summary.append("• No underlying clinical conditions were selected.")
+
+    # Condition-specific details
+    if mask & bits["hf_ef"]:
+        summary.append(f"• HF with EF: {v['ef']}%")
+    if mask & bits["pulmonary_oxygen"]:
+        summary.append(f"• Pulmonary Disease: Oxygen dependent - {v['oxygen_dependent']}")
+    if mask & bits["ckd_dialysis"]:
+        summary.append(f"• CKD: On dialysis - {v['on_dialysis']}")
+    if mask & bits["cancer_complications"]:
+        summary.append(f"• Cancer complications: {', '.join(v['cancer_flags'])}")
+    if mask & bits["liver_complications"]:
+        summary.append(f"• Liver Cirrhosis complications: {', '.join(v['liver_flags'])}")
+    if mask & bits["dementia_complications"]:
+        summary.append(f"• Dementia/Stroke complications: {', '.join(v['dementia_flags'])}")
+    if mask & bits["hiv_cd4"]:
+        summary.append(f"• HIV: CD4 count = {v['cd4_count']}")
+
+    # Group 1 interpretations
+    if mask & bits["poor_pps"]:
+        summary.append(f"• PPS score of {pps}% indicates poor functional status.")
+    if mask & bits["nyha_iv"]:
+        summary.append("• NYHA Class IV indicates severe cardiac limitation.")
+    if mask & bits["mmrc_dyspnea"]:
+        summary.append(f"• mMRC score of {v['mmrc']} suggests significant dyspnea.")
+    if mask & bits["fast_dementia"]:
+        summary.append(f"• FAST scale of {v['fast_scale']} indicates moderate to severe dementia.")
+
+    # Group 2 interpretations
+    if mask & bits["weight_loss"]:
+        summary.append(f"• Weight loss of {v['weight_loss']:.1f}% over 6–12 months.")
+    if mask & bits["elevated_inr"]:
+        summary.append(f"• Elevated INR of {inr}, which may reflect hepatic dysfunction or anticoagulation risk.")
+    if mask & bits["low_albumin"]:
+        summary.append(f"• Low albumin level of {albumin} g/dL suggests poor nutritional or hepatic status.")
+
+    return summary
+
+
+def render_reasons(fired_mask, mask, v, t):
+    """Justification lines for the fired conditions, from the masks, ``text_values`` and ``Thresholds``."""
+    bits = INTERPRETATION_BITS
+    pps = v["pps"]
+    reason_lines = []
+
+    if fired_mask & FIRED_BITS["pps_decline"]:
+        weight_flag = mask & bits["weight_loss_decline"]
+        albumin_flag = mask & bits["albumin_decline"]
+        reason_lines.append(
+            f"• PPS is {pps}% and {f'≥{t.weight_loss:g}% weight loss' if weight_flag else ''}"
+            f"{' and ' if weight_flag and albumin_flag else ''}"
+            f"{f'albumin < {t.albumin_decline:g} g/dL' if albumin_flag else ''}."
+        )
+    if fired_mask & FIRED_BITS["heart_failure"]:
+        if mask & bits["nyha_iv"]:
+            reason_lines.append("• HF with NYHA Class IV.")
+        if mask & bits["ef_severe"]:
+            reason_lines.append(f"• HF with EF ≤ {t.ef:g}% (EF = {v['ef_val']}%).")
+    if fired_mask & FIRED_BITS["pulmonary"]:
+        reason_lines.append("• Severe pulmonary disease: mMRC = 4 and oxygen dependent.")
+    if fired_mask & FIRED_BITS["ckd"]:
+        reason_lines.append(f"• CKD with eGFR ≤ {t.egfr:g} and not on dialysis.")
+    if fired_mask & FIRED_BITS["cancer"]:
+        cancer_flags = v["cancer_flags"]
+        cancer_pps = mask & bits["cancer_pps"]
+        detail = f"PPS = {pps}%" if cancer_pps else ""
+        detail += " and " if cancer_pps and cancer_flags else ""
+        detail += f"complications: {', '.join(cancer_flags)}" if cancer_flags else ""
+        reason_lines.append(f"• Cancer diagnosis with {detail}.")
+    if fired_mask & FIRED_BITS["liver"]:
+        reason_lines.append(
+            f"• Decompensated liver cirrhosis: INR = {v['inr']}, albumin = {v['albumin']}, "
+            f"complications: {', '.join(v['liver_flags'])}."
+        )
+    if fired_mask & FIRED_BITS["dementia"]:
+        reason_lines.append(
+            f"• End-stage dementia or stroke: FAST stage 7 with complications: {', '.join(v['dementia_flags'])}."
+        )
+    if fired_mask & FIRED_BITS["hiv"]:
+        reason_lines.append(f"• Advanced HIV: CD4 = {v['cd4_count']}, PPS = {pps}%.")
+
+    return reason_lines
+
+
+class Evaluator:
+    """One variant's checks with its cutoffs compiled in, from ``compile_variant``.
+
+    ``fired``, ``flags``, ``interpretations`` and ``decide`` take ``features``;
+    ``tier`` and ``decision`` also take the fired ids and flag count.
+    ``condition_tests`` and ``flag_tests`` hold one function per check,
+    keyed by CONDITION_IDS and FLAG_IDS; ``fired`` and ``flags`` run them in
+    that order, and rule_stats times and counts them one by one.
+    """
+
+    __slots__ = (
+        "variant", "thresholds", "fired", "flags", "interpretations", "tier", "decision", "decide",
+        "condition_tests", "flag_tests",
+    )
+
+    def __init__(self, variant, thresholds, fired, flags, interpretations, tier, decision, decide,
+                 condition_tests, flag_tests):
+        self.variant = variant
+        self.thresholds = thresholds
+        self.fired = fired
+        self.flags = flags
+        self.interpretations = interpretations
+        self.tier = tier
+        self.decision = decision
+        self.decide = decide
+        self.condition_tests = condition_tests
+        self.flag_tests = flag_tests
+
+
+def compile_variant(variant, t):
+    """An ``Evaluator`` for ``variant`` with the cutoffs ``t`` bound into its checks.
+
+    Every cutoff and variant setting is a closure variable, so evaluating a
+    record reads neither the config nor the Variant.
+    """
+    name = variant.name
+    mmrc_summary, mmrc_force, mmrc_flag = variant.mmrc_summary, variant.mmrc_force, variant.mmrc_flag
+    fast_summary, fast_force, fast_flag = variant.fast_summary, variant.fast_force, variant.fast_flag
+    reads_egfr = variant.reads_egfr
+    pps_poor, pps_decline, pps_cancer, pps_hiv = t.pps_poor, t.pps_decline, t.pps_cancer, t.pps_hiv
+    weight_loss_min = t.weight_loss
+    albumin_decline, albumin_liver = t.albumin_decline, t.albumin_liver
+    albumin_flag, albumin_summary = t.albumin_flag, t.albumin_summary
+    inr_liver, inr_elevated = t.inr_liver, t.inr_elevated
+    ef_max, egfr_max, cd4_max = t.ef, t.egfr, t.cd4
+    orange_flags, blue_flags = t.orange_flags, t.blue_flags
+    bits = INTERPRETATION_BITS
+
+    if variant.zero_albumin_counts:
+        def albumin_below(albumin, cutoff):
+            return albumin is not None and albumin < cutoff
+    else:
+        def albumin_below(albumin, cutoff):
+            return bool(albumin) and albumin < cutoff
+
+    def interpretations(f):
+        conditions = f["conditions"]
+        pps, inr, albumin = f["pps"], f["inr"], f["albumin"]
+        ef_val = f["ef_val"]
+        mask = 0
+
+        # Clinical conditions and condition-specific details
+        if f["selected_conditions"]: mask |= bits["conditions_present"]
+        if HF in conditions and f["ef"]: mask |= bits["hf_ef"]
+        if PULMONARY in conditions: mask |= bits["pulmonary_oxygen"]
+        if CKD in conditions: mask |= bits["ckd_dialysis"]
+        if CANCER in conditions and f["cancer_flags"]: mask |= bits["cancer_complications"]
+        if LIVER in conditions and f["liver_flags"]: mask |= bits["liver_complications"]
+        if DEMENTIA in conditions and f["dementia_flags"]: mask |= bits["dementia_complications"]
+        if HIV in conditions and f["cd4_count"] is not None: mask |= bits["hiv_cd4"]
+
+        # Group 1 interpretations
+        if pps <= pps_poor: mask |= bits["poor_pps"]
+        if f["nyha_grade"] == 4: mask |= bits["nyha_iv"]
+        if f["mmrc_grade"] in mmrc_summary: mask |= bits["mmrc_dyspnea"]
+        if f["fast_grade"] in fast_summary: mask |= bits["fast_dementia"]
+
+        # Group 2 interpretations
+        if f["weight_loss"]: mask |= bits["weight_loss"]
+        if inr is not None and inr > inr_elevated: mask |= bits["elevated_inr"]
+        if albumin is not None and albumin < albumin_summary: mask |= bits["low_albumin"]
+
+        # Justification details
+        if f["weight_loss"] >= weight_loss_min: mask |= bits["weight_loss_decline"]
+        if albumin_below(albumin, albumin_decline): mask |= bits["albumin_decline"]
+        if ef_val is not None and ef_val <= ef_max: mask |= bits["ef_severe"]
+        if pps <= pps_cancer: mask |= bits["cancer_pps"]
+        return mask
+
+    condition_tests = {
+        # Condition 1: PPS ≤ pps_decline and (weight loss ≥ weight_loss or albumin < albumin_decline)
+        "pps_decline": lambda f: (
+            f["pps"] <= pps_decline
+            and (f["weight_loss"] >= weight_loss_min or albumin_below(f["albumin"], albumin_decline))
+        ),
+        # Condition 2: HF and (NYHA IV or EF ≤ ef)
+        "heart_failure": lambda f: (
+            HF in f["conditions"]
+            and (f["nyha_grade"] == 4 or (f["ef_val"] is not None and f["ef_val"] <= ef_max))
+        ),
+        # Condition 3: Pulmonary Disease, mMRC = 4, and oxygen dependent
+        "pulmonary": lambda f: (
+            PULMONARY in f["conditions"] and f["mmrc_grade"] in mmrc_force and f["oxygen_dependent"] == "Yes"
+        ),
+        # Condition 4: CKD with eGFR ≤ egfr and not on dialysis (a missing eGFR counts as 0)
+        "ckd": lambda f: (
+            CKD in f["conditions"] and f["on_dialysis"] == "No"
+            and (f["egfr_val"] if reads_egfr else 0) <= egfr_max
+        ),
+        # Condition 5: Cancer with PPS ≤ pps_cancer or complications
+        "cancer": lambda f: CANCER in f["conditions"] and bool(f["pps"] <= pps_cancer or f["cancer_flags"]),
+        # Condition 6: Liver Cirrhosis with INR ≥ inr_liver, albumin ≤ albumin_liver, and any complication
+        "liver": lambda f: (
+            LIVER in f["conditions"] and f["inr"] is not None and f["inr"] >= inr_liver
+            and f["albumin"] is not None and f["albumin"] <= albumin_liver and bool(f["liver_flags"])
+        ),
+        # Condition 7: Dementia/Stroke with FAST stage 7 and complications
+        "dementia": lambda f: (
+            DEMENTIA in f["conditions"] and f["fast_grade"] in fast_force and bool(f["dementia_flags"])
+        ),
+        # Condition 8: HIV with CD4 ≤ cd4 and PPS ≤ pps_hiv
+        "hiv": lambda f: (
+            HIV in f["conditions"] and f["cd4_count"] is not None and f["cd4_count"] <= cd4_max
+            and f["pps"] <= pps_hiv
+        ),
+    }
+
+    flag_tests = {
+        "pps": lambda f: f["pps"] <= pps_poor,
+        "nyha_iv": lambda f: f["nyha_grade"] == 4,
+        "mmrc": lambda f: f["mmrc_grade"] in mmrc_flag,
+        "fast": lambda f: f["fast_grade"] in fast_flag,
+        "weight_loss": lambda f: f["weight_loss"] >= weight_loss_min,
+        "albumin": lambda f: albumin_below(f["albumin"], albumin_flag),
+        "inr": lambda f: bool(f["inr"] and f["inr"] > inr_elevated),
+        "any_condition": lambda f: bool(f["selected_conditions"]),
+    }
+
+    # fired_conditions and count_flags are built from these tables, so
+    # rule_stats times exactly the checks that decide runs
+    condition_checks = tuple((condition_id, condition_tests[condition_id]) for condition_id in CONDITION_IDS)
+    flag_checks = tuple(flag_tests[check] for check in FLAG_IDS)
+
+    def fired_conditions(f):
+        return [condition_id for condition_id, test in condition_checks if test(f)]
+
+    def count_flags(f):
+        return sum([test(f) for test in flag_checks])
+
+    def tier_for(fired, flags):
+        if fired:
+            return "red"
+        if flags >= orange_flags:
+            return "orange"
+        if flags >= blue_flags:
+            return "blue"
+        return "green"
+
+    def decision(f, fired, flags):
+        return Decision(
+            variant=name,
+            tier=tier_for(fired, flags),
+            fired=tuple(fired),
+            flags=flags,
+            fired_mask=sum(FIRED_BITS[condition_id] for condition_id in fired),
+            interpretation_mask=interpretations(f),
+            values=text_values(f),
+            thresholds=t,
+        )
+
+    def decide(f):
+        return decision(f, fired_conditions(f), count_flags(f))
+
+    return Evaluator(
+        variant, t, fired_conditions, count_flags, interpretations, tier_for, decision, decide,
+        condition_tests, flag_tests,
+    )
+
+
+def _variant_thresholds(config):
+    """``(base, {variant name: Thresholds})`` from a parsed thresholds file.
+
+    Raises ValueError if a cutoff is missing, unknown or not a number, or an
+    override names a variant that does not exist.
+    """
+    if not isinstance(config, dict) or not isinstance(config.get("version"), str):
+        raise ValueError("thresholds config has no 'version' string")
+    names = {field.name for field in fields(Thresholds)}
+    overrides = config.get("variants", {})
+    unknown = set(overrides) - set(VARIANTS)
+    if unknown:
+        raise ValueError(f"thresholds for unknown rule variants: {', '.join(sorted(unknown))}")
+
+    def build(label, values):
+        missing, extra = names - set(values), set(values) - names
+        if missing or extra:
+            raise ValueError(
+                f"{label} thresholds: "
+                + "; ".join(f"{kind} {', '.join(sorted(keys))}" for kind, keys in (("missing", missing), ("unknown", extra)) if keys)
+            )
+        bad = [key for key, value in values.items() if isinstance(value, bool) or not isinstance(value, (int, float))]
+        if bad:
+            raise ValueError(f"{label} thresholds are not numbers: {', '.join(sorted(bad))}")
+        t = Thresholds(**values)
+        if t.blue_flags > t.orange_flags:
+            raise ValueError(f"{label} thresholds: blue_flags is above orange_flags")
+        return t
+
+    base = build("default", config.get("thresholds", {}))
+    by_variant = {}
+    for name in VARIANTS:
+        extra = overrides.get(name, {})
+        if not isinstance(extra, dict):
+            raise ValueError(f"{name} thresholds must be an object")
+        by_variant[name] = build(name, {**asdict(base), **extra}) if extra else base
+    return base, by_variant
+
+
+class Ruleset:
+    """Every variant compiled against one thresholds config.
+
+    ``version`` combines RULES_VERSION, the config's own version and a
+    checksum of the cutoffs, so decisions cached under one ruleset are never
+    served under another, even if a file is edited without a version bump.
+    """
+
+    def __init__(self, config, path=None):
+        self.path = path
+        self.config = config
+        self.base, self.thresholds = _variant_thresholds(config)
+        cutoffs = json.dumps({name: asdict(t) for name, t in self.thresholds.items()}, sort_keys=True)
+        self.version = f"{RULES_VERSION}/{config['version']}/{zlib.crc32(cutoffs.encode('ascii')):08x}"
+        self.evaluators = {name: compile_variant(VARIANTS[name], t) for name, t in self.thresholds.items()}
+
+    def evaluator(self, variant):
+        evaluator = self.evaluators.get(variant.name)
+        if evaluator is None or evaluator.variant is not variant:
+            # A Variant made outside VARIANTS: compiled on every call
+            evaluator = compile_variant(variant, self.thresholds.get(variant.name, self.base))
+        return evaluator
+
+    def thresholds_for(self, variant):
+        """The ``Thresholds`` of a variant (name or Variant)."""
+        return self.thresholds.get(get_variant(variant).name, self.base)
+
+
+def load(path=None):
+    """Compile the thresholds file at ``path`` (default THRESHOLDS_FILE) into a ``Ruleset``."""
+    path = path or THRESHOLDS_FILE
+    with open(path, encoding="utf-8") as f:
+        return Ruleset(json.load(f), path)
+
+
+def interpretations(f, variant=HOSPICE):
+    """Bitmask over INTERPRETATION_IDS of what the text will say about ``f``."""
+    return _ruleset.evaluator(variant).interpretations(f)
+
+
+def build_summary(f, variant=HOSPICE):
+    return render_summary(interpretations(f, variant), f)
+
+
+def fired_conditions(f, variant=HOSPICE):
+    """Ids of the force_transition conditions that fire, in CONDITION_IDS order."""
+    return _ruleset.evaluator(variant).fired(f)
+
+
+def force_transition_reasons(f, variant=HOSPICE):
+    """Return ``(fired, reason_lines)`` for the eight force_transition conditions."""
+    evaluator = _ruleset.evaluator(variant)
+    fired = evaluator.fired(f)
+    fired_mask = sum(FIRED_BITS[condition_id] for condition_id in fired)
+    return fired, render_reasons(fired_mask, evaluator.interpretations(f), f, evaluator.thresholds)
+
+
+def count_flags(f, variant=HOSPICE):
+    """Fallback criteria count used when no force_transition condition fired."""
+    return _ruleset.evaluator(variant).flags(f)
+
+
+def tier_for(fired, flags, variant=HOSPICE):
+    return _ruleset.evaluator(variant).tier(fired, flags)
+
+
+def get_variant(variant):
+    if isinstance(variant, Variant):
+        return variant
+    try:
+        return VARIANTS[variant]
+    except KeyError:
+        raise ValueError(f"unknown rule variant {variant!r}; expected one of {', '.join(VARIANTS)}") from None
+
+
+# Set by rule_stats.enable(): decide() then times each check of the
+# evaluator's condition_tests and flag_tests; while None the fast path below
+# only pays for this lookup
+_stats = None
+
+
+def decide(f, variant=HOSPICE, ruleset=None):
+    """Apply one variant to precomputed ``features``; the text is left for later.
+
+    ``ruleset`` defaults to the live one (``current()``).
+    """
+    ruleset = ruleset or _ruleset
+    if _stats is not None:
+        return _stats.decide(f, variant, ruleset)
+    return ruleset.evaluator(variant).decide(f)
+
+
+def evaluate(assessment, variant="hospice", ruleset=None):
+    """Score one assessment under ``variant`` and return its ``Decision``."""
+    return decide(features(assessment), get_variant(variant), ruleset)
+
+
+def evaluate_all(assessment, variants=None, ruleset=None):
+    """Score one assessment under several variants (default: all of them).
+
+    The shared features are computed once; returns ``{variant name: Decision}``.
+    """
+    ruleset = ruleset or _ruleset
+    f = features(assessment)
+    return {v.name: decide(f, v, ruleset) for v in map(get_variant, variants or VARIANTS)}
+
+
+# === LIVE RULESET ===
+# Replaced as a whole by reload(); readers take one reference per decision
+# (or per batch) and never lock
+_ruleset = load()
+_reload_lock = threading.Lock()
+_reload_hooks = []
+_watcher = None
+
+
+def current():
+    """The live ``Ruleset``."""
+    return _ruleset
+
+
+def on_reload(hook):
+    """Call ``hook(ruleset)`` with every reloaded ruleset before it goes live.
+
+    Hooks prepare whatever depends on the cutoffs (truth_table.py builds its
+    tables) so the first request after a reload does not pay for it; one
+    that raises aborts the reload.
+    """
+    _reload_hooks.append(hook)
+
+
+def reload(path=None):
+    """Compile ``path`` (default: the live ruleset's file) and make it the live ruleset.
+
+    Loading, compiling and the ``on_reload`` hooks run on the calling thread
+    while the old ruleset keeps serving; switching is a single assignment,
+    and decisions already under way finish with the ruleset they started
+    with.  On any error the old ruleset stays live.
+    """
+    global _ruleset
+    with _reload_lock:
+        ruleset = load(path or _ruleset.path)
+        for hook in _reload_hooks:
+            hook(ruleset)
+        _ruleset = ruleset
+    return ruleset
+
+
+def _stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _watch(interval):
+    path = _ruleset.path
+    seen = _stamp(path)
+    while True:
+        time.sleep(interval)
+        if _ruleset.path != path:  # reloaded from another file
+            path, seen = _ruleset.path, _stamp(_ruleset.path)
+            continue
+        stamp = _stamp(path)
+        if stamp is None or stamp == seen:
+            continue
+        seen = stamp
+        try:
+            ruleset = reload(path)
+        except Exception as exc:  # a half-written or invalid file: keep serving the old rules
+            print(f"rules: keeping thresholds {_ruleset.version}; {path}: {exc}", file=sys.stderr, flush=True)
+        else:
+            print(f"rules: reloaded thresholds {ruleset.version} from {path}", file=sys.stderr, flush=True)
+
+
+def watch(interval=2.0):
+    """Reload the live thresholds file whenever it changes, checking every ``interval`` seconds.
+
+    Runs in a daemon thread, started once per process (later calls return
+    the same thread); long-running servers call it at startup.
+    """
+    global _watcher
+    with _reload_lock:
+        if _watcher is None:
+            _watcher = threading.Thread(target=_watch, args=(interval,), name="rule-thresholds", daemon=True)
+            _watcher.start()
+    return _watcher
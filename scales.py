@@ -0,0 +1,200 @@
+"""Lookup tables for the PPS, NYHA, mMRC and FAST questionnaires.
+
+The tables are compiled once at import: answering a questionnaire is a single
+dict lookup instead of walking an if/elif chain over long descriptions.  The
+Streamlit pages use the option lists and lookups below, and the batch
+importers use the same tables to turn raw questionnaire exports into scores.
+
+Every answer has a compact code as well as its on-screen text:
+
+    PPS   ambulation letter + answers, e.g. "F0" (Full, first disease status),
+          "RYN" (Reduced, unable to work: Yes, unable hobbies: No), "B2"
+    NYHA  "I".."IV"     mMRC  "0".."4"     FAST  "1".."7"
+"""
+
+YES_NO = ["Yes", "No"]
+
+# === PALLIATIVE PERFORMANCE SCALE (PPS) ===
+AMBULATION = ["Full", "Reduced", "Mainly Sit/Lie", "Totally Bed Bound"]
+
+DISEASE_STATUS = [
+    "Normal activity, no evidence of disease",
+    "Normal activity, some evidence of disease",
+    "Normal activity with effort, some evidence of disease",
+]
+
+INTAKE = [
+    "Normal or reduced",
+    "Minimal to sips",
+    "Mouth care only",
+]
+
+AMBULATION_CODES = {"Full": "F", "Reduced": "R", "Mainly Sit/Lie": "S", "Totally Bed Bound": "B"}
+
+# Follow-up questions for each ambulation status, in the order they are asked
+PPS_QUESTIONS = {
+    "Full": [DISEASE_STATUS],
+    "Reduced": [YES_NO, YES_NO],  # unable to do normal work, unable to do hobbies/housework
+    "Mainly Sit/Lie": [YES_NO, YES_NO],  # needs considerable assistance, mainly assisted
+    "Totally Bed Bound": [INTAKE],
+}
+
+
+def _pps_rule(ambulation, answers):
+    """The PPS decision tree; only used to build the tables below."""
+    if ambulation == "Full":
+        return [100, 90, 80][DISEASE_STATUS.index(answers[0])]
+    if ambulation == "Reduced":
+        unable_normal_work, unable_hobby_care = answers
+        if unable_hobby_care == "Yes":
+            return 60
+        if unable_normal_work == "Yes":
+            return 70
+        return None
+    if ambulation == "Mainly Sit/Lie":
+        needs_assistance, mainly_assisted = answers
+        if mainly_assisted == "Yes":
+            return 40
+        if needs_assistance == "Yes":
+            return 50
+        return None
+    return [30, 20, 10][INTAKE.index(answers[0])]
+
+
+def _answer_code(options, answer):
+    return answer[0] if options is YES_NO else str(options.index(answer))
+
+
+def _compile_pps():
+    by_answers, by_code = {}, {}
+    for ambulation, questions in PPS_QUESTIONS.items():
+        combos = [()]
+        for options in questions:
+            combos = [combo + (answer,) for combo in combos for answer in options]
+        for answers in combos:
+            score = _pps_rule(ambulation, answers)
+            code = AMBULATION_CODES[ambulation] + "".join(
+                _answer_code(options, answer) for options, answer in zip(questions, answers)
+            )
+            by_answers[(ambulation, *answers)] = score
+            by_code[code] = score
+    return by_answers, by_code
+
+
+# (ambulation, *answers) -> PPS, and compact code -> PPS.  None where the
+# answers do not determine a score.
+PPS_BY_ANSWERS, PPS_BY_CODE = _compile_pps()
+
+
+def pps_score(ambulation, *answers):
+    """PPS for one set of questionnaire answers, or None if they give no score."""
+    try:
+        return PPS_BY_ANSWERS[(ambulation, *answers)]
+    except KeyError:
+        raise ValueError(f"unrecognized PPS answers {(ambulation, *answers)!r}") from None
+
+
+# === NYHA / mMRC / FAST ===
+NYHA_DESCRIPTIONS = [
+    "No limitation of physical activity; ordinary physical activity does not cause undue fatigue, palpitation, or dyspnea",
+    "Slight limitation of physical activity; comfortable at rest; ordinary physical activity results in fatigue, palpitation, or dyspnea",
+    "Marked limitation of physical activity, comfortable at rest; less than ordinary activity causes fatigue, palpitation or dyspnea",
+    "Unable to carry on any physical activity without discomfort; symptoms of heart failure at rest; if any physical activity is undertaken, discomfort increases",
+]
+
+MMRC_DESCRIPTIONS = [
+    "Dyspnea only with strenuous exercise",
+    "Dyspnea when hurrying or walking up a slight hill",
+    "Walks slower than people of same age due to dyspnea or has to stop for breath when walking at own pace",
+    "Stops for breath after walking 100 meters or after a few minutes on level ground",
+    "Too dyspneic to leave house or breathless when dressing",
+]
+
+FAST_DESCRIPTIONS = [
+    "Normal adult with no functional decline",
+    "Subjective functional deficit",
+    "Objective functional deficit interfering with complex tasks",
+    "Decreased ability to perform instrumental ADLs (e.g., finances, cooking, shopping)",
+    "Requires assistance with choosing proper clothing",
+    "Requires assistance with dressing, bathing, or toileting",
+    "Incontinence, minimal to no speech, inability to walk",
+]
+
+NYHA_CODES = ["I", "II", "III", "IV"]
+
+
+def _compile_scale(descriptions, label_prefix, codes, first_grade):
+    """Return ``(labels, grades)``: description -> label, and any answer form -> grade."""
+    labels, grades = {}, {}
+    for offset, (description, code) in enumerate(zip(descriptions, codes)):
+        grade = first_grade + offset
+        label = f"{label_prefix} {code}"
+        labels[description] = label
+        for answer in (description, label, code, str(grade)):
+            grades[answer] = grade
+    return labels, grades
+
+
+NYHA_LABELS, NYHA_GRADES = _compile_scale(NYHA_DESCRIPTIONS, "NYHA Class", NYHA_CODES, 1)
+MMRC_LABELS, MMRC_GRADES = _compile_scale(MMRC_DESCRIPTIONS, "mMRC Grade", [str(g) for g in range(5)], 0)
+FAST_LABELS, FAST_GRADES = _compile_scale(FAST_DESCRIPTIONS, "FAST Stage", [str(g) for g in range(1, 8)], 1)
+
+
+def grade(grades, answer):
+    """Grade of a NYHA/mMRC/FAST answer in any form, -1 if not answered.
+
+    ``grades`` is one of NYHA_GRADES, MMRC_GRADES or FAST_GRADES.
+    """
+    if answer is None or answer == "":
+        return -1
+    if isinstance(answer, int):
+        return answer
+    try:
+        return grades[answer]
+    except KeyError:
+        raise ValueError(f"unrecognized scale answer {answer!r}") from None
+
+
+# === RAW QUESTIONNAIRE EXPORTS ===
+# Export field holding each PPS follow-up answer, per ambulation status
+PPS_ANSWER_FIELDS = {
+    "Full": ("disease_status",),
+    "Reduced": ("unable_normal_work", "unable_hobby_care"),
+    "Mainly Sit/Lie": ("needs_assistance", "mainly_assisted"),
+    "Totally Bed Bound": ("intake",),
+}
+
+# Export field with the chosen description -> (assessment key, description -> label)
+DESCRIPTION_FIELDS = {
+    "nyha_description": ("nyha", NYHA_LABELS),
+    "mmrc_description": ("mmrc", MMRC_LABELS),
+    "fast_stage_description": ("fast_scale", FAST_LABELS),
+}
+
+
+def score_questionnaire(record):
+    """Fill ``pps``, ``nyha``, ``mmrc`` and ``fast_scale`` from raw answers.
+
+    ``record`` may carry the page's questionnaire fields (``ambulation`` and
+    its follow-ups, ``nyha_description``...) or a compact ``pps_code`` instead
+    of the scores; values already present are kept.  The record is updated in
+    place and returned.
+    """
+    pps_code = record.get("pps_code")
+    if pps_code and record.get("pps") is None:
+        try:
+            record["pps"] = PPS_BY_CODE[pps_code]
+        except KeyError:
+            raise ValueError(f"unrecognized pps_code {pps_code!r}") from None
+    ambulation = record.get("ambulation")
+    if ambulation and record.get("pps") is None:
+        fields = PPS_ANSWER_FIELDS.get(ambulation, ())
+        record["pps"] = pps_score(ambulation, *(record.get(field) for field in fields))
+    for field, (key, labels) in DESCRIPTION_FIELDS.items():
+        description = record.get(field)
+        if description and record.get(key) is None:
+            try:
+                record[key] = labels[description]
+            except KeyError:
+                raise ValueError(f"unrecognized {field} {description!r}") from None
+    return record
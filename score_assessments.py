@@ -0,0 +1,278 @@
+"""Score assessments from the command line.
+
+Reads JSONL or CSV assessments one line at a time from a file or stdin, runs
+the Recommendation logic (rules.evaluate) on each and writes one JSON decision
+record per input record.  Everything is a generator, so memory stays constant
+however large the extract is.  With ``--workers N`` the input is cut into
+chunks that a process pool scores while the main process keeps reading;
+results are written in input order.
+
+    python score_assessments.py extract.jsonl -o decisions.jsonl
+    zcat extract.csv.gz | python score_assessments.py --format csv --no-text
+    python score_assessments.py extract.jsonl --variant level_3_to_4_9 --workers 32
+    python score_assessments.py extract.jsonl --variant all --no-text
+    python score_assessments.py extract.jsonl --no-text --rule-stats rule_stats.json
+
+JSONL records use the assessment keys of rules.DEFAULTS.  CSV files use the
+same keys as headers; list fields (selected_conditions and the *_flags
+columns) are ";"-separated and empty cells count as not entered.  Raw
+questionnaire answers (``ambulation``, ``nyha_description``...) may stand in
+for the scores, see scales.score_questionnaire.  A ``patient_id`` field, when
+present, is copied to the output record.
+"""
+
+import argparse
+import csv
+import json
+import sys
+from collections import deque
+from itertools import islice
+
+import decision_cache
+import rule_stats
+import scales
+from rules import VARIANTS, evaluate, evaluate_all
+
+ID_FIELD = "patient_id"
+# --variant value that scores every variant side by side
+ALL_VARIANTS = "all"
+
+LIST_FIELDS = ("selected_conditions", "cancer_flags", "liver_flags", "dementia_flags")
+INT_FIELDS = ("pps", "cd4_count")
+FLOAT_FIELDS = ("current_weight", "weight_earlier", "inr", "albumin", "egfr")
+
+BUFFER_SIZE = 1 << 20
+CHUNK_SIZE = 5000
+STORE_BATCH = 1000  # decisions per --cache-db commit
+
+
+def _number(text, kinds):
+    # Unparseable text is kept as-is so rules.evaluate reports it for that row
+    for kind in kinds:
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+
+def from_csv_row(row):
+    """Convert one CSV row of strings into an assessment mapping."""
+    a = {}
+    for key, text in row.items():
+        if key is None or text is None or text == "":
+            continue
+        if key in LIST_FIELDS:
+            a[key] = [item for item in text.split(";") if item]
+        elif key in INT_FIELDS:
+            a[key] = _number(text, (int, float))
+        elif key in FLOAT_FIELDS:
+            a[key] = _number(text, (float,))
+        else:
+            a[key] = text
+    return a
+
+
+def read_raw(stream, fmt):
+    """Yield unparsed records: JSONL lines, or CSV rows as dicts of strings."""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield line
+
+
+PARSERS = {"jsonl": json.loads, "csv": from_csv_row}
+
+
+def decision_fields(decision, text=True):
+    fields = {"tier": decision.tier, "fired": list(decision.fired), "flags": decision.flags}
+    if text:
+        fields["reason_lines"] = list(decision.reason_lines)
+        fields["summary"] = list(decision.summary)
+    return fields
+
+
+def decision_record(assessment, decision, text=True):
+    """Output record for one ``Decision``, or for a ``{variant: Decision}`` mapping."""
+    record = {}
+    if ID_FIELD in assessment:
+        record[ID_FIELD] = assessment[ID_FIELD]
+    if isinstance(decision, dict):
+        record["decisions"] = {name: decision_fields(d, text) for name, d in decision.items()}
+    else:
+        record.update(decision_fields(decision, text))
+    return record
+
+
+def score_records(raw_records, fmt="jsonl", variant="hospice", text=True, start=1, cache=None):
+    """Yield one decision record per raw record.
+
+    A record that cannot be parsed or scored yields ``{"error": ...}`` in its
+    place so output lines stay aligned with input records.  Pass a
+    ``DecisionCache`` to reuse decisions for repeated assessments.
+    """
+    parse = PARSERS[fmt]
+    evaluate_one = cache.evaluate if cache else evaluate
+    evaluate_every = cache.evaluate_all if cache else evaluate_all
+    for number, raw in enumerate(raw_records, start):
+        a = {}
+        try:
+            a = scales.score_questionnaire(parse(raw))
+            decision = evaluate_every(a) if variant == ALL_VARIANTS else evaluate_one(a, variant)
+            yield decision_record(a, decision, text)
+        except (TypeError, ValueError, KeyError, AttributeError) as exc:
+            record = {ID_FIELD: a[ID_FIELD]} if isinstance(a, dict) and ID_FIELD in a else {}
+            record["record"] = number
+            record["error"] = str(exc)
+            yield record
+
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def encode_jsonl(records):
+    return "".join(_encode(record) + "\n" for record in records)
+
+
+def write_jsonl(records, stream):
+    write = stream.write
+    for record in records:
+        write(_encode(record))
+        write("\n")
+
+
+def make_cache(size=0, db=None, ttl=None):
+    """A ``DecisionCache`` (backed by the SQLite file ``db``, if given), or None."""
+    if not size and not db:
+        return None
+    store = decision_cache.DecisionStore(db, ttl=ttl, batch=STORE_BATCH) if db else None
+    return decision_cache.DecisionCache(size or decision_cache.MAXSIZE, store=store)
+
+
+# Per-process cache used by pool workers
+_worker_cache = None
+
+
+def _score_chunk(fmt, variant, text, start, chunk, cache_options=None, stats=False):
+    global _worker_cache
+    if cache_options and _worker_cache is None:
+        _worker_cache = make_cache(**cache_options)
+    if stats:
+        rule_stats.enable().reset()
+    block = encode_jsonl(score_records(chunk, fmt, variant, text, start, _worker_cache))
+    if _worker_cache is not None:
+        _worker_cache.flush()
+    if stats:
+        return block, rule_stats.current().to_dict()
+    return block
+
+
+def score_parallel(raw_records, fmt="jsonl", variant="hospice", text=True, workers=2, chunk_size=CHUNK_SIZE,
+                   cache_options=None, stats=None):
+    """Score chunks of ``raw_records`` in a process pool.
+
+    Yields one encoded JSONL block per chunk, in input order.  At most
+    ``2 * workers`` chunks are in flight, so memory stays bounded.  With
+    ``cache_options`` (``make_cache`` arguments) each worker keeps its own
+    ``DecisionCache``; an on-disk store is shared between them.  With a
+    ``rule_stats.RuleStats`` as ``stats``, workers record rule statistics
+    per chunk and they are merged into it.
+    """
+    # Imported here: process pools are costly to import and serial runs never need one
+    from concurrent.futures import ProcessPoolExecutor
+
+    raw_records = iter(raw_records)
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        start = 1
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(islice(raw_records, chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.submit(_score_chunk, fmt, variant, text, start, chunk, cache_options,
+                                           stats is not None))
+                start += len(chunk)
+            if not pending:
+                return
+            result = pending.popleft().result()
+            if stats is not None:
+                result, snapshot = result
+                stats.merge(snapshot)
+            yield result
+
+
+def _guess_format(path):
+    return "csv" if path.lower().endswith((".csv", ".csv.gz")) else "jsonl"
+
+
+def _open(path, mode):
+    if path == "-":
+        return sys.stdin if "r" in mode else sys.stdout
+    if path.endswith(".gz"):
+        import gzip
+
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="", buffering=BUFFER_SIZE)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score hospice eligibility assessments.")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL or CSV file, '-' for stdin (default)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file, '-' for stdout (default)")
+    parser.add_argument("--format", choices=sorted(PARSERS), help="input format (default: from the file name, else jsonl)")
+    parser.add_argument("--variant", choices=[*VARIANTS, ALL_VARIANTS], default="hospice",
+                        help=f"rule variant, or '{ALL_VARIANTS}' to score every variant in one pass (default: hospice)")
+    parser.add_argument("--workers", type=int, default=1, help="scoring processes (default: 1)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="records per worker task")
+    parser.add_argument("--cache-size", type=int, default=0,
+                        help="memoize up to this many decisions per process (default: off); "
+                             "cache statistics go to stderr")
+    parser.add_argument("--cache-db", metavar="PATH",
+                        help="also keep decisions in this SQLite file, shared across runs and processes")
+    parser.add_argument("--cache-ttl", type=float, metavar="SECONDS",
+                        help="ignore --cache-db decisions older than this (default: no expiry)")
+    parser.add_argument("--no-text", dest="text", action="store_false",
+                        help="omit reason_lines and summary from the output")
+    parser.add_argument("--rule-stats", metavar="PATH",
+                        help="write per-rule timings, fire counts and tiers to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fmt = args.format or _guess_format(args.input)
+    source = _open(args.input, "r")
+    sink = _open(args.output, "w")
+    raw_records = read_raw(source, fmt)
+    cache_options = {"size": args.cache_size, "db": args.cache_db, "ttl": args.cache_ttl}
+    cache = make_cache(**cache_options) if args.workers <= 1 else None
+    stats = None
+    if args.rule_stats:
+        stats = rule_stats.RuleStats() if args.workers > 1 else rule_stats.enable()
+    try:
+        if args.workers > 1:
+            blocks = score_parallel(raw_records, fmt, args.variant, args.text, args.workers, args.chunk_size,
+                                    cache_options, stats)
+            for block in blocks:
+                sink.write(block)
+        else:
+            write_jsonl(score_records(raw_records, fmt, args.variant, args.text, cache=cache), sink)
+        if cache is not None:
+            cache.flush()
+            print(f"decision cache: {json.dumps(cache.stats())}", file=sys.stderr)
+        if stats is not None:
+            stats.dump(args.rule_stats)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+        else:
+            sink.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""Local HTTP scoring service for the hospice and Level 3 -> 4 rules.
+
+    python service.py --port 8765
+
+Endpoints:
+
+    POST /score[?variant=hospice][&text=1]
+        Body is one assessment (a JSON object, same keys as score_assessments.py
+        input) and the response is one decision; or a JSON list, or
+        {"assessments": [...]}, and the response is a list of decisions.
+        ``text=1`` adds reason_lines and summary.  An assessment that cannot
+        be read (a lab that is not a number, say) gets a 400 response, or
+        {"error": ...} in its place in a list; any other failure is a 500.
+    GET /health
+        Status, micro-batch counters and the live ruleset version.
+    GET /metrics
+        Request and batch counters, plus the per-rule timings, fire counts
+        and tiers of rule_stats.py when started with --rule-stats (or
+        RULE_STATS=1), in the Prometheus text format.
+
+Concurrent single requests are queued and scored together: the batcher takes
+whatever has arrived within --max-delay-ms (up to --max-batch requests) and
+runs it through the vectorized cohort scorer in one call.  Requests that ask
+for text are scored one by one with rules.evaluate, since the wording is built
+per record anyway.  Only the standard library is needed; NumPy, when
+installed, enables the vectorized path.
+
+The rule thresholds file (thresholds.json, or RULE_THRESHOLDS) is checked
+for changes every --reload-interval seconds and reloaded in the background:
+requests keep being scored with the old cutoffs until the new ones are
+compiled, and each batch is scored under one ruleset.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import rule_stats
+import rules
+import scales
+from score_assessments import decision_fields
+
+try:
+    import cohort
+except ImportError:  # NumPy not installed: micro-batches are scored row by row
+    cohort = None
+
+MAX_BATCH = 256
+MAX_DELAY = 0.002
+RELOAD_INTERVAL = 2.0
+
+
+class RequestError(Exception):
+    """A request the service rejects with 400 Bad Request."""
+
+
+# Numeric assessment fields: labs (None = not entered) and weights (default 0)
+LAB_FIELDS = ("cd4_count", "inr", "albumin", "egfr")
+WEIGHT_FIELDS = ("current_weight", "weight_earlier")
+
+
+def score_each(rows, variant):
+    """``score_features`` that scores row by row if the batch fails.
+
+    Returns one decision, or the exception it raised, per row, so a row the
+    vectorized scorer cannot take only fails itself.
+    """
+    try:
+        return score_features(rows, variant)
+    except Exception:
+        if len(rows) == 1:
+            raise
+    results = []
+    for f in rows:
+        try:
+            results.append(score_features([f], variant)[0])
+        except Exception as exc:
+            results.append(exc)
+    return results
+
+
+def score_features(rows, variant):
+    """Decision fields (without text) for a list of ``rules.features`` results."""
+    variant = rules.get_variant(variant)
+    if cohort is None:
+        return [decision_fields(rules.decide(f, variant), text=False) for f in rows]
+    out = cohort.score_cohort(cohort.columns_from_features(rows), variant)
+    fired = zip(*(out[c].tolist() for c in rules.CONDITION_IDS))
+    return [
+        {
+            "tier": rules.TIERS[tier],
+            "fired": [c for c, hit in zip(rules.CONDITION_IDS, hits) if hit],
+            "flags": flags,
+        }
+        for tier, hits, flags in zip(out["tier"].tolist(), fired, out["flags"].tolist())
+    ]
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-record requests into vectorized batches."""
+
+    def __init__(self, max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.records = 0
+
+    async def score(self, features, variant):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((features, variant, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self._score(batch)
+
+    def _score(self, batch):
+        self.batches += 1
+        self.records += len(batch)
+        by_variant = {}
+        for item in batch:
+            by_variant.setdefault(item[1], []).append(item)
+        for variant, items in by_variant.items():
+            try:
+                results = score_each([features for features, _, _ in items], variant)
+            except Exception as exc:  # keep the batcher alive; fail this request only
+                results = [exc]
+            for (_, _, future), result in zip(items, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+def _batch_body(body):
+    if isinstance(body, list):
+        return body
+    if isinstance(body, dict) and isinstance(body.get("assessments"), list):
+        return body["assessments"]
+    return None
+
+
+def _number(key, value, default):
+    if value is None or value == "":
+        return default
+    if isinstance(value, bool):
+        raise RequestError(f"{key} must be a number")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise RequestError(f"{key} must be a number, not {value!r}") from None
+    if not math.isfinite(number):
+        raise RequestError(f"{key} must be a finite number")
+    return number
+
+
+def _coerce_numbers(assessment):
+    """Numeric fields as floats (numeric strings accepted); RequestError if one is not a number."""
+    for key in LAB_FIELDS:
+        if key in assessment:
+            assessment[key] = _number(key, assessment[key], None)
+    if assessment.get("cd4_count") is not None and assessment["cd4_count"].is_integer():
+        assessment["cd4_count"] = int(assessment["cd4_count"])  # a count, as the pages enter it
+    for key in WEIGHT_FIELDS:
+        if key in assessment:
+            assessment[key] = _number(key, assessment[key], 0.0)
+    # EF is a text input on the pages: kept as given, but it must read as a number
+    if "ef" in assessment:
+        _number("ef", assessment["ef"], None)
+    return assessment
+
+
+def _features(assessment):
+    if not isinstance(assessment, dict):
+        raise RequestError("an assessment must be a JSON object")
+    try:
+        return rules.features(_coerce_numbers(scales.score_questionnaire(dict(assessment))))
+    except (TypeError, ValueError, KeyError) as exc:
+        raise RequestError(str(exc)) from None
+
+
+class ScoringService:
+    def __init__(self, max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+        self.batcher = MicroBatcher(max_batch, max_delay)
+        self.requests = 0
+
+    def metrics(self):
+        """Prometheus text exposition of the service counters and rule_stats."""
+        lines = []
+        for name, help_text, value in (
+            ("requests", "Scoring requests served.", self.requests),
+            ("batches", "Micro-batches scored.", self.batcher.batches),
+            ("batched_records", "Records scored through micro-batches.", self.batcher.records),
+        ):
+            name = f"{rule_stats.PREFIX}_service_{name}_total"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {value}"]
+        stats = rule_stats.current()
+        return "".join(line + "\n" for line in lines) + (stats.prometheus() if stats else "")
+
+    async def score(self, query, body):
+        variant = query.get("variant", ["hospice"])[0]
+        try:
+            rules.get_variant(variant)
+        except ValueError as exc:
+            raise RequestError(str(exc)) from None
+        text = query.get("text", ["0"])[0].lower() in ("1", "true", "yes")
+
+        records = _batch_body(body)
+        if records is None:
+            f = _features(body)
+            if text:
+                return decision_fields(rules.decide(f, rules.get_variant(variant)))
+            return await self.batcher.score(f, variant)
+
+        results, good = [None] * len(records), []
+        for i, assessment in enumerate(records):
+            try:
+                good.append((i, _features(assessment)))
+            except RequestError as exc:
+                results[i] = {"error": str(exc)}
+        if text:
+            for i, f in good:
+                try:
+                    results[i] = decision_fields(rules.decide(f, rules.get_variant(variant)))
+                except Exception as exc:
+                    results[i] = {"error": f"could not score: {exc}"}
+        elif good:
+            for (i, _), result in zip(good, score_each([f for _, f in good], variant)):
+                results[i] = {"error": f"could not score: {result}"} if isinstance(result, Exception) else result
+        return results
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        if url.path == "/health" and method == "GET":
+            return HTTPStatus.OK, {
+                "status": "ok",
+                "batches": self.batcher.batches,
+                "records": self.batcher.records,
+                "rules": rules.current().version,
+            }
+        if url.path == "/metrics" and method == "GET":
+            return HTTPStatus.OK, self.metrics()
+        if url.path == "/score":
+            if method != "POST":
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "use POST"}
+            self.requests += 1
+            try:
+                payload = json.loads(body or b"null")
+            except ValueError as exc:
+                return HTTPStatus.BAD_REQUEST, {"error": f"invalid JSON: {exc}"}
+            try:
+                return HTTPStatus.OK, await self.score(query, payload)
+            except RequestError as exc:
+                return HTTPStatus.BAD_REQUEST, {"error": str(exc)}
+            except Exception as exc:  # answer rather than drop the connection
+                return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"could not score: {exc}"}
+        return HTTPStatus.NOT_FOUND, {"error": f"no route for {method} {url.path}"}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST, {"error": "malformed request line"}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length") or 0)
+                    if length < 0:
+                        raise ValueError
+                except ValueError:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST, {"error": "invalid Content-Length"}, False)
+                    break
+                body = await reader.readexactly(length)
+                status, payload = await self.dispatch(method, target, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        if isinstance(payload, str):  # /metrics
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(host="127.0.0.1", port=8765, max_batch=MAX_BATCH, max_delay=MAX_DELAY, ready=None):
+    service = ScoringService(max_batch, max_delay)
+    batcher = asyncio.create_task(service.batcher.run())
+    server = await asyncio.start_server(service.handle, host, port)
+    if ready is not None:
+        ready(server)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batcher.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the scoring rules over HTTP on localhost.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="most single requests scored together")
+    parser.add_argument("--max-delay-ms", type=float, default=MAX_DELAY * 1000,
+                        help="longest a single request waits for others to batch with")
+    parser.add_argument("--rule-stats", action="store_true",
+                        help="record per-rule timings and fire counts for GET /metrics (also RULE_STATS=1)")
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL,
+                        help=f"seconds between checks of the thresholds file for changes, 0 to never reload "
+                             f"(default: {RELOAD_INTERVAL:g})")
+    args = parser.parse_args(argv)
+    if args.rule_stats:
+        rule_stats.enable()
+    else:
+        rule_stats.enable_from_env()
+    if args.reload_interval > 0:
+        rules.watch(args.reload_interval)
+
+    def ready(server):
+        print(f"scoring service listening on http://{args.host}:{server.sockets[0].getsockname()[1]}", flush=True)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.max_batch, args.max_delay_ms / 1000, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
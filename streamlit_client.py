@@ -0,0 +1,121 @@
+"""Minimal headless client for a running Streamlit server.
+
+Speaks the same websocket protocol as the browser, so benchmarks and load
+tests can open real sessions against ``streamlit run``:
+
+    session = await Session.open("http://127.0.0.1:8501", page="level_3_to_4_9")
+    await session.run()                                   # first render
+    await session.run({"Select applicable conditions:": ["HIV"]})
+    await session.close()
+
+Widgets are addressed by label, as in bench_pages.py.  Needs the
+``websockets`` package that Streamlit's server installs.
+"""
+
+import time
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+# Widget element type -> (WidgetState field, value converter)
+_VALUE_FIELDS = {
+    "multiselect": ("string_array_value", lambda value: {"data": [str(v) for v in value]}),
+    "selectbox": ("string_value", str),
+    "radio": ("string_value", str),
+    "text_input": ("string_value", str),
+    "number_input": ("double_value", float),
+    "slider": ("double_array_value", lambda value: {"data": [float(value)]}),
+    "checkbox": ("bool_value", bool),
+    "toggle": ("bool_value", bool),
+    "button": ("trigger_value", bool),
+}
+
+
+class ScriptError(RuntimeError):
+    """The page raised while the server ran it."""
+
+
+class Session:
+    """One browser-like session: a websocket plus the widget state it reports."""
+
+    def __init__(self, ws, page="", query_string=""):
+        self.ws = ws
+        self.page = page
+        self.query_string = query_string
+        self.widgets = {}  # label -> (widget id, element type)
+        self.states = {}  # widget id -> WidgetState
+        self.session_id = None
+        self.page_script_hash = ""
+
+    @classmethod
+    async def open(cls, base_url, page="", query_string=""):
+        url = base_url.replace("http://", "ws://").rstrip("/") + "/_stcore/stream"
+        ws = await websockets.connect(url, subprotocols=["streamlit"], max_size=None)
+        return cls(ws, page, query_string)
+
+    async def close(self):
+        await self.ws.close()
+
+    def _set(self, label, value):
+        try:
+            widget_id, kind = self.widgets[label]
+        except KeyError:
+            raise LookupError(f"no widget labelled {label!r} on the page") from None
+        field, convert = _VALUE_FIELDS[kind]
+        state = WidgetState(id=widget_id)
+        converted = convert(value)
+        if isinstance(converted, dict):
+            getattr(state, field).data.extend(converted["data"])
+        else:
+            setattr(state, field, converted)
+        self.states[widget_id] = state
+
+    async def run(self, changes=None):
+        """Rerun the page with ``{label: value}`` changes; returns ``(seconds, elements)``.
+
+        Buttons (including form submit buttons) take ``True`` and only fire
+        for this rerun, like a click.
+        """
+        triggers = []
+        for label, value in (changes or {}).items():
+            self._set(label, value)
+            if self.widgets[label][1] == "button":
+                triggers.append(self.widgets[label][0])
+        message = BackMsg()
+        rerun = message.rerun_script
+        rerun.query_string = self.query_string
+        rerun.page_name = self.page
+        rerun.page_script_hash = self.page_script_hash
+        rerun.widget_states.widgets.extend(self.states.values())
+        for widget_id in triggers:
+            del self.states[widget_id]
+
+        started = time.perf_counter()
+        await self.ws.send(message.SerializeToString())
+        elements, exception = 0, None
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.ws.recv())
+            kind = forward.WhichOneof("type")
+            if kind == "new_session":
+                self.session_id = forward.new_session.initialize.session_id or self.session_id
+                self.page_script_hash = self.page_script_hash or forward.new_session.page_script_hash
+            elif kind == "navigation":
+                # With st.navigation the page that ran is reported here; the
+                # hash in new_session is the entry script's
+                self.page_script_hash = forward.navigation.page_script_hash
+            elif kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                element_type = element.WhichOneof("type")
+                elements += 1
+                if element_type == "exception":
+                    exception = element.exception.message
+                elif element_type in _VALUE_FIELDS:
+                    widget = getattr(element, element_type)
+                    self.widgets[widget.label] = (widget.id, element_type)
+            elif kind == "script_finished":
+                if exception is not None:
+                    raise ScriptError(exception)
+                return time.perf_counter() - started, elements
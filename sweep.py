@@ -0,0 +1,283 @@
+"""Tier changes across a grid of rule cutoffs.
+
+    python sweep.py cohort.parquet --grid albumin_flag=2.5,3.0 --grid orange_flags=3:5
+    python sweep.py --synthetic 1M --variant all --grid pps_poor=30:50:10 -o sweep.csv
+
+Each ``--grid NAME=VALUES`` names a ``rules.Thresholds`` field and the values
+to try, as a list (``2.5,3.0``) or an inclusive range (``30:50:10``, step 1
+if left out).  Every combination of the grid is scored in one broadcast pass
+of ``cohort.score_grid`` per block of rows, against the cutoffs of the live
+ruleset, and the output has one CSV row per variant and grid point:
+
+    patients              rows scored
+    changed               rows whose tier differs from the current cutoffs
+    escalated             ... towards red
+    deescalated           ... towards green
+    red, orange, blue,
+    green                 rows per tier at this grid point
+
+Cutoffs not in the grid keep their current values.  The input is a cohort
+file read by ``arrow_io.py`` (the ``cohort.score_cohort`` columns) or, with
+--synthetic, a ``synthetic.py`` cohort.  Rows are scored in blocks of at
+most --max-cells rows times grid points, which bounds memory use whatever
+the size of the grid.
+
+``--check ROWS`` first scores ROWS synthetic rows, with labs moved onto and
+around the grid's cutoffs, at every grid point with ``rules.evaluate``'s
+per-record rules and exits with status 1 if the broadcast pass disagrees:
+
+    python sweep.py --synthetic 1M --grid inr_elevated=1.6:1.8:0.1 --grid albumin_flag=2.6,2.8 --check 2000
+"""
+
+import argparse
+import csv
+import dataclasses
+import sys
+import time
+
+import numpy as np
+
+import cohort
+import records
+import rules
+import synthetic
+
+MAX_CELLS = 1 << 22
+OUTPUTS = ("patients", "changed", "escalated", "deescalated", *rules.TIERS)
+
+# Cutoffs that can change a tier; albumin_summary only words the summary
+GRID_THRESHOLDS = tuple(f.name for f in dataclasses.fields(rules.Thresholds) if f.name != "albumin_summary")
+
+# Packed column each lab cutoff is compared with, and the step to its neighbours
+_LAB_COLUMNS = {
+    "albumin_decline": ("albumin", 0.1),
+    "albumin_liver": ("albumin", 0.1),
+    "albumin_flag": ("albumin", 0.1),
+    "inr_liver": ("inr", 0.1),
+    "inr_elevated": ("inr", 0.1),
+    "ef": ("ef", 0.1),
+    "egfr": ("egfr", 0.1),
+    "cd4": ("cd4_count", 1),  # whole cells on the pages
+}
+
+
+def _number(text):
+    value = float(text)
+    return int(value) if value.is_integer() and "." not in text else value
+
+
+def parse_values(text):
+    """``"2.5,3.0"`` or an inclusive ``"start:stop[:step]"`` range as a tuple of numbers."""
+    if ":" in text:
+        start, stop, *step = map(_number, text.split(":"))
+        step = step[0] if step else 1
+        if step <= 0:
+            raise ValueError(f"range {text!r} needs a positive step")
+        count = int(round((stop - start) / step)) + 1
+        if count < 1:
+            raise ValueError(f"range {text!r} is empty")
+        return tuple(_number(f"{start + i * step:.10g}") for i in range(count))
+    return tuple(_number(value) for value in text.split(",") if value.strip())
+
+
+def parse_grid(specs):
+    """``{threshold name: values}`` from ``NAME=VALUES`` strings, in order."""
+    grid = {}
+    for spec in specs:
+        name, sep, values = spec.partition("=")
+        name = name.strip()
+        if not sep or name not in GRID_THRESHOLDS:
+            raise ValueError(f"{spec!r}: expected NAME=VALUES with NAME one of {', '.join(GRID_THRESHOLDS)}")
+        if name in grid:
+            raise ValueError(f"{name} is given twice")
+        grid[name] = parse_values(values)
+        if not grid[name]:
+            raise ValueError(f"{name} has no values")
+    return grid
+
+
+def grid_thresholds(base, grid):
+    """``base`` with each grid cutoff replaced by its values along its own axis.
+
+    The arrays have one more trailing axis of length 1 for the rows, as
+    ``cohort.score_grid`` expects.
+    """
+    ndim = len(grid) + 1
+    swept = {}
+    for axis, (name, values) in enumerate(grid.items()):
+        shape = [1] * ndim
+        shape[axis] = len(values)
+        swept[name] = np.asarray(values).reshape(shape)
+    return dataclasses.replace(base, **swept)
+
+
+def _block(table, start, stop):
+    return {name: np.asarray(column)[start:stop] for name, column in table.items()}
+
+
+def sweep(tables, grid, variants=("hospice",), ruleset=None, max_cells=MAX_CELLS):
+    """Tier transitions at every point of ``grid``, per variant.
+
+    ``tables`` is an iterable of cohort column tables (one for an in-memory
+    cohort, or one per batch of a file).  Returns ``{variant name: counts}``
+    where ``counts[i, j, ..., new, current]`` is the number of rows in tier
+    ``current`` under the live cutoffs and tier ``new`` at grid point
+    ``(i, j, ...)``; tiers are indexes into ``rules.TIERS``.
+    """
+    ruleset = ruleset or rules.current()
+    variants = [rules.get_variant(v) for v in variants]
+    shape = tuple(len(values) for values in grid.values())
+    points = int(np.prod(shape))
+    tiers = len(rules.TIERS)
+    cells = tiers * tiers
+    offsets = np.arange(points, dtype=np.intp)[:, None] * cells
+    block_rows = max(1, max_cells // points)
+    counts = {v.name: np.zeros(points * cells, dtype=np.int64) for v in variants}
+    for table in tables:
+        n = len(table["pps"])
+        for start in range(0, n, block_rows):
+            block = _block(table, start, min(n, start + block_rows))
+            for v in variants:
+                t = ruleset.thresholds_for(v)
+                current = cohort.score_grid(block, v, t)
+                new = cohort.score_grid(block, v, grid_thresholds(t, grid)).reshape(points, -1)
+                counts[v.name] += np.bincount((offsets + new * tiers + current).ravel(), minlength=points * cells)
+    return {name: found.reshape(*shape, tiers, tiers) for name, found in counts.items()}
+
+
+def summary_rows(grid, counts):
+    """One dict per variant and grid point, with the grid values and OUTPUTS."""
+    names = list(grid)
+    for variant, found in counts.items():
+        for point in np.ndindex(*found.shape[:-2]):
+            matrix = found[point]
+            row = {"variant": variant}
+            row.update({name: grid[name][i] for name, i in zip(names, point)})
+            row["patients"] = int(matrix.sum())
+            # matrix[new, current]: a lower tier code is nearer red
+            row["changed"] = row["patients"] - int(np.trace(matrix))
+            row["escalated"] = int(np.triu(matrix, 1).sum())
+            row["deescalated"] = int(np.tril(matrix, -1).sum())
+            row.update({tier: int(total) for tier, total in zip(rules.TIERS, matrix.sum(axis=1))})
+            yield row
+
+
+def check_cohort(n, grid, seed=0):
+    """``n`` packed synthetic rows, half of them with each swept lab on or next to a grid value."""
+    rng = np.random.default_rng(seed)
+    packed = synthetic.packed_cohort(n, seed)
+    for name, values in grid.items():
+        if name in _LAB_COLUMNS:
+            column, step = _LAB_COLUMNS[name]
+            near = [round(value + d, 6) for value in values for d in (-step, 0, step)]
+            rows = rng.random(n) < 0.5
+            packed[column][rows] = rng.choice(near, rows.sum())
+        elif name == "weight_loss":
+            near = [round(value + d, 6) for value in values for d in (-0.1, 0, 0.1)]
+            rows = rng.random(n) < 0.5
+            packed["weight_earlier"][rows] = 100.0
+            packed["current_weight"][rows] = 100.0 - rng.choice(near, rows.sum())
+    return packed
+
+
+def check(packed, grid, variants=("hospice",), ruleset=None):
+    """Grid points and rows where ``cohort.score_grid`` disagrees with the per-record rules.
+
+    Each grid point is compiled with ``rules.compile_variant`` and applied to
+    ``records.unpack`` of every row.  Returns ``{variant name: [(grid
+    index, row), ...]}``.
+    """
+    ruleset = ruleset or rules.current()
+    table = records.cohort_table(packed)
+    features = [rules.features(records.unpack(row)) for row in packed]
+    mismatches = {}
+    for v in map(rules.get_variant, variants):
+        t = ruleset.thresholds_for(v)
+        tiers = cohort.score_grid(table, v, grid_thresholds(t, grid))
+        found = mismatches[v.name] = []
+        for point in np.ndindex(*tiers.shape[:-1]):
+            cutoffs = {name: grid[name][i] for name, i in zip(grid, point)}
+            evaluator = rules.compile_variant(v, dataclasses.replace(t, **cutoffs))
+            for row, f in enumerate(features):
+                if rules.TIERS[tiers[point][row]] != evaluator.decide(f).tier:
+                    found.append((point, row))
+    return mismatches
+
+
+def _file_tables(path, batch_size):
+    import arrow_io
+
+    for batch in arrow_io.read_batches(path, batch_size):
+        yield arrow_io.columns(batch)
+
+
+def _synthetic_tables(n, seed):
+    for chunk in synthetic.packed_chunks(n, seed):
+        yield records.cohort_table(chunk)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", nargs="?", help="cohort file (.parquet, or Arrow IPC)")
+    parser.add_argument("--synthetic", metavar="ROWS", help="sweep a synthetic cohort of ROWS rows (e.g. 1M) instead")
+    parser.add_argument("--seed", type=int, default=0, help="seed for --synthetic (default: 0)")
+    parser.add_argument("--grid", metavar="NAME=VALUES", action="append", required=True,
+                        help="a threshold and the values to try, e.g. orange_flags=3:5 (repeatable)")
+    parser.add_argument("--variant", choices=[*rules.VARIANTS, "all"], default="hospice",
+                        help="rule variant, or 'all' (default: hospice)")
+    parser.add_argument("--max-cells", type=int, default=MAX_CELLS,
+                        help=f"rows times grid points scored at once (default: {MAX_CELLS})")
+    parser.add_argument("--batch-size", type=int, default=1 << 16, help="rows per batch read from INPUT")
+    parser.add_argument("-o", "--output", help="CSV file (default: stdout)")
+    parser.add_argument("--check", metavar="ROWS", type=int,
+                        help="first compare ROWS synthetic rows at every grid point with the per-record rules")
+    args = parser.parse_args(argv)
+
+    if bool(args.input) == bool(args.synthetic):
+        parser.error("give a cohort file or --synthetic ROWS")
+    try:
+        grid = parse_grid(args.grid)
+    except ValueError as exc:
+        parser.error(str(exc))
+    variants = list(rules.VARIANTS) if args.variant == "all" else [args.variant]
+    ruleset = rules.current()
+
+    if args.check:
+        mismatches = check(check_cohort(args.check, grid, args.seed), grid, variants, ruleset)
+        for name, found in mismatches.items():
+            print(f"{name}: {len(found):,} grid point rows disagree with rules.evaluate"
+                  f"{f' (first: {found[:5]})' if found else ''}", file=sys.stderr)
+        if any(mismatches.values()):
+            sys.exit(1)
+
+    if args.synthetic:
+        import bench_rules
+
+        tables = _synthetic_tables(bench_rules.parse_size(args.synthetic), args.seed)
+    else:
+        tables = _file_tables(args.input, args.batch_size)
+
+    started = time.perf_counter()
+    counts = sweep(tables, grid, variants, ruleset, args.max_cells)
+    seconds = time.perf_counter() - started
+
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        writer = csv.DictWriter(out, ["variant", *grid, *OUTPUTS])
+        writer.writeheader()
+        writer.writerows(summary_rows(grid, counts))
+    finally:
+        if args.output:
+            out.close()
+
+    points = int(np.prod([len(values) for values in grid.values()]))
+    rows = int(next(iter(counts.values()))[(0,) * len(grid)].sum())
+    for name in counts:
+        t = ruleset.thresholds_for(name)
+        print(f"{name}: current " + ", ".join(f"{key}={getattr(t, key):g}" for key in grid), file=sys.stderr)
+    print(f"swept {rows:,} rows x {points:,} grid points x {len(counts)} variants in {seconds:.2f}s "
+          f"(ruleset {ruleset.version})", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
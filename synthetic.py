@@ -0,0 +1,142 @@
+"""Seeded synthetic patient cohorts for benchmarks and load tests.
+
+    packed = synthetic.packed_cohort(1_000_000, seed=7)   # records.ASSESSMENT_DTYPE
+    for assessment in synthetic.assessments(1000, seed=7):
+        rules.evaluate(assessment)
+
+Rows are drawn column-wise with NumPy, so ten million take seconds.  Every
+condition in ``rules.CONDITIONS`` appears, alone or with others, and the
+condition-specific answers follow it the way they do on the pages: NYHA and
+EF are filled for heart failure, mMRC and oxygen for pulmonary disease,
+dialysis for CKD, FAST for dementia, CD4 for HIV, and complications only for
+their condition.  Labs are sometimes missing, PPS leans towards the
+30-60% range seen at referral, and about a third of patients have lost 10% or
+more of their weight.  ``assessments`` yields the same rows as mappings.
+"""
+
+import numpy as np
+
+import records
+import rules
+
+# Share of patients with each condition (independent draws)
+PREVALENCE = {
+    rules.HF: 0.30,
+    rules.PULMONARY: 0.25,
+    rules.CKD: 0.20,
+    rules.CANCER: 0.30,
+    rules.LIVER: 0.12,
+    rules.DEMENTIA: 0.25,
+    rules.HIV: 0.05,
+}
+
+PPS_WEIGHTS = {10: 2, 20: 4, 30: 9, 40: 14, 50: 16, 60: 14, 70: 12, 80: 10, 90: 8, 100: 6}
+COMPLICATION_RATE = 0.2
+
+CHUNK = 1_000_000
+
+
+def _present(rng, n, share):
+    return rng.random(n) < share
+
+
+def _lab(rng, n, mean, sd, low, high):
+    return np.round(np.clip(rng.normal(mean, sd, n), low, high), 1)
+
+
+def _grades(rng, n, first, weights):
+    weights = np.asarray(weights, dtype=float)
+    return first + rng.choice(len(weights), n, p=weights / weights.sum())
+
+
+def _chunk(rng, n):
+    out = np.zeros(n, dtype=records.ASSESSMENT_DTYPE)
+    has = {condition: _present(rng, n, share) for condition, share in PREVALENCE.items()}
+    conditions = np.zeros(n, dtype=np.uint8)
+    for condition, rows in has.items():
+        conditions |= np.where(rows, rules.CONDITION_BITS[condition], 0).astype(np.uint8)
+    out["conditions"] = conditions
+
+    for key, condition in (("cancer_flags", rules.CANCER), ("liver_flags", rules.LIVER),
+                           ("dementia_flags", rules.DEMENTIA)):
+        mask = np.zeros(n, dtype=np.uint8)
+        for bit in records.COMPLICATION_BITS[key].values():
+            mask |= np.where(has[condition] & _present(rng, n, COMPLICATION_RATE), bit, 0).astype(np.uint8)
+        out[key] = mask
+
+    yes, no = records.ANSWER_CODES["Yes"], records.ANSWER_CODES["No"]
+    out["oxygen_dependent"] = np.where(has[rules.PULMONARY], np.where(_present(rng, n, 0.5), yes, no), 0)
+    out["on_dialysis"] = np.where(has[rules.CKD], np.where(_present(rng, n, 0.3), yes, no), 0)
+
+    pps = np.fromiter(PPS_WEIGHTS, dtype=np.int8)
+    weights = np.fromiter(PPS_WEIGHTS.values(), dtype=float)
+    out["pps"] = rng.choice(pps, n, p=weights / weights.sum())
+    out["nyha"] = np.where(has[rules.HF], _grades(rng, n, 1, [1, 3, 4, 3]), -1)
+    out["mmrc"] = np.where(has[rules.PULMONARY], _grades(rng, n, 0, [1, 2, 3, 3, 2]), -1)
+    out["fast_scale"] = np.where(has[rules.DEMENTIA], _grades(rng, n, 1, [1, 1, 2, 3, 3, 4, 3]), -1)
+
+    out["ef"] = np.where(has[rules.HF] & _present(rng, n, 0.9), np.round(rng.uniform(10, 60, n)), np.nan)
+    out["cd4_count"] = np.where(has[rules.HIV], np.round(np.clip(rng.lognormal(5.0, 1.0, n), 0, 1500)), np.nan)
+    out["inr"] = np.where(
+        has[rules.LIVER], _lab(rng, n, 2.0, 0.6, 0.8, 5.0),
+        np.where(_present(rng, n, 0.4), _lab(rng, n, 1.1, 0.2, 0.8, 3.0), np.nan),
+    )
+    out["albumin"] = np.where(_present(rng, n, 0.8), _lab(rng, n, 3.2, 0.6, 1.0, 5.0), np.nan)
+    out["egfr"] = np.where(
+        has[rules.CKD], _lab(rng, n, 18, 9, 2, 59),
+        np.where(_present(rng, n, 0.7), _lab(rng, n, 65, 20, 10, 120), np.nan),
+    )
+
+    earlier = np.round(rng.uniform(45, 110, n), 1)
+    loss = np.clip(rng.normal(0.06, 0.07, n), -0.05, 0.4)
+    out["weight_earlier"] = earlier
+    out["current_weight"] = np.round(earlier * (1 - loss), 1)
+    return out
+
+
+def packed_cohort(n, seed=0):
+    """``n`` synthetic assessments as a ``records.ASSESSMENT_DTYPE`` array.
+
+    The same ``(n, seed)`` always gives the same rows.
+    """
+    out = np.empty(n, dtype=records.ASSESSMENT_DTYPE)
+    start = 0
+    for chunk in packed_chunks(n, seed):
+        out[start:start + len(chunk)] = chunk
+        start += len(chunk)
+    return out
+
+
+def packed_chunks(n, seed=0):
+    """Yield ``packed_cohort(n, seed)`` in arrays of at most CHUNK rows."""
+    rng = np.random.default_rng(seed)
+    for start in range(0, n, CHUNK):
+        yield _chunk(rng, min(n, start + CHUNK) - start)
+
+
+def outcomes(table, seed=0):
+    """A simulated "died within 6 months" flag for each row of a cohort table.
+
+    The risk rises as PPS falls and with low albumin, weight loss, HF at
+    NYHA IV and cancer, so backtests have a signal to find; it is not a
+    clinical model.
+    """
+    rng = np.random.default_rng(seed)
+    pps = np.asarray(table["pps"], dtype=float)
+    albumin = np.asarray(table["albumin"], dtype=float)
+    earlier = np.asarray(table["weight_earlier"], dtype=float)
+    lost = np.divide(earlier - table["current_weight"], earlier, out=np.zeros(len(pps)), where=earlier > 0)
+    score = (
+        -1.0
+        - 0.05 * (pps - 50)
+        + 0.8 * np.nan_to_num(3.2 - albumin).clip(0)
+        + 4.0 * lost.clip(0)
+        + 0.7 * (np.asarray(table["nyha"]) == 4)
+        + 0.5 * np.asarray(table["has_cancer"])
+    )
+    return rng.random(len(pps)) < 1 / (1 + np.exp(-score))
+
+
+def assessments(n, seed=0):
+    """Yield the rows of ``packed_cohort(n, seed)`` as assessment mappings."""
+    return map(records.unpack, packed_cohort(n, seed))
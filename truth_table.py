@@ -0,0 +1,504 @@
+"""Truth-table backend for cohort scoring.
+
+Apart from the labs, EF, CD4 and weight loss, every input to a decision is a
+small categorical value, and the numbers only matter through the rule
+thresholds they fall between.  This backend precomputes the decision for
+every combination of those buckets with ``rules.evaluate`` and scores a
+cohort by looking each row up, with the same inputs and outputs as
+``cohort.score_cohort``:
+
+    result = truth_table.score_cohort(records.cohort_table(packed), "hospice")
+    result = truth_table.score_packed(packed, "hospice")   # no column table needed
+
+One table over all the buckets would have ~85 million keys per variant, so
+the space is split in two.  The force_transition conditions fall into two
+groups that share no input:
+
+    A  PPS decline, cancer, liver, HIV    PPS {<=40, <=50, <=70, >70},
+       weight loss {<10%, >=10%}, albumin {missing, 0, <2.5, 2.5,
+       <3.0, 3.0, >3.0}, INR {<1.5, 1.5, >1.5}, CD4 {<=200, other},
+       the cancer, liver and HIV conditions and whether their
+       complications are set
+    B  heart failure, pulmonary, CKD,     NYHA IV, EF <= 20, mMRC {other, 3,
+       dementia                           4}, oxygen, dialysis, eGFR {<=15
+                                          or missing, >15}, FAST {other, 6, 7},
+                                          the four conditions and dementia
+                                          complications
+
+and so do the fallback flags, apart from "any condition selected".  The
+buckets shown are those of the shipped thresholds.json: ``layout`` derives
+them from the cutoffs of every variant of a ruleset, and the tables are
+built per ruleset version, so a ``rules.reload`` builds the tables in use
+again (in the reloading thread, before the new cutoffs go live).  With the
+shipped cutoffs group A has 10,752 keys and group B 9,216.  A row's
+decision is the union of the conditions fired in its A and B entries, and
+the sum of their flags with the shared any-condition flag counted once.
+``check`` compares the result with ``rules.evaluate`` row by row:
+
+    python truth_table.py --rows 100000
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import cohort
+import records
+import rules
+
+# Representatives of the mMRC and FAST buckets, used to build the tables
+MMRC_VALUES = np.array([-1, 3, 4])
+FAST_VALUES = np.array([-1, 6, 7])
+
+_BITS = rules.CONDITION_BITS
+_FIRED_BITS = rules.FIRED_BITS
+
+# Rows per block when computing keys: small enough for the block to stay in cache
+BLOCK = 1 << 15
+# Keys are uint16 while they fit, as with the shipped cutoffs; past MAX_KEY_BITS
+# the tables would take too long to build
+MAX_KEY_BITS = 24
+
+_layouts = {}  # ruleset version -> layout()
+_tables = {}   # (ruleset version, variant name) -> lookup arrays
+
+
+def _points(ruleset, *names):
+    """The distinct values of some cutoffs across every variant of ``ruleset``, ascending."""
+    return sorted({getattr(t, name) for t in ruleset.thresholds.values() for name in names})
+
+
+def _around(points, below):
+    """A value in each gap and at each point: ``below``, p1, between p1 and p2, p2, ..., above the last."""
+    values = [below]
+    for low, high in zip(points, points[1:]):
+        values += [low, (low + high) / 2]
+    return values + [points[-1], points[-1] + 1]
+
+
+def _widths(radices):
+    return tuple(max(1, (radix - 1).bit_length()) for radix in radices)
+
+
+def layout(ruleset=None):
+    """Bucket cuts, bucket representatives and key widths for ``ruleset`` (default: the live one).
+
+    The cuts are the cutoffs of every variant together, so one set of keys
+    serves them all.
+    """
+    ruleset = ruleset or rules.current()
+    if ruleset.version in _layouts:
+        return _layouts[ruleset.version]
+    cuts = {
+        "pps": _points(ruleset, "pps_poor", "pps_decline", "pps_cancer", "pps_hiv"),
+        "weight_loss": _points(ruleset, "weight_loss"),
+        "albumin": _points(ruleset, "albumin_decline", "albumin_liver", "albumin_flag"),
+        "inr": _points(ruleset, "inr_liver", "inr_elevated"),
+        "cd4_count": _points(ruleset, "cd4"),
+        "ef": _points(ruleset, "ef"),
+        "egfr": _points(ruleset, "egfr"),
+    }
+    albumin = cuts["albumin"]
+    weight_loss = cuts["weight_loss"]
+    values = {
+        # <= cuts: one bucket per cut, and above them all
+        "pps": np.array([*cuts["pps"], cuts["pps"][-1] + 10]),
+        "cd4_count": np.array([*cuts["cd4_count"], np.nan]),
+        "ef": np.array([*cuts["ef"], np.nan]),
+        # > cuts: missing counts as 0
+        "egfr": np.array([np.nan, *cuts["egfr"][1:], cuts["egfr"][-1] + 1]),
+        # >= cuts, as a loss between each cut and the next
+        "weight_loss": np.array([0.0, *((low + high) / 2 for low, high in zip(weight_loss, weight_loss[1:])),
+                                 weight_loss[-1] + 1]),
+        # < and <= cuts, plus missing and an albumin of exactly 0
+        "albumin": np.array([np.nan, 0.0, *_around(albumin, albumin[0] / 2 if albumin[0] > 0 else albumin[0] - 1)]),
+        # >= and > cuts; missing reads like a low INR
+        "inr": np.array(_around(cuts["inr"], np.nan)),
+    }
+    radices_a = (len(values["pps"]), len(values["weight_loss"]), len(values["albumin"]), len(values["inr"]),
+                 len(values["cd4_count"]), 2, 2, 2, 2, 2)
+    radices_b = (2, 2, len(values["ef"]), 2, 3, 2, 2, 2, len(values["egfr"]), 2, 3, 2)
+    widths_a, widths_b = _widths(radices_a), _widths(radices_b)
+    bits = max(sum(widths_a), sum(widths_b))
+    if bits > MAX_KEY_BITS:
+        raise ValueError(f"too many distinct cutoffs across the variants for a truth table ({bits}-bit keys)")
+    _layouts[ruleset.version] = {
+        "cuts": cuts, "values": values,
+        "radices_a": radices_a, "radices_b": radices_b, "widths_a": widths_a, "widths_b": widths_b,
+        "dtype": np.uint16 if bits <= 16 else np.uint32,
+    }
+    return _layouts[ruleset.version]
+
+
+def _grid(radices):
+    """Bucket number of every field for every key, in key order."""
+    return np.indices(radices).reshape(len(radices), -1)
+
+
+def _blank(n, lay):
+    """Packed rows that fire nothing and raise no flag."""
+    rows = np.zeros(n, dtype=records.ASSESSMENT_DTYPE)
+    rows["pps"] = lay["values"]["pps"][-1]
+    for key in ("nyha", "mmrc", "fast_scale"):
+        rows[key] = -1
+    for key in ("ef", "cd4_count", "inr", "albumin", "egfr"):
+        rows[key] = np.nan
+    return rows
+
+
+def _rows_a(lay):
+    """Representative rows of group A, and their labs as float64 (see ``_evaluate``)."""
+    values = lay["values"]
+    pps, weight, albumin, inr, cd4, cancer, cancer_flags, liver, liver_flags, hiv = _grid(lay["radices_a"])
+    rows = _blank(pps.size, lay)
+    rows["pps"] = values["pps"][pps]
+    loss = values["weight_loss"][weight]
+    rows["weight_earlier"] = np.where(loss > 0, 100.0, 0.0)
+    rows["current_weight"] = np.where(loss > 0, 100.0 - loss, 0.0)
+    labs = {
+        "albumin": values["albumin"][albumin],
+        "inr": values["inr"][inr],
+        "cd4_count": values["cd4_count"][cd4],
+    }
+    for key, lab in labs.items():
+        rows[key] = lab
+    rows["conditions"] = cancer * _BITS[rules.CANCER] | liver * _BITS[rules.LIVER] | hiv * _BITS[rules.HIV]
+    rows["cancer_flags"] = cancer_flags
+    rows["liver_flags"] = liver_flags
+    return rows, labs
+
+
+def _rows_b(lay):
+    """Representative rows of group B, and their labs as float64 (see ``_evaluate``)."""
+    values = lay["values"]
+    (hf, nyha, ef, pulmonary, mmrc, oxygen, ckd, dialysis, egfr,
+     dementia, fast, dementia_flags) = _grid(lay["radices_b"])
+    rows = _blank(hf.size, lay)
+    rows["conditions"] = (hf * _BITS[rules.HF] | pulmonary * _BITS[rules.PULMONARY]
+                          | ckd * _BITS[rules.CKD] | dementia * _BITS[rules.DEMENTIA])
+    rows["nyha"] = np.where(nyha, 4, -1)
+    rows["mmrc"] = MMRC_VALUES[mmrc]
+    rows["oxygen_dependent"] = np.where(oxygen, records.ANSWER_CODES["Yes"], 0)
+    # The on_dialysis column is "not answered No"
+    rows["on_dialysis"] = np.where(dialysis, 0, records.ANSWER_CODES["No"])
+    labs = {"ef": values["ef"][ef], "egfr": values["egfr"][egfr]}
+    for key, lab in labs.items():
+        rows[key] = lab
+    rows["fast_scale"] = FAST_VALUES[fast]
+    rows["dementia_flags"] = dementia_flags
+    return rows, labs
+
+
+def _lab(key, value):
+    value = float(value)
+    if key == "ef":  # a text input on the pages
+        return "" if np.isnan(value) else repr(value)
+    return None if np.isnan(value) else value
+
+
+def _evaluate(rows, labs, variants, ruleset):
+    """``{variant: (fired bitmask, flags without any-condition)}`` for packed rows.
+
+    Labs are taken from ``labs`` at full precision: packed rows hold them as
+    float32, which cannot hold a cutoff such as 1.7 exactly.
+    """
+    out = {v.name: (np.zeros(len(rows), np.uint8), np.zeros(len(rows), np.int8)) for v in variants}
+    for i, row in enumerate(rows):
+        if i % 64 == 0:
+            # Builds after a rules.reload run beside the threads serving
+            # requests: hand them the GIL rather than waiting to be preempted
+            time.sleep(0)
+        has_condition = bool(row["conditions"])
+        assessment = records.unpack(row)
+        for key, values in labs.items():
+            assessment[key] = _lab(key, values[i])
+        for name, decision in rules.evaluate_all(assessment, variants, ruleset).items():
+            fired, flags = out[name]
+            fired[i] = decision.fired_mask
+            flags[i] = decision.flags - has_condition
+    return out
+
+
+def _scatter(keys, values, width):
+    table = np.zeros(1 << width, dtype=values.dtype)
+    table[keys] = values
+    return table
+
+
+def build(variants=None, ruleset=None):
+    """Build (or rebuild) the tables for ``variants`` (default: all) under ``ruleset`` (default: live)."""
+    ruleset = ruleset or rules.current()
+    variants = [rules.get_variant(v) for v in variants or rules.VARIANTS]
+    lay = layout(ruleset)
+    (rows_a, labs_a), (rows_b, labs_b) = _rows_a(lay), _rows_b(lay)
+    # Each representative is keyed the way scored rows are, so keys never
+    # used by a real row stay empty
+    keys = (_table_keys({**records.cohort_table(rows_a), **labs_a}, lay)["a"],
+            _table_keys({**records.cohort_table(rows_b), **labs_b}, lay)["b"])
+    if len(np.unique(keys[0])) != len(rows_a) or len(np.unique(keys[1])) != len(rows_b):
+        raise AssertionError("truth table buckets do not map to distinct keys")
+    width_a, width_b = sum(lay["widths_a"]), sum(lay["widths_b"])
+    # Table entries are not patients: keep them out of rule_stats
+    stats, rules._stats = rules._stats, None
+    try:
+        a, b = _evaluate(rows_a, labs_a, variants, ruleset), _evaluate(rows_b, labs_b, variants, ruleset)
+    finally:
+        rules._stats = stats
+    for v in variants:
+        evaluator = ruleset.evaluator(v)
+        _tables[ruleset.version, v.name] = {
+            "fired_a": _scatter(keys[0], a[v.name][0], width_a),
+            "flags_a": _scatter(keys[0], a[v.name][1], width_a),
+            "any_a": _scatter(keys[0], rows_a["conditions"] != 0, width_a),
+            "fired_b": _scatter(keys[1], b[v.name][0], width_b),
+            "flags_b": _scatter(keys[1], b[v.name][1], width_b),
+            "any_b": _scatter(keys[1], rows_b["conditions"] != 0, width_b),
+            # Tier code for a flag count when nothing fired
+            "flag_tiers": np.array([rules.TIERS.index(evaluator.tier((), flags))
+                                    for flags in range(len(rules.FLAG_IDS) + 1)], dtype=np.int8),
+        }
+
+
+def tables(variant="hospice", ruleset=None):
+    """The lookup arrays for one variant under ``ruleset`` (default: live), built on first use."""
+    ruleset = ruleset or rules.current()
+    key = ruleset.version, rules.get_variant(variant).name
+    if key not in _tables:
+        build([key[1]], ruleset)
+    return _tables[key]
+
+
+def _prepare(ruleset):
+    """``rules.on_reload`` hook: build the new ruleset's tables for the variants in use.
+
+    Tables for rulesets other than the live and the new one are dropped.
+    """
+    in_use = sorted({name for _, name in _tables})
+    if in_use:
+        build(in_use, ruleset)
+    keep = {rules.current().version, ruleset.version}
+    for key in [key for key in _tables if key[0] not in keep]:
+        del _tables[key]
+    for version in [version for version in _layouts if version not in keep]:
+        del _layouts[version]
+
+
+rules.on_reload(_prepare)
+
+
+def _key(fields, widths, dtype):
+    key = np.zeros(len(fields[0]), dtype=dtype)
+    for field, width in zip(fields, widths):
+        key <<= width
+        key |= field
+    return key
+
+
+def _buckets(values, *cuts):
+    """Sum of comparisons: the bucket number of each value among ``cuts``.
+
+    Float values are compared in their own precision, as in
+    ``cohort._compare``.
+    """
+    total = np.zeros(len(values), dtype=np.uint8)
+    floats = values.dtype.kind == "f"
+    for compare, cut in cuts:
+        total += compare(values, values.dtype.type(cut) if floats and np.isscalar(cut) else cut)
+    return total
+
+
+def _fields_a(lay, pps, weight_loss, albumin, inr, cd4_count, cancer, cancer_flags, liver, liver_flags, hiv):
+    cuts = lay["cuts"]
+    # Unset numbers are NaN, so every comparison against them is False
+    return [
+        _buckets(pps, *((np.greater, cut) for cut in cuts["pps"])),
+        _buckets(weight_loss, *((np.greater_equal, cut) for cut in cuts["weight_loss"])),
+        # entered, then below and at-or-below each cut, then exactly 0
+        _buckets(albumin, (np.equal, albumin), *((np.less, cut) for cut in cuts["albumin"]),
+                 *((np.less_equal, cut) for cut in cuts["albumin"]), (np.equal, 0)),
+        _buckets(inr, *((np.greater_equal, cut) for cut in cuts["inr"]), *((np.greater, cut) for cut in cuts["inr"])),
+        _buckets(cd4_count, *((np.less_equal, cut) for cut in cuts["cd4_count"])),
+        cancer, cancer_flags, liver, liver_flags, hiv,
+    ]
+
+
+def _fields_b(lay, hf, nyha, ef, pulmonary, mmrc, oxygen, ckd, dialysis, egfr, dementia, fast, dementia_flags):
+    cuts = lay["cuts"]
+    return [
+        hf, nyha == 4, _buckets(ef, *((np.less_equal, cut) for cut in cuts["ef"])),
+        pulmonary, _buckets(mmrc, (np.greater_equal, 3), (np.greater_equal, 4)) * (mmrc <= 4), oxygen,
+        ckd, dialysis, _buckets(egfr, *((np.greater, cut) for cut in cuts["egfr"])),
+        dementia, _buckets(fast, (np.greater_equal, 6), (np.greater_equal, 7)) * (fast <= 7), dementia_flags,
+    ]
+
+
+def _table_block(col, lay):
+    weight_loss = cohort.weight_loss_pct(col("current_weight"), col("weight_earlier"))
+    key_a = _key(_fields_a(
+        lay, col("pps"), weight_loss, col("albumin"), col("inr"), col("cd4_count"),
+        col("has_cancer"), col("n_cancer_flags") > 0,
+        col("has_liver"), col("n_liver_flags") > 0,
+        col("has_hiv"),
+    ), lay["widths_a"], lay["dtype"])
+    key_b = _key(_fields_b(
+        lay, col("has_hf"), col("nyha"), col("ef"),
+        col("has_pulmonary"), col("mmrc"), col("oxygen_dependent"),
+        col("has_ckd"), col("on_dialysis"), col("egfr"),
+        col("has_dementia"), col("fast_scale"), col("n_dementia_flags") > 0,
+    ), lay["widths_b"], lay["dtype"])
+    return key_a, key_b, weight_loss
+
+
+def _packed_block(col, lay):
+    conditions = col("conditions")
+    has = lambda condition: (conditions & _BITS[condition]) != 0
+    weight_loss = cohort.weight_loss_pct(col("current_weight"), col("weight_earlier"))
+    key_a = _key(_fields_a(
+        lay, col("pps"), weight_loss, col("albumin"), col("inr"), col("cd4_count"),
+        has(rules.CANCER), col("cancer_flags") != 0,
+        has(rules.LIVER), col("liver_flags") != 0,
+        has(rules.HIV),
+    ), lay["widths_a"], lay["dtype"])
+    key_b = _key(_fields_b(
+        lay, has(rules.HF), col("nyha"), col("ef"),
+        has(rules.PULMONARY), col("mmrc"), col("oxygen_dependent") == records.ANSWER_CODES["Yes"],
+        has(rules.CKD), col("on_dialysis") != records.ANSWER_CODES["No"], col("egfr"),
+        has(rules.DEMENTIA), col("fast_scale"), col("dementia_flags") != 0,
+    ), lay["widths_b"], lay["dtype"])
+    return key_a, key_b, weight_loss
+
+
+def _keys(table, block_keys, get, lay):
+    """Keys for every row, computed BLOCK rows at a time.
+
+    Columns are often strided (fields of a packed array, or the views
+    records.cohort_table makes of them) and every one is compared several
+    times; in blocks, each is read from memory once and the comparisons run
+    on contiguous, cache-resident copies.
+    """
+    n = len(table["pps"])
+    keys = {
+        "index": getattr(table, "index", None),
+        "a": np.empty(n, dtype=lay["dtype"]),
+        "b": np.empty(n, dtype=lay["dtype"]),
+        "weight_loss": np.empty(n),
+    }
+    columns = {}
+
+    def column(name):
+        if name not in columns:
+            columns[name] = get(table, name, n)
+        return columns[name]
+
+    for start in range(0, n, BLOCK):
+        stop = min(n, start + BLOCK)
+        col = lambda name: np.ascontiguousarray(column(name)[start:stop])
+        keys["a"][start:stop], keys["b"][start:stop], keys["weight_loss"][start:stop] = block_keys(col, lay)
+    return keys
+
+
+def _table_keys(table, lay):
+    return _keys(table, _table_block, cohort._column, lay)
+
+
+def _packed_keys(packed, lay):
+    return _keys(packed, _packed_block, lambda packed, name, n: packed[name], lay)
+
+
+def _lookup(keys, variant, ruleset):
+    t = tables(variant, ruleset)
+    a, b = keys["a"], keys["b"]
+    fired = t["fired_a"][a] | t["fired_b"][b]
+    flags = t["flags_a"][a] + t["flags_b"][b] + (t["any_a"][a] | t["any_b"][b])
+    out = {condition_id: (fired & bit) != 0 for condition_id, bit in _FIRED_BITS.items()}
+    out["force_transition"] = fired != 0
+    out["flags"] = flags
+    out["tier"] = np.where(out["force_transition"], cohort.RED, t["flag_tiers"][flags]).astype(np.int8)
+    out["weight_loss_pct"] = keys["weight_loss"]
+
+    if keys["index"] is not None:
+        import pandas as pd
+
+        return pd.DataFrame(out, index=keys["index"])
+    return out
+
+
+def score_cohort(table, variant="hospice"):
+    """Drop-in for ``cohort.score_cohort``, scored by table lookup."""
+    ruleset = rules.current()
+    return _lookup(_table_keys(table, layout(ruleset)), variant, ruleset)
+
+
+def score_packed(packed, variant="hospice"):
+    """``score_cohort`` for a ``records.ASSESSMENT_DTYPE`` array, keyed straight from its fields."""
+    ruleset = rules.current()
+    return _lookup(_packed_keys(packed, layout(ruleset)), variant, ruleset)
+
+
+def score_variants(table, variants=None, ruleset=None):
+    """Drop-in for ``cohort.score_variants``; the keys are computed once."""
+    ruleset = ruleset or rules.current()
+    keys = _table_keys(table, layout(ruleset))
+    results = {v.name: _lookup(keys, v, ruleset) for v in map(rules.get_variant, variants or rules.VARIANTS)}
+    if keys["index"] is not None:
+        import pandas as pd
+
+        return pd.concat(results, axis=1)
+    return results
+
+
+def edge_cohort(n, seed=0):
+    """Synthetic rows with labs moved onto and around the rule thresholds."""
+    import synthetic
+
+    rng = np.random.default_rng(seed)
+    packed = synthetic.packed_cohort(n, seed)
+    cuts = layout()["cuts"]
+    around = lambda name, step: [np.nan, 0] + [round(cut + d, 6) for cut in cuts[name] for d in (-step, 0, step)]
+    edges = {
+        "ef": around("ef", 0.1),
+        "egfr": around("egfr", 0.1),
+        "inr": around("inr", 0.1),
+        "albumin": [*around("albumin", 0.1), -1],
+        "cd4_count": around("cd4_count", 1),
+    }
+    for key, values in edges.items():
+        moved = rng.random(n) < 0.5
+        packed[key] = np.where(moved, rng.choice(values, n), packed[key])
+    return packed
+
+
+def check(packed, variants=None):
+    """Rows of ``packed`` where the tables disagree with ``rules.evaluate``, per variant.
+
+    Compares the tier, the fired conditions and the flag count.
+    """
+    variants = [rules.get_variant(v) for v in variants or rules.VARIANTS]
+    results = score_variants(records.cohort_table(packed), variants)
+    mismatches = {v.name: [] for v in variants}
+    for i, row in enumerate(packed):
+        for name, decision in rules.evaluate_all(records.unpack(row), variants).items():
+            out = results[name]
+            fired = tuple(c for c in rules.CONDITION_IDS if out[c][i])
+            if (rules.TIERS[out["tier"][i]], fired, int(out["flags"][i])) != (decision.tier, decision.fired, decision.flags):
+                mismatches[name].append(i)
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the truth tables against rules.evaluate.")
+    parser.add_argument("--rows", type=int, default=100_000, help="synthetic rows, labs moved onto thresholds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    mismatches = check(edge_cohort(args.rows, args.seed))
+    for name, rows in mismatches.items():
+        print(f"{name:<16} {len(rows):>8,} of {args.rows:,} rows disagree{f' (first: {rows[:5]})' if rows else ''}")
+    if any(mismatches.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()